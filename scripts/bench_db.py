@@ -0,0 +1,169 @@
+"""
+Бенчмарк слоя БД: 10k пользователей × 100 дисциплин.
+
+Сравнивает две конфигурации на свежей базе:
+  before - PRAGMA SQLite по умолчанию, схема без индексов очередей (ревизия 0002)
+  after  - профиль "tuned", все миграции (ревизия head)
+
+Запуск из корня проекта:
+    python -m scripts.bench_db [--users 10000] [--subjects 100] [--per-user 5]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+os.environ.setdefault("BOT_TOKEN", "0:bench")
+
+from sqlalchemy import delete, insert, text  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker  # noqa: E402
+
+from src.database.migrate import upgrade_db  # noqa: E402
+from src.database.models import Queue, Subject, User  # noqa: E402
+from src.database.requests import list_queue_for_subject  # noqa: E402
+from src.database.session import make_engine, sqlite_pragmas  # noqa: E402
+
+QUEUE_SQL = text("""
+    SELECT user_id, joined_at
+    FROM Queues
+    WHERE subject_id = :subject_id
+    ORDER BY joined_at
+""")
+
+MY_QUEUES_SQL = text("""
+    SELECT s.name, s.id
+    FROM Queues q
+    JOIN Subjects s ON s.id = q.subject_id
+    WHERE q.user_id = :user_id
+    ORDER BY s.name
+""")
+
+
+def _summary(samples: list) -> str:
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    return f"mean {statistics.mean(samples):7.3f} ms  p95 {p95:7.3f} ms"
+
+
+async def _timed(samples: list, coro) -> None:
+    started = time.perf_counter()
+    await coro
+    samples.append((time.perf_counter() - started) * 1000)
+
+
+async def _seed(maker, users: int, subjects: int, per_user: int) -> None:
+    rnd = random.Random(42)
+    now = datetime.now()
+    async with maker() as session:
+        await session.execute(
+            insert(User),
+            [{"tg_id": i, "full_name": f"Студент {i:05d}", "role": "student"} for i in range(1, users + 1)],
+        )
+        await session.execute(
+            insert(Subject),
+            [
+                {"id": i, "name": f"Дисциплина {i:03d}", "name_normalized": f"дисциплина {i:03d}"}
+                for i in range(1, subjects + 1)
+            ],
+        )
+        rows = []
+        for user_id in range(1, users + 1):
+            for subject_id in rnd.sample(range(1, subjects + 1), per_user):
+                rows.append({
+                    "user_id": user_id,
+                    "subject_id": subject_id,
+                    "joined_at": now - timedelta(seconds=rnd.randrange(86400)),
+                })
+        await session.execute(insert(Queue), rows)
+        await session.commit()
+
+
+async def run(profile: str, revision: str, args) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite+aiosqlite:///{Path(tmp) / 'bench.db'}"
+        engine = make_engine(url, sqlite_pragmas(profile))
+        maker = async_sessionmaker(bind=engine, expire_on_commit=False, class_=AsyncSession)
+        await upgrade_db(engine, revision)
+        await _seed(maker, args.users, args.subjects, args.per_user)
+        rnd = random.Random(7)
+
+        queue_sql, queue_orm, my_reads, writes, mixed_reads = [], [], [], [], []
+        async with maker() as session:
+            for _ in range(args.reads):
+                params = {"subject_id": rnd.randint(1, args.subjects)}
+                await _timed(queue_sql, session.execute(QUEUE_SQL, params))
+            for _ in range(args.reads):
+                params = {"user_id": rnd.randint(1, args.users)}
+                await _timed(my_reads, session.execute(MY_QUEUES_SQL, params))
+        for _ in range(args.reads):
+            async with maker() as session:
+                subject_id = rnd.randint(1, args.subjects)
+                await _timed(queue_orm, list_queue_for_subject(session, subject_id))
+
+        locked = 0
+
+        async def write_once() -> None:
+            # Запись с коммитом на каждую операцию, как в хэндлерах
+            nonlocal locked
+            user_id, subject_id = rnd.randint(1, args.users), rnd.randint(1, args.subjects)
+            async with maker() as session:
+                try:
+                    await session.execute(
+                        delete(Queue).where(Queue.user_id == user_id, Queue.subject_id == subject_id)
+                    )
+                    await session.execute(
+                        insert(Queue).values(user_id=user_id, subject_id=subject_id, joined_at=datetime.now())
+                    )
+                    await session.commit()
+                except OperationalError:
+                    # "database is locked"
+                    locked += 1
+
+        for _ in range(args.writes):
+            await _timed(writes, write_once())
+
+        async def writer() -> None:
+            for _ in range(args.writes // 4):
+                await write_once()
+
+        async def reader() -> None:
+            for _ in range(args.reads // 8):
+                async with maker() as session:
+                    params = {"subject_id": rnd.randint(1, args.subjects)}
+                    await _timed(mixed_reads, session.execute(QUEUE_SQL, params))
+
+        # Чтения на фоне записей: 4 писателя и 8 читателей одновременно
+        await asyncio.gather(*(writer() for _ in range(4)), *(reader() for _ in range(8)))
+
+        await engine.dispose()
+
+    print(f"[{profile}, revision {revision}]")
+    print(f"  queue for subject, SQL {_summary(queue_sql)}")
+    print(f"  list_queue_for_subject {_summary(queue_orm)}")
+    print(f"  my queues, SQL         {_summary(my_reads)}")
+    print(f"  join/leave + commit    {_summary(writes)}")
+    print(f"  reads during writes    {_summary(mixed_reads)}")
+    print(f"  'database is locked'   {locked} of {args.writes * 2} writes")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--subjects", type=int, default=100)
+    parser.add_argument("--per-user", type=int, default=5)
+    parser.add_argument("--reads", type=int, default=300)
+    parser.add_argument("--writes", type=int, default=300)
+    args = parser.parse_args()
+
+    await run("default", "0002", args)
+    await run("tuned", "head", args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
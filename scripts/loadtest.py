@@ -0,0 +1,304 @@
+"""
+Нагрузочный тест: синтетические апдейты через настоящий Dispatcher.
+
+Моделирует открытие записи на лабораторную. Пользователи регистрируются,
+открывают список дисциплин и очередь, встают в неё (иногда повторным
+нажатием), смотрят «Мои очереди» и выходят, а старосты тем временем
+очищают очереди. Каждый апдейт проходит через dp.feed_update со всеми
+middleware и хэндлерами. Запросы к Telegram перехватывает фейковая сессия
+(с задержкой --api-latency-ms), база - временный файл SQLite со всеми
+миграциями.
+
+Выводит пропускную способность по фазам, p50/p95/p99 задержки обработки
+апдейта и среднее число запросов к БД по каждому хэндлеру из src/handlers/.
+
+Запуск из корня проекта:
+    python -m scripts.loadtest [--users 500] [--subjects 10] [--rounds 3] \\
+        [--concurrency 64] [--api-latency-ms 30] [--think-ms 200] [--outbound]
+"""
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import logging
+import math
+import os
+import random
+import tempfile
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Dict, List
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import EditMessageText, SendDocument, SendMessage, TelegramMethod
+from aiogram.types import CallbackQuery, Chat, InputFile, Message, Update, User
+
+logger = logging.getLogger("loadtest")
+
+
+class RecordingSession(BaseSession):
+    """Сессия без сети: считает вызовы API и отвечает правдоподобными объектами"""
+
+    def __init__(self, latency: float) -> None:
+        super().__init__()
+        self.latency = latency
+        self.calls: Counter = Counter()
+        # Последнее сообщение бота в чате - на его кнопки «нажимают» пользователи
+        self.last_message: Dict[int, int] = {}
+        self._message_ids = itertools.count(1)
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: int = None) -> Any:
+        self.calls[type(method).__name__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if isinstance(method, SendDocument) and isinstance(method.document, InputFile):
+            # Файл вычитывается так же, как при настоящей отправке
+            async for _ in method.document.read(bot):
+                pass
+        if isinstance(method, (SendMessage, SendDocument, EditMessageText)):
+            message_id = getattr(method, "message_id", None) or next(self._message_ids)
+            self.last_message[method.chat_id] = message_id
+            return Message(
+                message_id=message_id,
+                date=datetime.datetime.now(),
+                chat=Chat(id=method.chat_id, type="private"),
+                text=getattr(method, "text", None),
+            )
+        return True
+
+    async def stream_content(self, *args: Any, **kwargs: Any):
+        yield b""
+
+    async def close(self) -> None:
+        pass
+
+
+class UpdateFactory:
+    def __init__(self, session: RecordingSession) -> None:
+        self.session = session
+        self._ids = itertools.count(1)
+
+    def _user(self, user_id: int) -> User:
+        return User(id=user_id, is_bot=False, first_name=f"user{user_id}")
+
+    def message(self, user_id: int, text: str) -> Update:
+        return Update(
+            update_id=next(self._ids),
+            message=Message(
+                message_id=next(self._ids),
+                date=datetime.datetime.now(),
+                chat=Chat(id=user_id, type="private"),
+                from_user=self._user(user_id),
+                text=text,
+            ),
+        )
+
+    def callback(self, user_id: int, data: str) -> Update:
+        message = Message(
+            message_id=self.session.last_message.get(user_id, 1),
+            date=datetime.datetime.now(),
+            chat=Chat(id=user_id, type="private"),
+            text="…",
+        )
+        return Update(
+            update_id=next(self._ids),
+            callback_query=CallbackQuery(
+                id=str(next(self._ids)),
+                from_user=self._user(user_id),
+                chat_instance=str(user_id),
+                message=message,
+                data=data,
+            ),
+        )
+
+
+class LoadStats:
+    def __init__(self) -> None:
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.queries: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.fed = 0
+
+    def record(self, handler: str, elapsed_ms: float, queries: int) -> None:
+        self.fed += 1
+        self.samples[handler].append(elapsed_ms)
+        self.queries[handler] += queries
+
+    def report(self) -> None:
+        print(
+            f"{'хэндлер':<38} {'n':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}  мс"
+            f" {'запросов БД':>12}"
+        )
+        for name, samples in sorted(self.samples.items(), key=lambda item: -len(item[1])):
+            samples.sort()
+            print(
+                f"{name:<38} {len(samples):>6} {_percentile(samples, 0.50):>8.2f} "
+                f"{_percentile(samples, 0.95):>8.2f} {_percentile(samples, 0.99):>8.2f} "
+                f"{samples[-1]:>8.2f}     {self.queries[name] / len(samples):>8.1f}"
+            )
+        if self.errors:
+            print("ошибки:", dict(self.errors))
+
+
+def _percentile(samples: List[float], p: float) -> float:
+    """Перцентиль по ближайшему рангу, samples отсортирован"""
+    return samples[max(0, math.ceil(p * len(samples)) - 1)]
+
+
+async def _phase(name: str, stats: LoadStats, coros) -> None:
+    fed = stats.fed
+    started = time.perf_counter()
+    await asyncio.gather(*coros)
+    elapsed = time.perf_counter() - started
+    count = stats.fed - fed
+    print(f"{name}: {count} апдейтов за {elapsed:.2f} с ({count / elapsed:.0f}/с)")
+
+
+async def run(args) -> bool:
+    """Прогнать сценарий; True, если были ошибки"""
+    # settings читаются при импорте, поэтому окружение готовится в main()
+    from src.bot import create_dispatcher, create_fsm_storage, init_db
+    from src.database import engine
+    from src.database.writer import db_writer
+    from src.keyboards.callbacks import AdminAction, AdminCb, QueueAction, QueueCb, SubjectCb
+    from src.middlewares import HandlerNameMiddleware
+    from src.services import live_views, outbound
+    from src.services.metrics import UpdateMetrics, collect_update
+
+    await init_db()
+    session = RecordingSession(args.api_latency_ms / 1000)
+    bot = Bot(token="0:loadtest", session=session)
+    if args.outbound:
+        session.middleware(outbound)
+    dp = create_dispatcher(await create_fsm_storage())
+    if args.query_budget == "off":
+        # Имя хэндлера и запросы к БД - теми же средствами, что и метрики бота
+        # (с проверкой бюджета create_dispatcher подключает это сам)
+        dp.message.middleware(HandlerNameMiddleware())
+        dp.callback_query.middleware(HandlerNameMiddleware())
+    db_writer.start()
+    live_views.start(bot)
+
+    updates = UpdateFactory(session)
+    stats = LoadStats()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    admins = range(1, args.admins + 1)
+    users = range(1, args.users + 1)
+    subjects = range(1, args.subjects + 1)
+
+    async def feed(update: Update) -> None:
+        metrics = UpdateMetrics(handler="(без хэндлера)")
+        async with semaphore:
+            started = time.perf_counter()
+            with collect_update(metrics):
+                try:
+                    await dp.feed_update(bot, update)
+                except Exception as e:
+                    if not stats.errors:
+                        logger.exception("Ошибка при обработке апдейта")
+                    stats.errors[f"{type(e).__name__} ({metrics.handler})"] += 1
+            elapsed = (time.perf_counter() - started) * 1000
+        stats.record(metrics.handler, elapsed, metrics.db.queries)
+
+    async def think(rnd: random.Random) -> None:
+        if args.think_ms:
+            await asyncio.sleep(rnd.uniform(0, args.think_ms) / 1000)
+
+    async def register(user_id: int) -> None:
+        await feed(updates.message(user_id, "/start"))
+        await feed(updates.message(user_id, f"Студент {user_id:05d}"))
+
+    async def create_subjects(admin_id: int) -> None:
+        await feed(updates.message(admin_id, "⚙️ Управление дисциплинами"))
+        for subject_id in subjects:
+            await feed(updates.callback(admin_id, AdminCb(action=AdminAction.ADD).pack()))
+            await feed(updates.message(admin_id, f"Лабораторная {subject_id:03d}"))
+
+    async def student(user_id: int) -> None:
+        rnd = random.Random(user_id)
+        for _ in range(args.rounds):
+            subject_id = rnd.choice(subjects)
+            await feed(updates.message(user_id, "Выбрать дисциплину"))
+            await think(rnd)
+            await feed(updates.callback(user_id, SubjectCb(subject_id=subject_id).pack()))
+            join = QueueCb(action=QueueAction.JOIN, subject_id=subject_id).pack()
+            await feed(updates.callback(user_id, join))
+            if rnd.random() < 0.3:
+                # Нетерпеливое повторное нажатие
+                await feed(updates.callback(user_id, join))
+            await think(rnd)
+            await feed(updates.message(user_id, "Мои очереди"))
+            if rnd.random() < 0.5:
+                await think(rnd)
+                leave = QueueCb(action=QueueAction.LEAVE, subject_id=subject_id).pack()
+                await feed(updates.callback(user_id, leave))
+
+    async def admin(admin_id: int, done: asyncio.Event) -> None:
+        rnd = random.Random(-admin_id)
+        while not done.is_set():
+            await asyncio.sleep(args.clear_every_ms / 1000)
+            subject_id = rnd.choice(subjects)
+            await feed(updates.callback(admin_id, SubjectCb(subject_id=subject_id).pack()))
+            for action in (QueueAction.CLEAR_ASK, QueueAction.CLEAR):
+                await feed(updates.callback(admin_id, QueueCb(action=action, subject_id=subject_id).pack()))
+
+    async def rush() -> None:
+        done = asyncio.Event()
+        clears = [asyncio.create_task(admin(admin_id, done)) for admin_id in admins]
+        try:
+            await asyncio.gather(*(student(user_id) for user_id in users))
+        finally:
+            done.set()
+            await asyncio.gather(*clears)
+
+    try:
+        await _phase("регистрация", stats, [register(user_id) for user_id in users])
+        await _phase("дисциплины", stats, [create_subjects(admins[0])])
+        await _phase("открытие записи", stats, [rush()])
+        print()
+        stats.report()
+        print("вызовы API:", dict(session.calls.most_common()))
+        return bool(stats.errors)
+    finally:
+        await live_views.stop()
+        await dp.storage.close()
+        await db_writer.stop()
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--subjects", type=int, default=10)
+    parser.add_argument("--admins", type=int, default=2, help="первые N пользователей - старосты")
+    parser.add_argument("--rounds", type=int, default=3, help="сколько раз каждый встаёт в очередь")
+    parser.add_argument("--concurrency", type=int, default=64, help="апдейтов в обработке одновременно")
+    parser.add_argument("--api-latency-ms", type=float, default=30.0, help="задержка ответа Telegram")
+    parser.add_argument("--think-ms", type=float, default=200.0, help="пауза пользователя между нажатиями")
+    parser.add_argument("--clear-every-ms", type=float, default=2000.0)
+    parser.add_argument("--outbound", action="store_true", help="включить лимиты отправки (outbound)")
+    parser.add_argument(
+        "--query-budget",
+        choices=("off", "warn", "strict"),
+        default="off",
+        help="проверять бюджет запросов к БД (QUERY_BUDGET_MODE); при нарушениях - код выхода 1",
+    )
+    parser.add_argument("--keep-db", help="сохранить базу в этот файл вместо временного")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="loadtest-") as tmp:
+        os.environ["DB_PATH"] = args.keep_db or str(Path(tmp) / "loadtest.db")
+        os.environ["SUPERADMINS"] = json.dumps(list(range(1, args.admins + 1)))
+        os.environ["QUERY_BUDGET_MODE"] = args.query_budget
+        os.environ.setdefault("BOT_TOKEN", "0:loadtest")
+        logging.basicConfig(level=logging.WARNING)
+        failed = asyncio.run(run(args))
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Проигрывание записанных апдейтов на локальный вебхук.
+
+Апдейты берутся из JSONL-файла (по одному JSON-объекту Update на строку),
+например записанного сервером с WEBHOOK_RECORD_PATH. Бот должен быть
+запущен с BOT_MODE=webhook.
+
+Запуск из корня проекта:
+    python -m scripts.replay_updates updates.jsonl \\
+        [--url http://127.0.0.1:8080/webhook] [--secret ...] [--concurrency 8]
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from collections import Counter
+
+from aiohttp import ClientSession
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def load_updates(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+async def replay(url: str, updates: list, secret: str, concurrency: int) -> None:
+    headers = {SECRET_HEADER: secret} if secret else {}
+    semaphore = asyncio.Semaphore(concurrency)
+    statuses: Counter = Counter()
+    latencies = []
+
+    async with ClientSession(headers=headers) as http:
+
+        async def post(update: dict) -> None:
+            async with semaphore:
+                started = time.perf_counter()
+                async with http.post(url, json=update) as resp:
+                    await resp.read()
+                    statuses[resp.status] += 1
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(post(update) for update in updates))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"апдейтов: {len(updates)} за {elapsed:.2f} с ({len(updates) / elapsed:.0f}/с)")
+    print("статусы:", dict(statuses))
+    if latencies:
+        p95 = latencies[int(len(latencies) * 0.95) - 1] if len(latencies) >= 20 else latencies[-1]
+        print(f"задержка, мс: mean={statistics.mean(latencies):.1f} p95={p95:.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="JSONL-файл с апдейтами")
+    parser.add_argument("--url", default="http://127.0.0.1:8080/webhook")
+    parser.add_argument("--secret", default="")
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    asyncio.run(replay(args.url, load_updates(args.path), args.secret, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,36 @@
 import asyncio
+import logging
+from contextlib import AsyncExitStack
+from typing import Callable, Optional, Tuple
 
-from aiogram import Bot, Dispatcher
+from aiogram import Bot, Dispatcher, Router
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
 from aiogram.fsm.storage.memory import MemoryStorage
 
 from src.config import settings
-from src.database.models import Base, Subject
-from src.database import async_session_maker, engine
-from src.handlers import start, queue, admin
+from src.database import async_session_maker, engine, queue_engine
+from src.database.fsm_storage import SQLiteStorage
+from src.database.migrate import upgrade_db
+from src.database.requests import list_subjects
+from src.database.session import main_shard
+from src.database.shards import shard_router
+from src.database.writer import db_writer
+from src.handlers import start, queue, admin, search
+from src.handlers.callbacks import callback_table
+from src.middlewares import (
+    CallbackDataMiddleware,
+    HandlerNameMiddleware,
+    MetricsMiddleware,
+    QueryBudgetMiddleware,
+    ShardMiddleware,
+    UserMiddleware,
+)
+from src.services import live_views, outbound, turn_notifier
+from src.services.metrics import MetricsServer, api_timer
+from src.services.outbound import Lane
+from src.webhook import run_webhook
 
 
 async def init_db() -> bool:
@@ -16,58 +38,172 @@ async def init_db() -> bool:
     Инициализирует базу данных.
     Возвращает True, если дисциплины есть, False - если нет.
     """
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    await upgrade_db(engine)
+    # Файлы групп открываются и доводятся миграциями здесь же
+    await shard_router.load()
+
+    async with AsyncExitStack() as stack:
+        sessions = [
+            await stack.enter_async_context(shard.session_maker())
+            for shard in shard_router.shards()
+        ]
+        # Очереди живут в памяти, из БД они читаются только при старте
+        await queue_engine.load(*sessions)
+        await turn_notifier.load(*sessions)
 
     # Проверяем наличие дисциплин
     async with async_session_maker() as session:
-        from sqlalchemy import select
-
-        result = await session.execute(select(Subject))
-        disciplines = result.scalars().all()
+        disciplines = await list_subjects(session)
         if not disciplines:
             return False
         return True
 
 
-async def main() -> None:
-    has_disciplines = await init_db()
-
-    bot = Bot(
-        token=settings.bot_token,
-        default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+async def create_fsm_storage(
+    owns: Optional[Callable[[StorageKey], bool]] = None,
+) -> BaseStorage:
+    """Хранилище FSM: в SQLite, чтобы незаконченные диалоги переживали перезапуск"""
+    if settings.fsm_storage == "memory":
+        return MemoryStorage()
+
+    # Состояния диалогов всех групп - в основной БД
+    storage = SQLiteStorage(
+        main_shard.session_maker,
+        db_writer.for_shard(main_shard),
+        max_size=settings.fsm_cache_size,
+        ttl=settings.fsm_state_ttl,
+        flush_interval=settings.fsm_flush_interval,
+        owns=owns,
     )
-    dp = Dispatcher(storage=MemoryStorage())
+    await storage.load()
+    storage.start()
+    return storage
+
+
+def create_dispatcher(storage: BaseStorage) -> Dispatcher:
+    """Диспетчер со всеми middleware и роутерами бота"""
+    dp = Dispatcher(storage=storage)
+    if settings.metrics_port:
+        # Первым, чтобы в замер попали и остальные middleware
+        dp.update.outer_middleware(MetricsMiddleware())
+    if settings.query_budget_mode != "off":
+        dp.update.outer_middleware(
+            QueryBudgetMiddleware(
+                default_budget=settings.query_budget_default,
+                budgets=settings.query_budgets,
+                repeat_limit=settings.query_repeat_limit,
+                strict=settings.query_budget_mode == "strict",
+            )
+        )
+    if settings.metrics_port or settings.query_budget_mode != "off":
+        dp.message.middleware(HandlerNameMiddleware())
+        dp.callback_query.middleware(HandlerNameMiddleware())
+        dp.inline_query.middleware(HandlerNameMiddleware())
+    # Кнопки разбираются раньше, чем идёт запрос пользователя в БД
+    dp.update.outer_middleware(CallbackDataMiddleware(callback_table))
+    # БД группы выбирается до того, как пользователь читается из неё
+    dp.update.outer_middleware(ShardMiddleware())
+    dp.update.outer_middleware(UserMiddleware())
 
     # Регистрация роутеров
-    dp.include_routers(
+    dp.include_routers(*bot_routers())
+    return dp
+
+
+def bot_routers() -> Tuple[Router, ...]:
+    return (
+        # Раньше start: /start join_<id> из inline-поиска
+        search.router,
         start.router,
         queue.router,
         admin.router,
+        # Все inline-кнопки - через таблицу обработчиков
+        callback_table.router,
     )
 
-    # Отправляем уведомление админам, если дисциплин нет
-    if not has_disciplines and settings.superadmins:
-        from src.database.requests import get_user_by_tg_id
 
+def create_bot() -> Bot:
+    bot = Bot(
+        token=settings.bot_token,
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+    )
+    # Все запросы к Telegram идут через планировщик с лимитами
+    bot.session.middleware(outbound)
+    if settings.metrics_port:
+        # После outbound: замеряется сам запрос, без ожидания лимитов
+        bot.session.middleware(api_timer)
+    return bot
+
+
+async def notify_no_disciplines(bot: Bot, admin_tg_id: int) -> None:
+    from src.database.requests import get_user_by_tg_id
+
+    try:
         async with async_session_maker() as session:
-            for admin_tg_id in settings.superadmins:
-                try:
-                    user = await get_user_by_tg_id(session, admin_tg_id)
-                    if user and user.role == "admin":
-                        await bot.send_message(
-                            admin_tg_id,
-                            "⚠️ <b>ВНИМАНИЕ</b>\n\n"
-                            "Дисциплины не указаны в базе данных.\n"
-                            "Используй кнопку '⚙️ Управление дисциплинами' в главном меню, "
-                            "чтобы добавить дисциплины.",
-                        )
-                except Exception as e:
-                    print(f"Не удалось отправить уведомление админу {admin_tg_id}: {e}")
-
-    await dp.start_polling(bot)
+            user = await get_user_by_tg_id(session, admin_tg_id)
+        if user and user.role == "admin":
+            await bot.send_message(
+                admin_tg_id,
+                "⚠️ <b>ВНИМАНИЕ</b>\n\n"
+                "Дисциплины не указаны в базе данных.\n"
+                "Используй кнопку '⚙️ Управление дисциплинами' в главном меню, "
+                "чтобы добавить дисциплины.",
+            )
+    except Exception:
+        logging.exception("Не удалось отправить уведомление админу %s", admin_tg_id)
+
+
+async def notify_superadmins(bot: Bot) -> None:
+    """Предупредить суперадминов, что дисциплин нет"""
+    # Рассылаем параллельно: темп задаёт outbound, а уведомления
+    # идут в последнюю очередь, после ответов пользователям
+    with outbound.lane(Lane.BULK):
+        await asyncio.gather(
+            *(notify_no_disciplines(bot, tg_id) for tg_id in settings.superadmins)
+        )
+
+
+async def main() -> None:
+    if settings.workers > 1:
+        # Апдейты обрабатывают отдельные процессы (см. src/workers.py)
+        from src.workers import run_supervisor
+
+        await run_supervisor()
+        return
+
+    has_disciplines = await init_db()
+
+    bot = create_bot()
+    metrics_server = None
+    if settings.metrics_port:
+        metrics_server = MetricsServer(settings.metrics_host, settings.metrics_port)
+        await metrics_server.start()
+    dp = create_dispatcher(await create_fsm_storage())
+
+    # Отправляем уведомление админам, если дисциплин нет
+    if not has_disciplines and settings.superadmins:
+        await notify_superadmins(bot)
+
+    db_writer.start()
+    live_views.start(bot)
+    turn_notifier.start(bot)
+    try:
+        if settings.bot_mode == "webhook":
+            await run_webhook(dp, bot)
+        else:
+            # Если раньше работали через вебхук, getUpdates без этого не отдаст апдейты
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
+    finally:
+        await live_views.stop()
+        await turn_notifier.stop()
+        if metrics_server is not None:
+            await metrics_server.stop()
+        # Дописываем то, что уже стоит в очереди писателя
+        await db_writer.stop()
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     asyncio.run(main())
 
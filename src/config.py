@@ -1,7 +1,7 @@
 from pathlib import Path
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import List
+from typing import Dict, List, Literal, Optional
 import os
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -20,17 +20,132 @@ class Settings(BaseSettings):
 
     superadmins: List[int] = Field(default_factory=list, alias="SUPERADMINS")
 
+    # Как получать апдейты: long polling или вебхук (см. src/webhook.py)
+    bot_mode: Literal["polling", "webhook"] = Field(default="polling", alias="BOT_MODE")
+    # Публичный адрес, на который Telegram шлёт апдейты; без него вебхук
+    # не регистрируется (удобно для локальной проверки)
+    webhook_url: Optional[str] = Field(default=None, alias="WEBHOOK_URL")
+    webhook_path: str = Field(default="/webhook", alias="WEBHOOK_PATH")
+    webhook_host: str = Field(default="0.0.0.0", alias="WEBHOOK_HOST")
+    webhook_port: int = Field(default=8080, alias="WEBHOOK_PORT")
+    webhook_secret: Optional[str] = Field(default=None, alias="WEBHOOK_SECRET")
+    webhook_max_concurrency: int = Field(default=32, alias="WEBHOOK_MAX_CONCURRENCY")
+    # Если задан, каждый пришедший апдейт дописывается сюда строкой JSON
+    webhook_record_path: Optional[str] = Field(default=None, alias="WEBHOOK_RECORD_PATH")
+
+    # Профиль PRAGMA для SQLite (см. SQLITE_PROFILES в src/database/session.py)
+    # и точечные переопределения отдельных PRAGMA поверх профиля
+    sqlite_profile: str = Field(default="tuned", alias="SQLITE_PROFILE")
+    sqlite_journal_mode: Optional[str] = Field(default=None, alias="SQLITE_JOURNAL_MODE")
+    sqlite_synchronous: Optional[str] = Field(default=None, alias="SQLITE_SYNCHRONOUS")
+    sqlite_cache_size: Optional[int] = Field(default=None, alias="SQLITE_CACHE_SIZE")
+    sqlite_mmap_size: Optional[int] = Field(default=None, alias="SQLITE_MMAP_SIZE")
+    sqlite_busy_timeout: Optional[int] = Field(default=None, alias="SQLITE_BUSY_TIMEOUT")
+
+    # Раздельные движки: одно соединение-писатель и пул read-only соединений
+    db_split_engines: bool = Field(default=False, alias="DB_SPLIT_ENGINES")
+    db_read_pool_size: int = Field(default=4, alias="DB_READ_POOL_SIZE")
+
+    # Склейка записей в одну транзакцию (src/database/writer.py)
+    write_batch_window_ms: float = Field(default=5.0, alias="WRITE_BATCH_WINDOW_MS")
+    write_batch_max_size: int = Field(default=100, alias="WRITE_BATCH_MAX_SIZE")
+
+    # Кэш пользователей в памяти (см. src/database/user_cache.py)
+    user_cache_size: int = Field(default=1024, alias="USER_CACHE_SIZE")
+    user_cache_ttl: float = Field(default=300.0, alias="USER_CACHE_TTL")
+
+    # «Живые» сообщения с очередью (см. src/services/live_views.py)
+    live_view_debounce_ms: float = Field(default=1000.0, alias="LIVE_VIEW_DEBOUNCE_MS")
+    live_view_max_per_subject: int = Field(default=50, alias="LIVE_VIEW_MAX_PER_SUBJECT")
+    live_view_ttl: float = Field(default=3600.0, alias="LIVE_VIEW_TTL")
+    live_view_chat_interval: float = Field(default=1.0, alias="LIVE_VIEW_CHAT_INTERVAL")
+
+    # Лимиты исходящих запросов к Telegram (см. src/services/outbound.py)
+    outbound_global_rate: float = Field(default=25.0, alias="OUTBOUND_GLOBAL_RATE")
+    outbound_chat_rate: float = Field(default=1.0, alias="OUTBOUND_CHAT_RATE")
+    outbound_chat_burst: float = Field(default=3.0, alias="OUTBOUND_CHAT_BURST")
+    outbound_group_rate: float = Field(default=20 / 60, alias="OUTBOUND_GROUP_RATE")
+    outbound_max_retry_after: float = Field(default=60.0, alias="OUTBOUND_MAX_RETRY_AFTER")
+
+    # Хранилище FSM: "sqlite" (переживает перезапуск) или "memory"
+    fsm_storage: Literal["sqlite", "memory"] = Field(default="sqlite", alias="FSM_STORAGE")
+    fsm_cache_size: int = Field(default=4096, alias="FSM_CACHE_SIZE")
+    # Через сколько секунд без активности состояние считается брошенным
+    fsm_state_ttl: float = Field(default=6 * 3600, alias="FSM_STATE_TTL")
+    fsm_flush_interval: float = Field(default=1.0, alias="FSM_FLUSH_INTERVAL")
+
+    # Сколько строк на странице в списках пользователей и дисциплин
+    admin_page_size: int = Field(default=20, alias="ADMIN_PAGE_SIZE")
+
+    # Длинная очередь показывается окном: первые QUEUE_VIEW_HEAD человек
+    # и QUEUE_VIEW_RADIUS вокруг зрителя (см. src/services/queue_view.py)
+    queue_view_max_lines: int = Field(default=50, alias="QUEUE_VIEW_MAX_LINES")
+    queue_view_head: int = Field(default=10, alias="QUEUE_VIEW_HEAD")
+    queue_view_radius: int = Field(default=5, alias="QUEUE_VIEW_RADIUS")
+
+    # Уведомления «скоро твоя очередь» (см. src/services/turn_notifier.py):
+    # из каких позиций можно выбрать и сколько копить уведомления перед рассылкой
+    turn_notify_positions: List[int] = Field(default=[1, 2, 3, 5], alias="TURN_NOTIFY_POSITIONS")
+    turn_notify_delay_ms: float = Field(default=1000.0, alias="TURN_NOTIFY_DELAY_MS")
+
+    # Метрики в формате Prometheus на http://METRICS_HOST:METRICS_PORT/metrics;
+    # без METRICS_PORT не собираются (см. src/services/metrics.py)
+    metrics_host: str = Field(default="127.0.0.1", alias="METRICS_HOST")
+    metrics_port: Optional[int] = Field(default=None, alias="METRICS_PORT")
+
+    # Пачка строк в одном executemany при импорте (см. src/services/bulk.py)
+    bulk_chunk_size: int = Field(default=500, alias="BULK_CHUNK_SIZE")
+
+    # Данные каждой новой группы - в своём файле SQLite рядом с основной БД
+    # (см. src/database/shards.py); без этого все группы в основной БД
+    group_shards: bool = Field(default=False, alias="GROUP_SHARDS")
+
+    # Число процессов-воркеров (см. src/workers.py): при WORKERS > 1 главный
+    # процесс только получает апдейты и раздаёт их воркерам по пользователю,
+    # а воркеры раз в WORKER_SYNC_INTERVAL_MS догоняют изменения друг друга
+    workers: int = Field(default=1, alias="WORKERS")
+    worker_sync_interval_ms: float = Field(default=200.0, alias="WORKER_SYNC_INTERVAL_MS")
+
+    # Проверка запросов к БД на апдейт (см. src/middlewares/query_budget.py):
+    # "warn" пишет нарушения в лог, "strict" роняет апдейт - для тестов
+    query_budget_mode: Literal["off", "warn", "strict"] = Field(default="off", alias="QUERY_BUDGET_MODE")
+    query_budget_default: int = Field(default=4, alias="QUERY_BUDGET_DEFAULT")
+    # Бюджеты отдельных хэндлеров, JSON: {"queue.show_queue": 1}. Горячие
+    # хэндлеры: один запрос на промах кэша пользователей плюс их собственные
+    query_budgets: Dict[str, int] = Field(
+        default_factory=lambda: {
+            "queue.choose_discipline": 2,
+            "queue.show_queue": 1,
+            "queue.join_queue": 3,
+            "queue.leave_queue": 3,
+            "queue.my_queues": 2,
+            "search.search_subjects": 2,
+        },
+        alias="QUERY_BUDGETS",
+    )
+    # Столько одинаковых запросов за апдейт считается N+1
+    query_repeat_limit: int = Field(default=3, alias="QUERY_REPEAT_LIMIT")
+
     @property
-    def db_url(self) -> str:
+    def db_file(self) -> Path:
         # Мы берем BASE_DIR и приклеиваем к нему db_path
         # Это гарантирует, что путь всегда будет от корня проекта
         db_full_path = BASE_DIR / self.db_path
 
         # Создаем директорию (например, /Queue_bot/data/), если её нет
         db_full_path.parent.mkdir(parents=True, exist_ok=True)
+        return db_full_path.absolute()
 
-        # Возвращаем абсолютный путь для SQLAlchemy
-        return f"sqlite+aiosqlite:///{db_full_path.absolute()}"
+    @property
+    def sqlite_pragma_overrides(self) -> dict:
+        overrides = {
+            "journal_mode": self.sqlite_journal_mode,
+            "synchronous": self.sqlite_synchronous,
+            "cache_size": self.sqlite_cache_size,
+            "mmap_size": self.sqlite_mmap_size,
+            "busy_timeout": self.sqlite_busy_timeout,
+        }
+        return {name: value for name, value in overrides.items() if value is not None}
 
 
 settings = Settings()
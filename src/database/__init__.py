@@ -1,3 +1,5 @@
-from .session import async_session_maker, engine  # noqa: F401
+from .session import async_session_maker, engine, write_session_maker  # noqa: F401
 from .models import Base  # noqa: F401
-
+from .queue_engine import queue_engine  # noqa: F401
+from .subject_cache import subject_catalogue  # noqa: F401
+from .shards import shard_router  # noqa: F401
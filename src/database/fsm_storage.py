@@ -0,0 +1,284 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from .models import FsmState
+from .writer import DatabaseWriter
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Record:
+    state: Optional[str] = None
+    data: Dict[str, Any] = field(default_factory=dict)
+    touched_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def empty(self) -> bool:
+        return self.state is None and not self.data
+
+
+def _dump_key(key: StorageKey) -> str:
+    return json.dumps(
+        [key.bot_id, key.chat_id, key.user_id, key.thread_id, key.business_connection_id, key.destiny]
+    )
+
+
+def _load_key(raw: str) -> StorageKey:
+    bot_id, chat_id, user_id, thread_id, business_connection_id, destiny = json.loads(raw)
+    return StorageKey(bot_id, chat_id, user_id, thread_id, business_connection_id, destiny)
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM-хранилище aiogram в таблице FsmStates с кэшем в памяти.
+
+    Чтение - из кэша (как у MemoryStorage). При старте (load) в память
+    поднимаются все живые состояния, а множество ключей, у которых есть
+    строка в БД, позволяет не ходить в БД за теми, у кого состояния нет.
+
+    Запись - только в кэш (write-back): изменённые ключи раз в
+    flush_interval секунд одной пачкой уходят через писателя БД.
+    Пустое состояние - это удаление строки.
+
+    Память ограничена: кэш - LRU на max_size записей (вытесняются только
+    уже сохранённые), а состояния, которых не трогали дольше ttl секунд,
+    считаются брошенными и удаляются и из памяти, и из БД.
+
+    Если БД делят несколько процессов (src/workers.py), owns оставляет
+    процессу только его ключи: чужие состояния он не читает и не сбрасывает.
+    """
+
+    def __init__(
+        self,
+        read_session_maker: async_sessionmaker,
+        writer: DatabaseWriter,
+        max_size: int,
+        ttl: float,
+        flush_interval: float,
+        owns: Optional[Callable[[StorageKey], bool]] = None,
+    ) -> None:
+        self.read_session_maker = read_session_maker
+        self.writer = writer
+        self.max_size = max_size
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.owns = owns
+
+        # Ключ в памяти - сам StorageKey, строка для БД строится только при записи
+        self._cache: "OrderedDict[StorageKey, _Record]" = OrderedDict()
+        self._dirty: Set[StorageKey] = set()
+        # Ключи, у которых есть строка в БД
+        self._stored: Set[StorageKey] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._last_sweep = time.monotonic()
+
+    async def load(self) -> None:
+        """Удалить брошенные состояния в БД и поднять остальные в память"""
+        await self.writer.submit(self._delete_expired)
+        async with self.read_session_maker() as session:
+            result = await session.execute(select(FsmState.key, FsmState.state, FsmState.data))
+            rows = result.all()
+
+        keys = [_load_key(row.key) for row in rows]
+        if self.owns is not None:
+            rows = [row for key, row in zip(keys, rows) if self.owns(key)]
+            keys = [key for key in keys if self.owns(key)]
+        self._stored = set(keys)
+        for key, row in list(zip(keys, rows))[-self.max_size:]:
+            self._cache[key] = _Record(row.state, json.loads(row.data))
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run_forever())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    # --- BaseStorage ---
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = await self._get(key) or _Record()
+        record.state = state.state if isinstance(state, State) else state
+        self._touch(key, record)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        record = await self._get(key)
+        return None if record is None else record.state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        record = await self._get(key) or _Record()
+        record.data = data.copy()
+        self._touch(key, record)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        record = await self._get(key)
+        return {} if record is None else record.data.copy()
+
+    # --- кэш ---
+
+    async def _get(self, key: StorageKey) -> Optional[_Record]:
+        record = self._cache.get(key)
+        if record is not None:
+            record.touched_at = time.monotonic()
+            self._cache.move_to_end(key)
+            return record
+        if key not in self._stored:
+            # Состояния нет - в БД не ходим и память не занимаем
+            return None
+
+        # Вытесненная из кэша запись - читаем из БД
+        async with self.read_session_maker() as session:
+            row = await session.get(FsmState, _dump_key(key))
+        loaded = _Record() if row is None else _Record(row.state, json.loads(row.data))
+        # Пока читали, запись могли изменить - тогда верна та, что в кэше
+        record = self._cache.setdefault(key, loaded)
+        self._cache.move_to_end(key)
+        self._evict()
+        return record
+
+    def _touch(self, key: StorageKey, record: _Record) -> None:
+        record.touched_at = time.monotonic()
+        self._cache[key] = record
+        self._cache.move_to_end(key)
+        self._dirty.add(key)
+        self._evict()
+
+    def _evict(self) -> None:
+        excess = len(self._cache) - self.max_size
+        if excess <= 0:
+            return
+        # С самых давних; несохранённые пропускаем - их выгрузит flush
+        victims = []
+        for key in self._cache:
+            if key not in self._dirty:
+                victims.append(key)
+                if len(victims) == excess:
+                    break
+        for key in victims:
+            del self._cache[key]
+
+    def _expire(self) -> None:
+        """Сбросить состояния, которых не трогали дольше ttl"""
+        deadline = time.monotonic() - self.ttl
+        for key, record in list(self._cache.items()):
+            if record.touched_at >= deadline:
+                # Кэш упорядочен по последнему обращению - дальше только свежие
+                break
+            if not record.empty:
+                record.state, record.data = None, {}
+                self._dirty.add(key)
+            elif key not in self._dirty:
+                del self._cache[key]
+
+    # --- сброс в БД ---
+
+    async def _run_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self._expire()
+            try:
+                await self.flush()
+                if time.monotonic() - self._last_sweep > min(self.ttl, 600):
+                    await self._sweep()
+            except Exception:
+                logger.exception("Не удалось сохранить состояния FSM")
+
+    async def flush(self) -> None:
+        if not self._dirty:
+            return
+        keys, self._dirty = self._dirty, set()
+        now = datetime.now()
+        deletes = []
+        rows = []
+        for key in keys:
+            record = self._cache.get(key)
+            if record is None or record.empty:
+                deletes.append(key)
+            else:
+                rows.append(
+                    {
+                        "key": _dump_key(key),
+                        "state": record.state,
+                        "data": json.dumps(record.data, ensure_ascii=False),
+                        "updated_at": now,
+                    }
+                )
+
+        async def write(session: AsyncSession) -> None:
+            if deletes:
+                await session.execute(
+                    delete(FsmState).where(FsmState.key.in_([_dump_key(key) for key in deletes]))
+                )
+            if rows:
+                stmt = insert(FsmState).values(rows)
+                await session.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=[FsmState.key],
+                        set_={
+                            "state": stmt.excluded.state,
+                            "data": stmt.excluded.data,
+                            "updated_at": stmt.excluded.updated_at,
+                        },
+                    )
+                )
+
+        try:
+            await self.writer.submit(write)
+        except Exception:
+            # Не потеряем изменения: попробуем в следующий раз
+            self._dirty |= keys
+            raise
+
+        self._stored.difference_update(deletes)
+        self._stored.update(keys.difference(deletes))
+        for key in deletes:
+            # Удалённые пустые записи в памяти больше не нужны
+            record = self._cache.get(key)
+            if record is not None and record.empty and key not in self._dirty:
+                del self._cache[key]
+        self._evict()
+
+    async def _sweep(self) -> None:
+        """Удалить из БД брошенные состояния, которых нет в кэше"""
+        self._last_sweep = time.monotonic()
+        expired = [_load_key(raw) for raw in await self.writer.submit(self._delete_expired)]
+        self._stored.difference_update(expired)
+        for key in expired:
+            if key in self._cache:
+                # Состояние читали, но не меняли - оно живо, сохраним заново
+                self._dirty.add(key)
+
+    async def _delete_expired(self, session: AsyncSession) -> List[str]:
+        """Удалить брошенные состояния; с owns - только свои, чужие держит их воркер"""
+        deadline = datetime.now() - timedelta(seconds=self.ttl)
+        if self.owns is None:
+            result = await session.execute(
+                delete(FsmState).where(FsmState.updated_at < deadline).returning(FsmState.key)
+            )
+            return list(result.scalars())
+
+        result = await session.execute(select(FsmState.key).where(FsmState.updated_at < deadline))
+        expired = [raw for raw in result.scalars() if self.owns(_load_key(raw))]
+        if expired:
+            await session.execute(delete(FsmState).where(FsmState.key.in_(expired)))
+        return expired
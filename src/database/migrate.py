@@ -0,0 +1,43 @@
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent / "migrations"
+
+# Ревизии, которым соответствуют базы, созданные до alembic через create_all
+_LEGACY_REVISION = "0001"
+_LEGACY_WITH_NORMALIZED_NAME = "0002"
+
+
+def alembic_config(connection: Connection) -> Config:
+    # Без alembic.ini: он настраивает logging, а боту это не нужно
+    config = Config()
+    config.set_main_option("script_location", str(MIGRATIONS_DIR))
+    config.attributes["connection"] = connection
+    return config
+
+
+def _upgrade(connection: Connection, revision: str) -> None:
+    config = alembic_config(connection)
+
+    tables = set(inspect(connection).get_table_names())
+    if "alembic_version" not in tables and "Subjects" in tables:
+        # Схему раньше создавал Base.metadata.create_all - помечаем,
+        # до какой ревизии она уже доведена, и дальше идём миграциями
+        columns = {column["name"] for column in inspect(connection).get_columns("Subjects")}
+        command.stamp(
+            config,
+            _LEGACY_WITH_NORMALIZED_NAME if "name_normalized" in columns else _LEGACY_REVISION,
+        )
+
+    command.upgrade(config, revision)
+
+
+async def upgrade_db(engine: AsyncEngine, revision: str = "head") -> None:
+    """Применить миграции к базе (по умолчанию - все)"""
+    async with engine.begin() as connection:
+        await connection.run_sync(_upgrade, revision)
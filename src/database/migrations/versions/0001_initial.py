@@ -0,0 +1,50 @@
+"""initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 12:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "Users",
+        sa.Column("tg_id", sa.BigInteger(), nullable=False),
+        sa.Column("full_name", sa.String(), nullable=False),
+        sa.Column("role", sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint("tg_id"),
+    )
+    op.create_table(
+        "Subjects",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("name"),
+    )
+    op.create_table(
+        "Queues",
+        sa.Column("user_id", sa.BigInteger(), nullable=False),
+        sa.Column("subject_id", sa.Integer(), nullable=False),
+        sa.Column("joined_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["subject_id"], ["Subjects.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["user_id"], ["Users.tg_id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("user_id", "subject_id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("Queues")
+    op.drop_table("Subjects")
+    op.drop_table("Users")
@@ -0,0 +1,93 @@
+"""unique normalized subject name
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 12:00:00
+
+"""
+import logging
+from collections import defaultdict
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+logger = logging.getLogger(__name__)
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("Subjects", sa.Column("name_normalized", sa.String(), nullable=True))
+
+    # Та же нормализация, что и normalize_subject_name в models.py
+    connection = op.get_bind()
+    subjects = connection.execute(
+        sa.text('SELECT id, name FROM "Subjects" ORDER BY id')
+    ).fetchall()
+    duplicates = defaultdict(list)
+    for subject_id, name in subjects:
+        duplicates[name.strip().casefold()].append((subject_id, name))
+        connection.execute(
+            sa.text('UPDATE "Subjects" SET name_normalized = :name WHERE id = :id'),
+            {"name": name.strip().casefold(), "id": subject_id},
+        )
+
+    # Раньше уникальность была с учётом регистра: «Физика» и «физика »
+    # могли сосуществовать. Сливаем такие дисциплины в самую старую
+    for same in duplicates.values():
+        (keep_id, keep_name), rest = same[0], same[1:]
+        for duplicate_id, duplicate_name in rest:
+            logger.warning(
+                "Дисциплина %r совпадает с %r без учёта регистра - очередь перенесена в неё",
+                duplicate_name,
+                keep_name,
+            )
+            _merge_subject(connection, keep_id, duplicate_id)
+
+    with op.batch_alter_table("Subjects") as batch_op:
+        batch_op.alter_column("name_normalized", existing_type=sa.String(), nullable=False)
+
+    op.create_index(
+        "uq_subjects_name_normalized", "Subjects", ["name_normalized"], unique=True
+    )
+
+
+def _merge_subject(connection: sa.Connection, keep_id: int, duplicate_id: int) -> None:
+    """Перенести очередь дисциплины duplicate_id в keep_id и удалить дубликат"""
+    params = {"keep": keep_id, "duplicate": duplicate_id}
+    # Стоящий в обеих очередях остаётся на более раннем месте
+    connection.execute(
+        sa.text("""
+            UPDATE "Queues" SET joined_at = (
+                SELECT MIN(q.joined_at) FROM "Queues" q
+                WHERE q.user_id = "Queues".user_id AND q.subject_id IN (:keep, :duplicate)
+            )
+            WHERE subject_id = :keep
+              AND user_id IN (SELECT user_id FROM "Queues" WHERE subject_id = :duplicate)
+        """),
+        params,
+    )
+    connection.execute(
+        sa.text("""
+            DELETE FROM "Queues"
+            WHERE subject_id = :duplicate
+              AND user_id IN (SELECT user_id FROM "Queues" WHERE subject_id = :keep)
+        """),
+        params,
+    )
+    connection.execute(
+        sa.text('UPDATE "Queues" SET subject_id = :keep WHERE subject_id = :duplicate'),
+        params,
+    )
+    connection.execute(sa.text('DELETE FROM "Subjects" WHERE id = :duplicate'), params)
+
+
+def downgrade() -> None:
+    op.drop_index("uq_subjects_name_normalized", table_name="Subjects")
+    with op.batch_alter_table("Subjects") as batch_op:
+        batch_op.drop_column("name_normalized")
@@ -0,0 +1,34 @@
+"""covering indexes for queue access paths
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 12:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Очередь по дисциплине: WHERE subject_id ORDER BY joined_at
+    op.create_index(
+        "ix_queues_subject_joined", "Queues", ["subject_id", "joined_at", "user_id"]
+    )
+    # «Мои очереди»: WHERE user_id, плюс subject_id и joined_at без чтения таблицы
+    op.create_index(
+        "ix_queues_user_subject_joined", "Queues", ["user_id", "subject_id", "joined_at"]
+    )
+    op.execute("ANALYZE")
+
+
+def downgrade() -> None:
+    op.drop_index("ix_queues_user_subject_joined", table_name="Queues")
+    op.drop_index("ix_queues_subject_joined", table_name="Queues")
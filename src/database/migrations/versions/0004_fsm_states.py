@@ -0,0 +1,35 @@
+"""persistent FSM states
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 12:00:00
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "FsmStates",
+        sa.Column("key", sa.String(), nullable=False),
+        sa.Column("state", sa.String(), nullable=True),
+        sa.Column("data", sa.Text(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("key"),
+    )
+    op.create_index("ix_FsmStates_updated_at", "FsmStates", ["updated_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_FsmStates_updated_at", table_name="FsmStates")
+    op.drop_table("FsmStates")
@@ -0,0 +1,27 @@
+"""index for keyset pagination of users
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 12:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Страница пользователей: WHERE (full_name, tg_id) > (...) ORDER BY full_name, tg_id
+    op.create_index("ix_users_full_name_tg_id", "Users", ["full_name", "tg_id"])
+    op.execute("ANALYZE")
+
+
+def downgrade() -> None:
+    op.drop_index("ix_users_full_name_tg_id", table_name="Users")
@@ -0,0 +1,136 @@
+"""append-only queue event log with per-subject statistics
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 12:00:00
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Границы корзин гистограммы ожидания, секунды: от минуты до недели
+WAIT_BUCKETS = (
+    60, 180, 300, 600, 900, 1200, 1800, 2700, 3600, 5400, 7200, 10800,
+    14400, 21600, 28800, 43200, 86400, 172800, 604800,
+)
+# Корзина «дольше недели»
+WAIT_OVERFLOW = 2147483647
+
+
+def _bucket_sql() -> str:
+    cases = " ".join(f"WHEN NEW.wait_seconds <= {bound} THEN {bound}" for bound in WAIT_BUCKETS)
+    return f"CASE {cases} ELSE {WAIT_OVERFLOW} END"
+
+
+def upgrade() -> None:
+    op.create_table(
+        "QueueEvents",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("subject_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.BigInteger(), nullable=False),
+        sa.Column("kind", sa.String(), nullable=False),
+        sa.Column("at", sa.DateTime(), nullable=False),
+        sa.Column("position", sa.Integer(), nullable=True),
+        sa.Column("wait_seconds", sa.Float(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_queue_events_subject_at", "QueueEvents", ["subject_id", "at"])
+    op.create_table(
+        "SubjectStats",
+        sa.Column("subject_id", sa.Integer(), nullable=False),
+        sa.Column("joins", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("served", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("left_early", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("cleared", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("wait_sum", sa.Float(), server_default="0", nullable=False),
+        sa.Column("wait_max", sa.Float(), server_default="0", nullable=False),
+        sa.Column("peak_length", sa.Integer(), server_default="0", nullable=False),
+        sa.PrimaryKeyConstraint("subject_id"),
+    )
+    op.create_table(
+        "SubjectWaitBuckets",
+        sa.Column("subject_id", sa.Integer(), nullable=False),
+        sa.Column("le_seconds", sa.Integer(), nullable=False),
+        sa.Column("count", sa.Integer(), server_default="0", nullable=False),
+        sa.PrimaryKeyConstraint("subject_id", "le_seconds"),
+    )
+
+    # Журнал только пополняется
+    op.execute("""
+        CREATE TRIGGER trg_queue_events_no_update BEFORE UPDATE ON "QueueEvents"
+        BEGIN SELECT RAISE(ABORT, 'QueueEvents is append-only'); END
+    """)
+    op.execute("""
+        CREATE TRIGGER trg_queue_events_no_delete BEFORE DELETE ON "QueueEvents"
+        BEGIN SELECT RAISE(ABORT, 'QueueEvents is append-only'); END
+    """)
+    # Агрегаты обновляются на каждое событие, а не пересчитываются по журналу
+    op.execute("""
+        CREATE TRIGGER trg_queue_events_stats AFTER INSERT ON "QueueEvents"
+        BEGIN
+            INSERT OR IGNORE INTO "SubjectStats" (subject_id) VALUES (NEW.subject_id);
+            UPDATE "SubjectStats" SET
+                joins = joins + (NEW.kind = 'join'),
+                served = served + (NEW.kind = 'served'),
+                left_early = left_early + (NEW.kind = 'leave'),
+                cleared = cleared + (NEW.kind = 'clear'),
+                wait_sum = wait_sum
+                    + CASE WHEN NEW.kind = 'served' THEN COALESCE(NEW.wait_seconds, 0) ELSE 0 END,
+                wait_max = MAX(wait_max,
+                    CASE WHEN NEW.kind = 'served' THEN COALESCE(NEW.wait_seconds, 0) ELSE 0 END),
+                peak_length = MAX(peak_length,
+                    CASE WHEN NEW.kind = 'join' THEN COALESCE(NEW.position, 0) ELSE 0 END)
+            WHERE subject_id = NEW.subject_id;
+        END
+    """)
+    op.execute(f"""
+        CREATE TRIGGER trg_queue_events_wait AFTER INSERT ON "QueueEvents"
+        WHEN NEW.kind = 'served' AND NEW.wait_seconds IS NOT NULL
+        BEGIN
+            INSERT INTO "SubjectWaitBuckets" (subject_id, le_seconds, count)
+            VALUES (NEW.subject_id, {_bucket_sql()}, 1)
+            ON CONFLICT (subject_id, le_seconds) DO UPDATE SET count = count + 1;
+        END
+    """)
+
+    # Журнал остаётся, а статистика уходит вместе с дисциплиной
+    op.execute("""
+        CREATE TRIGGER trg_subjects_drop_stats AFTER DELETE ON "Subjects"
+        BEGIN
+            DELETE FROM "SubjectStats" WHERE subject_id = OLD.id;
+            DELETE FROM "SubjectWaitBuckets" WHERE subject_id = OLD.id;
+        END
+    """)
+
+    # Тех, кто уже стоит в очередях, записываем в журнал как вставших
+    op.execute("""
+        INSERT INTO "QueueEvents" (subject_id, user_id, kind, at, position)
+        SELECT subject_id, user_id, 'join', joined_at,
+               ROW_NUMBER() OVER (PARTITION BY subject_id ORDER BY joined_at, user_id)
+        FROM "Queues"
+        ORDER BY subject_id, joined_at, user_id
+    """)
+
+
+def downgrade() -> None:
+    for trigger in (
+        "trg_subjects_drop_stats",
+        "trg_queue_events_wait",
+        "trg_queue_events_stats",
+        "trg_queue_events_no_delete",
+        "trg_queue_events_no_update",
+    ):
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    op.drop_table("SubjectWaitBuckets")
+    op.drop_table("SubjectStats")
+    op.drop_index("ix_queue_events_subject_at", table_name="QueueEvents")
+    op.drop_table("QueueEvents")
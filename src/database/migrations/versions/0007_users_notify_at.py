@@ -0,0 +1,27 @@
+"""opt-in "your turn is coming" notifications
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 12:00:00
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("Users", sa.Column("notify_at", sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("Users") as batch_op:
+        batch_op.drop_column("notify_at")
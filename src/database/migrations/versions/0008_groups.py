@@ -0,0 +1,97 @@
+"""student groups: group-scoped users and subjects
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 12:00:00
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0008"
+down_revision: Union[str, None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Пересоздание Subjects удаляет и триггер из 0006 - ставим его заново
+_DROP_STATS_TRIGGER = """
+    CREATE TRIGGER trg_subjects_drop_stats AFTER DELETE ON "Subjects"
+    BEGIN
+        DELETE FROM "SubjectStats" WHERE subject_id = OLD.id;
+        DELETE FROM "SubjectWaitBuckets" WHERE subject_id = OLD.id;
+    END
+"""
+
+
+def _subjects_table(*extra: sa.Column) -> sa.Table:
+    """Структура Subjects до этой ревизии (вместо отражения с безымянным UNIQUE)"""
+    return sa.Table(
+        "Subjects",
+        sa.MetaData(),
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("name_normalized", sa.String(), nullable=False),
+        *extra,
+    )
+
+
+def upgrade() -> None:
+    op.create_table(
+        "Groups",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("shard", sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("name"),
+    )
+    # Всё, что было до групп, становится первой группой
+    op.execute("""INSERT INTO "Groups" (id, name) VALUES (1, 'Основная группа')""")
+
+    op.add_column("Users", sa.Column("group_id", sa.Integer(), nullable=True))
+    op.execute('UPDATE "Users" SET group_id = 1')
+    op.create_index(
+        "ix_users_group_full_name_tg_id", "Users", ["group_id", "full_name", "tg_id"]
+    )
+
+    # Название уникально внутри группы, а не глобально. AUTOINCREMENT - чтобы
+    # id не переиспользовались и в шардах шли со своего диапазона
+    op.drop_index("uq_subjects_name_normalized", table_name="Subjects")
+    op.execute("DROP TRIGGER IF EXISTS trg_subjects_drop_stats")
+    with op.batch_alter_table(
+        "Subjects",
+        copy_from=_subjects_table(),
+        recreate="always",
+        table_kwargs={"sqlite_autoincrement": True},
+    ) as batch_op:
+        batch_op.add_column(sa.Column("group_id", sa.Integer(), nullable=True))
+    op.execute('UPDATE "Subjects" SET group_id = 1')
+    op.create_index(
+        "uq_subjects_group_name", "Subjects", ["group_id", "name_normalized"], unique=True
+    )
+    op.execute(_DROP_STATS_TRIGGER)
+    op.execute("ANALYZE")
+
+
+def downgrade() -> None:
+    op.drop_index("uq_subjects_group_name", table_name="Subjects")
+    op.execute("DROP TRIGGER IF EXISTS trg_subjects_drop_stats")
+    with op.batch_alter_table(
+        "Subjects",
+        copy_from=_subjects_table(sa.Column("group_id", sa.Integer(), nullable=True)),
+        recreate="always",
+    ) as batch_op:
+        batch_op.drop_column("group_id")
+        batch_op.create_unique_constraint("uq_subjects_name", ["name"])
+    op.create_index(
+        "uq_subjects_name_normalized", "Subjects", ["name_normalized"], unique=True
+    )
+    op.execute(_DROP_STATS_TRIGGER)
+
+    op.drop_index("ix_users_group_full_name_tg_id", table_name="Users")
+    with op.batch_alter_table("Users") as batch_op:
+        batch_op.drop_column("group_id")
+    op.drop_table("Groups")
@@ -0,0 +1,47 @@
+"""change counters for cross-process cache invalidation
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 12:00:00
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0009"
+down_revision: Union[str, None] = "0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Таблицы, изменения которых должны видеть кэши других процессов
+COUNTED_TABLES = ("Users", "Subjects", "Groups")
+
+
+def upgrade() -> None:
+    op.create_table(
+        "ChangeCounters",
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("value", sa.Integer(), server_default="0", nullable=False),
+        sa.PrimaryKeyConstraint("name"),
+    )
+    for table in COUNTED_TABLES:
+        op.execute(f"""INSERT INTO "ChangeCounters" (name) VALUES ('{table}')""")
+        for operation in ("INSERT", "UPDATE", "DELETE"):
+            op.execute(f"""
+                CREATE TRIGGER trg_{table.lower()}_count_{operation.lower()}
+                AFTER {operation} ON "{table}"
+                BEGIN
+                    UPDATE "ChangeCounters" SET value = value + 1 WHERE name = '{table}';
+                END
+            """)
+
+
+def downgrade() -> None:
+    for table in COUNTED_TABLES:
+        for operation in ("INSERT", "UPDATE", "DELETE"):
+            op.execute(f"DROP TRIGGER IF EXISTS trg_{table.lower()}_count_{operation.lower()}")
+    op.drop_table("ChangeCounters")
@@ -1,31 +1,87 @@
 from datetime import datetime
-from sqlalchemy import BigInteger, DateTime, ForeignKey, String, Integer
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
+from typing import Optional
+
+from sqlalchemy import BigInteger, DateTime, Float, ForeignKey, Index, String, Integer, Text
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship, validates
 
 class Base(DeclarativeBase):
     pass
 
+# Группа, которой принадлежит всё, что было в БД до появления групп
+DEFAULT_GROUP_ID = 1
+
+
+class Group(Base):
+    """
+    Учебная группа. Живёт только в основной БД: это справочник, по которому
+    видно, в каком файле (шарде) лежат данные группы (см. src/database/shards.py).
+    """
+
+    __tablename__ = "Groups"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    name: Mapped[str] = mapped_column(String, unique=True)
+    # Имя отдельного файла SQLite; None - данные группы в основной БД
+    shard: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+
+
 class User(Base):
     __tablename__ = "Users" # Как на скриншоте
+    __table_args__ = (
+        # Постраничный список пользователей: ORDER BY full_name, tg_id
+        Index("ix_users_full_name_tg_id", "full_name", "tg_id"),
+        # Пользователи группы в том же порядке
+        Index("ix_users_group_full_name_tg_id", "group_id", "full_name", "tg_id"),
+    )
 
     # На скриншоте tg_id является первичным ключом
     tg_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
     full_name: Mapped[str] = mapped_column(String)
     role: Mapped[str] = mapped_column(String, default="student")
+    # Группа; роль admin действует только в ней
+    group_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    # Уведомлять, когда он встанет на это место в очереди, считая с 1
+    # (1 - стал первым); None - выключено
+    notify_at: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
 
     queues: Mapped[list["Queue"]] = relationship(back_populates="user")
 
+def normalize_subject_name(name: str) -> str:
+    """Ключ для сравнения названий дисциплин без учёта регистра"""
+    return name.strip().casefold()
+
+
 class Subject(Base):
     __tablename__ = "Subjects" # Как на скриншоте
+    __table_args__ = (
+        # Дубликаты «Физика»/«физика» внутри группы запрещены на уровне БД
+        Index("uq_subjects_group_name", "group_id", "name_normalized", unique=True),
+        # id не переиспользуются, а в шардах начинаются со своего диапазона,
+        # так что id дисциплины уникален во всех файлах сразу
+        {"sqlite_autoincrement": True},
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    name: Mapped[str] = mapped_column(String, unique=True)
+    name: Mapped[str] = mapped_column(String)
+    name_normalized: Mapped[str] = mapped_column(String)
+    group_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
 
     queues: Mapped[list["Queue"]] = relationship(back_populates="subject")
 
+    @validates("name")
+    def _sync_name_normalized(self, key: str, name: str) -> str:
+        self.name_normalized = normalize_subject_name(name)
+        return name
+
 
 class Queue(Base):
     __tablename__ = "Queues"
+    __table_args__ = (
+        # Очередь по дисциплине: WHERE subject_id ORDER BY joined_at (покрывающий)
+        Index("ix_queues_subject_joined", "subject_id", "joined_at", "user_id"),
+        # Очереди пользователя («Мои очереди») вместе с временем записи
+        Index("ix_queues_user_subject_joined", "user_id", "subject_id", "joined_at"),
+    )
     # Эти два поля вместе образуют уникальный ключ
     user_id: Mapped[int] = mapped_column(
         ForeignKey("Users.tg_id", ondelete="CASCADE"),
@@ -38,4 +94,89 @@ class Queue(Base):
     joined_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     # Отношения остаются прежними
     user: Mapped["User"] = relationship(back_populates="queues")
-    subject: Mapped["Subject"] = relationship(back_populates="queues")
\ No newline at end of file
+    subject: Mapped["Subject"] = relationship(back_populates="queues")
+
+
+# Виды событий очереди
+EVENT_JOIN = "join"
+# Ушёл сам, стоя первым - дождался своей очереди
+EVENT_SERVED = "served"
+# Ушёл сам раньше или был удалён старостой
+EVENT_LEAVE = "leave"
+# Снят очисткой очереди
+EVENT_CLEAR = "clear"
+
+
+class QueueEvent(Base):
+    """
+    Журнал очередей: строки только добавляются, UPDATE и DELETE запрещены
+    триггерами. Каждая вставка обновляет SubjectStats и SubjectWaitBuckets
+    (тоже триггерами, см. миграцию 0006).
+    """
+
+    __tablename__ = "QueueEvents"
+    __table_args__ = (Index("ix_queue_events_subject_at", "subject_id", "at"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    # Без внешних ключей: история переживает удаление пользователя и дисциплины
+    subject_id: Mapped[int] = mapped_column(Integer)
+    user_id: Mapped[int] = mapped_column(BigInteger)
+    kind: Mapped[str] = mapped_column(String)
+    at: Mapped[datetime] = mapped_column(DateTime)
+    # join - длина очереди после записи, остальные - с какого места ушёл
+    position: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    # Сколько простоял в очереди (для всех событий, кроме join)
+    wait_seconds: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+
+
+class SubjectStats(Base):
+    """Счётчики по дисциплине, поддерживаются триггером на QueueEvents"""
+
+    __tablename__ = "SubjectStats"
+
+    subject_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    joins: Mapped[int] = mapped_column(Integer, server_default="0")
+    served: Mapped[int] = mapped_column(Integer, server_default="0")
+    left_early: Mapped[int] = mapped_column(Integer, server_default="0")
+    cleared: Mapped[int] = mapped_column(Integer, server_default="0")
+    # Ожидание считается только у дождавшихся (served)
+    wait_sum: Mapped[float] = mapped_column(Float, server_default="0")
+    wait_max: Mapped[float] = mapped_column(Float, server_default="0")
+    peak_length: Mapped[int] = mapped_column(Integer, server_default="0")
+
+
+class SubjectWaitBucket(Base):
+    """Гистограмма ожидания: сколько дождавшихся простояли не дольше le_seconds"""
+
+    __tablename__ = "SubjectWaitBuckets"
+
+    subject_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    le_seconds: Mapped[int] = mapped_column(Integer, primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, server_default="0")
+
+
+class ChangeCounter(Base):
+    """
+    Счётчик изменений таблицы (Users, Subjects, Groups), растёт триггерами
+    на каждую изменённую строку. По нему процессы-воркеры понимают, что
+    другой процесс поменял таблицу и кэш в памяти устарел (src/services/worker_sync.py).
+    """
+
+    __tablename__ = "ChangeCounters"
+
+    name: Mapped[str] = mapped_column(String, primary_key=True)
+    value: Mapped[int] = mapped_column(Integer, server_default="0")
+
+
+class FsmState(Base):
+    """Состояние FSM aiogram (см. src/database/fsm_storage.py)"""
+
+    __tablename__ = "FsmStates"
+
+    # Ключ DefaultKeyBuilder: бот, чат, пользователь и т.д.
+    key: Mapped[str] = mapped_column(String, primary_key=True)
+    state: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    # Данные FSM в JSON
+    data: Mapped[str] = mapped_column(Text, default="{}")
+    # По нему удаляются брошенные состояния
+    updated_at: Mapped[datetime] = mapped_column(DateTime, index=True)
@@ -0,0 +1,122 @@
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, Iterator, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import ORMExecuteState, Session
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+
+def fingerprint(statement: str) -> str:
+    """SQL без значений: одинаковые по форме запросы дают один отпечаток"""
+    statement = _WHITESPACE.sub(" ", statement).strip()
+    statement = _STRING.sub("?", statement)
+    statement = _NUMBER.sub("?", statement)
+    return _IN_LIST.sub("(?, ...)", statement)
+
+
+class QueryBudgetExceeded(Exception):
+    """Апдейт (или блок assert_queries) сделал больше запросов, чем разрешено"""
+
+
+@dataclass
+class QueryStats:
+    """Сколько запросов к БД сделано и сколько времени они заняли"""
+
+    queries: int = 0
+    seconds: float = 0.0
+    # Отпечатки запросов и подгрузки связей (selectinload, lazy load);
+    # собираются только в режиме проверки, когда statements не None
+    statements: Optional[Counter] = None
+    relationship_loads: List[str] = field(default_factory=list)
+
+    def problems(self, budget: int, repeat_limit: int) -> List[str]:
+        """Нарушения: превышен бюджет, повторяющиеся запросы (N+1), подгрузки связей"""
+        found = []
+        if self.queries > budget:
+            found.append(f"{self.queries} запросов при бюджете {budget}")
+        for statement, count in (self.statements or Counter()).most_common():
+            if count < repeat_limit:
+                break
+            found.append(f"{count} одинаковых запросов: {statement}")
+        for relationship in self.relationship_loads:
+            found.append(f"подгрузка связи {relationship}")
+        return found
+
+
+# Счётчик текущего апдейта (или None вне обработки апдейта)
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+# Наблюдатели за каждым запросом: получают длительность в секундах
+query_observers: List[Callable[[float], None]] = []
+
+
+def current_query_stats() -> Optional[QueryStats]:
+    return _current.get()
+
+
+@contextmanager
+def collect_queries(stats: Optional[QueryStats]) -> Iterator[Optional[QueryStats]]:
+    """Запросы внутри блока засчитываются в stats"""
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def assert_queries(budget: int, repeat_limit: int = 3) -> Iterator[QueryStats]:
+    """
+    Проверка для тестов и скриптов: блок должен уложиться в budget запросов,
+    без повторов одного запроса repeat_limit и более раз и без подгрузок связей.
+    """
+    stats = QueryStats(statements=Counter())
+    with collect_queries(stats):
+        yield stats
+    problems = stats.problems(budget, repeat_limit)
+    if problems:
+        raise QueryBudgetExceeded("; ".join(problems))
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """
+    Засекать время каждого запроса движка. Время - настенное: пока
+    aiosqlite ждёт свой поток, event loop успевает поработать и с
+    другими апдейтами.
+    """
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany) -> None:
+        context._query_started = time.perf_counter()
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany) -> None:
+        elapsed = time.perf_counter() - context._query_started
+        stats = _current.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.seconds += elapsed
+            if stats.statements is not None:
+                stats.statements[fingerprint(statement)] += 1
+        for observer in query_observers:
+            observer(elapsed)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_relationship_loads(orm_execute_state: ORMExecuteState) -> None:
+    stats = _current.get()
+    if stats is None or stats.statements is None or not orm_execute_state.is_relationship_load:
+        return
+    path = orm_execute_state.loader_strategy_path
+    # Последний элемент пути - сама связь, например Queue.user
+    stats.relationship_loads.append(str(path[-1]) if path else "?")
@@ -0,0 +1,227 @@
+from bisect import bisect_right
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import Queue, User
+
+
+@dataclass(frozen=True)
+class QueueEntry:
+    """Запись очереди в памяти: кто и когда встал"""
+
+    user_id: int
+    full_name: str
+    joined_at: datetime
+
+    @property
+    def sort_key(self) -> Tuple[datetime, int]:
+        return self.joined_at, self.user_id
+
+
+class QueueEngine:
+    """
+    Очереди по всем дисциплинам в памяти процесса.
+
+    Загружается из таблицы Queues один раз при старте, а дальше меняется
+    только после коммита соответствующих изменений в БД (см. on_commit
+    в requests.py). Чтение очереди, позиции и проверка «стоит ли в очереди»
+    не ходят в БД.
+
+    Очередь хранится как неизменяемый кортеж (copy-on-write): запись редкая,
+    а чтения получают готовый снимок без копирования и блокировок.
+
+    У каждой очереди есть версия, которая растёт при любом изменении,
+    а подписчики (subscribe) узнают об изменениях по subject_id.
+    Подписчики сдвигов (subscribe_shift) узнают, с какого места ушёл
+    человек: все, кто стоял за ним, поднялись на одну позицию.
+    """
+
+    def __init__(self) -> None:
+        self._queues: Dict[int, Tuple[QueueEntry, ...]] = {}
+        # subject_id -> user_id -> индекс в кортеже очереди
+        self._positions: Dict[int, Dict[int, int]] = {}
+        self._user_subjects: Dict[int, Set[int]] = defaultdict(set)
+        self._versions: Dict[int, int] = defaultdict(int)
+        self._listeners: List[Callable[[int], None]] = []
+        self._shift_listeners: List[Callable[[int, int], None]] = []
+        self._drop_listeners: List[Callable[[int], None]] = []
+
+    async def load(self, *sessions: AsyncSession) -> None:
+        """Полностью перечитать очереди из БД (по сессии на каждый шард)"""
+        queues: Dict[int, list] = defaultdict(list)
+        for session in sessions:
+            result = await session.execute(
+                select(Queue.subject_id, Queue.user_id, User.full_name, Queue.joined_at)
+                .join(User, User.tg_id == Queue.user_id)
+                .order_by(Queue.subject_id, Queue.joined_at, Queue.user_id)
+            )
+            for subject_id, user_id, full_name, joined_at in result:
+                queues[subject_id].append(QueueEntry(user_id, full_name, joined_at))
+
+        changed = set(self._queues) | set(queues)
+        self._queues.clear()
+        self._positions.clear()
+        self._user_subjects.clear()
+        for subject_id, entries in queues.items():
+            self._set(subject_id, tuple(entries))
+        for subject_id in changed:
+            self._changed(subject_id)
+
+    async def reload(
+        self,
+        session: AsyncSession,
+        subject_ids: Iterable[int],
+        cleared: Iterable[int] = (),
+    ) -> None:
+        """
+        Перечитать из БД очереди отдельных дисциплин - тех, что поменял
+        другой процесс (см. src/services/worker_sync.py). cleared - очереди,
+        которые за это время очищали.
+
+        Изменение проигрывается так же, как в одном процессе: сначала
+        по одному уходят выбывшие (подписчики сдвигов узнают освободившиеся
+        места), потом встают новые - сдвигом это не считается. Очищенная
+        очередь, как и clear, никого не сдвигает.
+        """
+        subject_ids = set(subject_ids)
+        if not subject_ids:
+            return
+        cleared = set(cleared)
+        result = await session.execute(
+            select(Queue.subject_id, Queue.user_id, User.full_name, Queue.joined_at)
+            .join(User, User.tg_id == Queue.user_id)
+            .where(Queue.subject_id.in_(subject_ids))
+            .order_by(Queue.subject_id, Queue.joined_at, Queue.user_id)
+        )
+        queues: Dict[int, list] = defaultdict(list)
+        for subject_id, user_id, full_name, joined_at in result:
+            queues[subject_id].append(QueueEntry(user_id, full_name, joined_at))
+
+        for subject_id in subject_ids:
+            new = tuple(queues.get(subject_id, ()))
+            if self.entries(subject_id) == new:
+                continue
+            if subject_id in cleared:
+                self.clear(subject_id)
+            else:
+                remaining = {e.user_id for e in new}
+                for entry in self.entries(subject_id):
+                    if entry.user_id not in remaining:
+                        self.remove(subject_id, entry.user_id)
+            if self.entries(subject_id) != new:
+                self._set(subject_id, new)
+                self._changed(subject_id)
+
+    def subscribe(self, listener: Callable[[int], None]) -> None:
+        """listener(subject_id) вызывается после каждого изменения очереди"""
+        self._listeners.append(listener)
+
+    def subscribe_shift(self, listener: Callable[[int, int], None]) -> None:
+        """listener(subject_id, position) - место position освободилось, очередь сдвинулась"""
+        self._shift_listeners.append(listener)
+
+    def subscribe_drop(self, listener: Callable[[int], None]) -> None:
+        """listener(user_id) - пользователя удалили (после коммита delete_user_bd)"""
+        self._drop_listeners.append(listener)
+
+    # --- чтение ---
+
+    def entries(self, subject_id: int) -> Tuple[QueueEntry, ...]:
+        return self._queues.get(subject_id, ())
+
+    def length(self, subject_id: int) -> int:
+        return len(self._queues.get(subject_id, ()))
+
+    def contains(self, subject_id: int, user_id: int) -> bool:
+        return user_id in self._positions.get(subject_id, {})
+
+    def position(self, subject_id: int, user_id: int) -> Optional[int]:
+        """Позиция пользователя в очереди, начиная с 1, или None"""
+        index = self._positions.get(subject_id, {}).get(user_id)
+        return None if index is None else index + 1
+
+    def subjects_of(self, user_id: int) -> Set[int]:
+        return set(self._user_subjects.get(user_id, ()))
+
+    def version(self, subject_id: int) -> int:
+        return self._versions[subject_id]
+
+    # --- изменения (вызываются после коммита в БД) ---
+
+    def add(self, subject_id: int, entry: QueueEntry) -> None:
+        if self.contains(subject_id, entry.user_id):
+            return
+        entries = self.entries(subject_id)
+        if not entries or entries[-1].sort_key <= entry.sort_key:
+            # Обычный случай: новый человек встаёт в конец
+            self._queues[subject_id] = entries + (entry,)
+            self._positions.setdefault(subject_id, {})[entry.user_id] = len(entries)
+            self._user_subjects[entry.user_id].add(subject_id)
+        else:
+            keys = [e.sort_key for e in entries]
+            index = bisect_right(keys, entry.sort_key)
+            self._set(subject_id, entries[:index] + (entry,) + entries[index:])
+        self._changed(subject_id)
+
+    def remove(self, subject_id: int, user_id: int) -> None:
+        position = self.position(subject_id, user_id)
+        if position is None:
+            return
+        self._set(
+            subject_id,
+            tuple(e for e in self.entries(subject_id) if e.user_id != user_id),
+        )
+        self._forget(user_id, subject_id)
+        self._changed(subject_id)
+        for listener in self._shift_listeners:
+            listener(subject_id, position)
+
+    def clear(self, subject_id: int) -> None:
+        for entry in self._queues.pop(subject_id, ()):
+            self._forget(entry.user_id, subject_id)
+        self._positions.pop(subject_id, None)
+        self._changed(subject_id)
+
+    def drop_user(self, user_id: int) -> None:
+        for subject_id in self.subjects_of(user_id):
+            self.remove(subject_id, user_id)
+        for listener in self._drop_listeners:
+            listener(user_id)
+
+    def rename_user(self, user_id: int, full_name: str) -> None:
+        for subject_id in self.subjects_of(user_id):
+            self._queues[subject_id] = tuple(
+                QueueEntry(e.user_id, full_name, e.joined_at) if e.user_id == user_id else e
+                for e in self._queues[subject_id]
+            )
+            self._changed(subject_id)
+
+    def _set(self, subject_id: int, entries: Tuple[QueueEntry, ...]) -> None:
+        if not entries:
+            self._queues.pop(subject_id, None)
+            self._positions.pop(subject_id, None)
+            return
+        self._queues[subject_id] = entries
+        self._positions[subject_id] = {e.user_id: i for i, e in enumerate(entries)}
+        for entry in entries:
+            self._user_subjects[entry.user_id].add(subject_id)
+
+    def _changed(self, subject_id: int) -> None:
+        self._versions[subject_id] += 1
+        for listener in self._listeners:
+            listener(subject_id)
+
+    def _forget(self, user_id: int, subject_id: int) -> None:
+        subjects = self._user_subjects.get(user_id)
+        if subjects is not None:
+            subjects.discard(subject_id)
+            if not subjects:
+                del self._user_subjects[user_id]
+
+
+queue_engine = QueueEngine()
@@ -1,17 +1,140 @@
-from typing import List, Optional
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Generic, List, Optional, Tuple, TypeVar
 from datetime import datetime
 
-from sqlalchemy import select, delete
+from sqlalchemy import DateTime, Integer, bindparam, delete, func, insert, select, text, tuple_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import contains_eager
 
 # Импорт новых моделей
-from .models import User, Subject, Queue
+from .models import (
+    EVENT_CLEAR,
+    EVENT_JOIN,
+    EVENT_LEAVE,
+    EVENT_SERVED,
+    DEFAULT_GROUP_ID,
+    Group,
+    Queue,
+    QueueEvent,
+    Subject,
+    SubjectStats,
+    SubjectWaitBucket,
+    User,
+    normalize_subject_name,
+)
+from .queue_engine import QueueEntry, queue_engine
+from .session import on_commit
+from .shards import CachedGroup, shard_router
+from .subject_cache import CachedSubject, subject_catalogue
+from .user_cache import user_cache
 
-async def create_user(session: AsyncSession, tg_id: int, full_name: str) -> User:
-    user = User(tg_id=tg_id, full_name=full_name)
+T = TypeVar("T")
+
+
+@dataclass
+class Page(Generic[T]):
+    """Страница списка для постраничных клавиатур"""
+
+    items: List[T]
+    has_prev: bool
+    has_next: bool
+
+
+@dataclass
+class SubjectQueueStats:
+    """Статистика очереди по дисциплине (из SubjectStats, без чтения журнала)"""
+
+    joins: int = 0
+    served: int = 0
+    left_early: int = 0
+    cleared: int = 0
+    peak_length: int = 0
+    wait_sum: float = 0.0
+    wait_max: float = 0.0
+    # (верхняя граница корзины в секундах, сколько дождавшихся) по возрастанию
+    buckets: Tuple[Tuple[int, int], ...] = ()
+
+    @property
+    def wait_mean(self) -> Optional[float]:
+        return self.wait_sum / self.served if self.served else None
+
+    def wait_percentile(self, p: float) -> Optional[float]:
+        """Оценка перцентиля ожидания по гистограмме (линейно внутри корзины)"""
+        total = sum(count for _, count in self.buckets)
+        if not total:
+            return None
+        target = p * total
+        seen = 0
+        lower = 0.0
+        for bound, count in self.buckets:
+            if count and seen + count >= target:
+                upper = min(float(bound), self.wait_max)
+                return lower + (upper - lower) * (target - seen) / count
+            seen += count
+            lower = float(bound)
+        return self.wait_max
+
+
+@dataclass(frozen=True)
+class QueuePosition:
+    """Место пользователя в очереди по дисциплине («Мои очереди»)"""
+
+    subject_id: int
+    name: str
+    position: int
+    length: int
+
+
+def _event(
+    kind: str,
+    subject_id: int,
+    user_id: int,
+    at: datetime,
+    position: Optional[int] = None,
+    joined_at: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    return {
+        "subject_id": subject_id,
+        "user_id": user_id,
+        "kind": kind,
+        "at": at,
+        "position": position,
+        "wait_seconds": None if joined_at is None else (at - joined_at).total_seconds(),
+    }
+
+
+async def _log_events(session: AsyncSession, events: List[Dict[str, Any]]) -> None:
+    """
+    Дописать события в журнал QueueEvents той же транзакцией, что и само
+    изменение очереди. Статистику по дисциплине обновляют триггеры.
+    """
+    if events:
+        await session.execute(insert(QueueEvent), events)
+
+async def create_group(session: AsyncSession, name: str, sharded: bool = False) -> CachedGroup:
+    """Создать группу; sharded - её данные будут в отдельном файле group_<id>.db"""
+    group = Group(name=name)
+    session.add(group)
+    await session.flush()
+    if sharded:
+        group.shard = f"group_{group.id}.db"
+    return CachedGroup.from_model(group)
+
+
+async def get_group_by_name(session: AsyncSession, name: str) -> Optional[Group]:
+    result = await session.execute(select(Group).where(Group.name == name))
+    return result.scalar_one_or_none()
+
+
+async def create_user(
+    session: AsyncSession, tg_id: int, full_name: str, group_id: int = DEFAULT_GROUP_ID
+) -> User:
+    user = User(tg_id=tg_id, full_name=full_name, group_id=group_id)
     session.add(user)
     await session.flush()
+    on_commit(session, lambda: user_cache.invalidate(tg_id))
+    on_commit(session, lambda: shard_router.add_member(tg_id, group_id))
     return user
 
 
@@ -31,94 +154,344 @@ async def ensure_admin_roles(session: AsyncSession, tg_ids: List[int]) -> None:
 
     for user in users:
         user.role = "admin"
+    on_commit(session, lambda: user_cache.invalidate(*tg_ids))
+
+async def set_notify_at(session: AsyncSession, user_id: int, notify_at: Optional[int]) -> bool:
+    """Включить (позиция) или выключить (None) уведомления о приближении очереди"""
+    user = await get_user_by_tg_id(session, user_id)
+    if user is None:
+        return False
+    user.notify_at = notify_at
+    return True
+
+
+async def list_notify_subscriptions(session: AsyncSession) -> Dict[int, int]:
+    """tg_id -> позиция для всех, кто включил уведомления"""
+    result = await session.execute(
+        select(User.tg_id, User.notify_at).where(User.notify_at.is_not(None))
+    )
+    return {tg_id: notify_at for tg_id, notify_at in result}
 
-async def list_users(session: AsyncSession) -> List[User]:
-    result = await session.execute(select(User).order_by(User.full_name))
+async def list_users(session: AsyncSession, group_id: Optional[int] = None) -> List[User]:
+    query = select(User).order_by(User.full_name)
+    if group_id is not None:
+        query = query.where(User.group_id == group_id)
+    result = await session.execute(query)
     return list(result.scalars().all())
 
-async def delete_user_bd(session: AsyncSession, user_id: int) -> bool:
+
+async def list_users_page(
+    session: AsyncSession,
+    after: Optional[int] = None,
+    before: Optional[int] = None,
+    limit: int = 20,
+    group_id: Optional[int] = None,
+) -> Page[User]:
+    """
+    Страница пользователей в порядке (full_name, tg_id), с group_id - только группы.
+
+    after/before - tg_id последнего/первого пользователя соседней страницы.
+    Вместо OFFSET - поиск по ключу: позиция в индексе ix_users_full_name_tg_id
+    (ix_users_group_full_name_tg_id для группы) находится по имени граничного
+    пользователя, так что любая страница - один запрос по индексу,
+    независимо от размера таблицы.
+    """
+    cursor = after if after is not None else before
+    query = select(User)
+    if group_id is not None:
+        query = query.where(User.group_id == group_id)
+    if cursor is not None:
+        boundary = tuple_(
+            select(User.full_name).where(User.tg_id == cursor).scalar_subquery(), cursor
+        )
+        key = tuple_(User.full_name, User.tg_id)
+        query = query.where(key > boundary if after is not None else key < boundary)
+
+    if before is not None:
+        query = query.order_by(User.full_name.desc(), User.tg_id.desc())
+    else:
+        query = query.order_by(User.full_name, User.tg_id)
+
+    result = await session.execute(query.limit(limit + 1))
+    users = list(result.scalars().all())
+    more = len(users) > limit
+    users = users[:limit]
+
+    if cursor is not None and not users:
+        # Граничного пользователя удалили - начинаем сначала
+        return await list_users_page(session, limit=limit, group_id=group_id)
+    if before is not None:
+        users.reverse()
+        return Page(users, has_prev=more, has_next=True)
+    return Page(users, has_prev=cursor is not None, has_next=more)
+
+async def group_has_users(session: AsyncSession, group_id: int) -> bool:
+    result = await session.execute(select(User.tg_id).where(User.group_id == group_id).limit(1))
+    return result.first() is not None
+
+
+def _in_group(user: Optional[User], group_id: Optional[int]) -> bool:
+    """Пользователь есть и (если группа задана) состоит в ней"""
+    return user is not None and (group_id is None or user.group_id == group_id)
+
+
+async def delete_user_bd(session: AsyncSession, user_id: int, group_id: Optional[int] = None) -> bool:
     is_exist = await get_user_by_tg_id(session, user_id)
-    if is_exist is None:
+    if not _in_group(is_exist, group_id):
         return False
-    await session.execute(delete(Queue).where(Queue.user_id == user_id))
+    # Позиции считает БД, как в leave_queue_atomic: память воркера может отставать
+    result = await session.execute(_LEAVE_ALL_SQL, {"user_id": user_id})
+    now = datetime.now()
+    await _log_events(session, [
+        _event(EVENT_LEAVE, row.subject_id, user_id, now, row.position, row.joined_at)
+        for row in result
+    ])
     await session.delete(is_exist) # delete user
-    await session.commit()
+    on_commit(session, lambda: queue_engine.drop_user(user_id))
+    on_commit(session, lambda: user_cache.invalidate(user_id))
+    on_commit(session, lambda: shard_router.remove_member(user_id))
     return True
 
-async def rename_user(session: AsyncSession, user_id: int, new_name: str) -> bool:
+async def rename_user(
+    session: AsyncSession, user_id: int, new_name: str, group_id: Optional[int] = None
+) -> bool:
     user = await get_user_by_tg_id(session, user_id)
-    if not user:
+    if not _in_group(user, group_id):
         return False
     user.full_name = new_name
     await session.flush()
+    on_commit(session, lambda: queue_engine.rename_user(user_id, new_name))
+    on_commit(session, lambda: user_cache.invalidate(user_id))
     return True
 
-async def list_subjects(session: AsyncSession) -> List[Subject]:
-    """Получить список всех предметов"""
-    result = await session.execute(select(Subject).order_by(Subject.name))
-    return list(result.scalars().all())
+async def list_subjects(session: AsyncSession, group_id: Optional[int] = None) -> List[CachedSubject]:
+    """Получить список предметов группы, без group_id - всех (из справочника в памяти)"""
+    await subject_catalogue.ensure_loaded(session)
+    return list(subject_catalogue.all(group_id))
 
 
-async def get_subject(session: AsyncSession, subject_id: int) -> Optional[Subject]:
-    """Получить предмет по ID"""
-    result = await session.execute(select(Subject).where(Subject.id == subject_id))
-    return result.scalar_one_or_none()
+async def list_subjects_page(
+    session: AsyncSession,
+    after: Optional[int] = None,
+    before: Optional[int] = None,
+    limit: int = 20,
+    group_id: Optional[int] = None,
+) -> Page[CachedSubject]:
+    """
+    Страница дисциплин в порядке названий, курсоры - как в list_users_page.
+    Справочник уже в памяти и отсортирован, поэтому место граничной
+    дисциплины известно сразу и запроса в БД нет.
+    """
+    await subject_catalogue.ensure_loaded(session)
+    subjects = subject_catalogue.all(group_id)
+
+    cursor = after if after is not None else before
+    index = subject_catalogue.index_of(cursor) if cursor is not None else None
+    if index is None:
+        # Первая страница (или граничную дисциплину удалили)
+        return Page(list(subjects[:limit]), has_prev=False, has_next=len(subjects) > limit)
+
+    if after is not None:
+        start = index + 1
+        return Page(
+            list(subjects[start:start + limit]),
+            has_prev=True,
+            has_next=start + limit < len(subjects),
+        )
+
+    start = max(0, index - limit)
+    return Page(list(subjects[start:index]), has_prev=start > 0, has_next=True)
+
+
+async def get_subject(
+    session: AsyncSession, subject_id: int, group_id: Optional[int] = None
+) -> Optional[CachedSubject]:
+    """
+    Получить предмет по ID (из справочника в памяти).
+    С group_id чужой группе предмет не отдаётся - как будто его нет.
+    """
+    await subject_catalogue.ensure_loaded(session)
+    subject = subject_catalogue.get(subject_id)
+    if subject is not None and group_id is not None and subject.group_id != group_id:
+        return None
+    return subject
+
+
+async def get_subject_by_name(
+    session: AsyncSession, name: str, group_id: Optional[int] = DEFAULT_GROUP_ID
+) -> Optional[CachedSubject]:
+    """Найти предмет группы по названию без учёта регистра"""
+    await subject_catalogue.ensure_loaded(session)
+    return subject_catalogue.find_by_name(name, group_id)
 
 
 async def list_queue_for_subject(session: AsyncSession, subject_id: int) -> List[Queue]:
-    """Получить очередь для конкретного предмета"""
+    """
+    Получить очередь для конкретного предмета с пользователями - одним запросом.
+    Queue.subject не подгружается: он у всех записей один и тот же.
+    """
     result = await session.execute(
         select(Queue)
+        .join(Queue.user)
         .where(Queue.subject_id == subject_id)
         .order_by(Queue.joined_at)
-        .options(selectinload(Queue.user), selectinload(Queue.subject))
+        .options(contains_eager(Queue.user))
+    )
+    return list(result.scalars().all())
+
+
+async def list_user_queues(session: AsyncSession, user_id: int) -> List[QueuePosition]:
+    """
+    Очереди пользователя с его местом и длиной очереди - одним запросом.
+    Дисциплины пользователя берутся по первичному ключу (user_id, subject_id),
+    их очереди - по ix_queues_subject_joined, место и длину считают оконные
+    функции в порядке queue_engine (joined_at, user_id).
+    """
+    ranked = (
+        select(
+            Queue.subject_id,
+            Queue.user_id,
+            func.row_number()
+            .over(partition_by=Queue.subject_id, order_by=(Queue.joined_at, Queue.user_id))
+            .label("position"),
+            func.count().over(partition_by=Queue.subject_id).label("length"),
+        )
+        .where(Queue.subject_id.in_(select(Queue.subject_id).where(Queue.user_id == user_id)))
+        .subquery()
+    )
+    result = await session.execute(
+        select(ranked.c.subject_id, Subject.name, ranked.c.position, ranked.c.length)
+        .join(Subject, Subject.id == ranked.c.subject_id)
+        .where(ranked.c.user_id == user_id)
+        .order_by(Subject.name)
     )
-    return list(result.scalars().unique().all())
+    return [QueuePosition(*row) for row in result]
 
 
 async def is_user_in_queue(session: AsyncSession, user_id: int, subject_id: int) -> bool:
-    """Проверить, находится ли пользователь в очереди по предмету"""
-    entry = await session.get(Queue, (user_id, subject_id))
-    return entry is not None
+    """Проверить, находится ли пользователь в очереди по предмету (из памяти)"""
+    return queue_engine.contains(subject_id, user_id)
 
 
-async def add_to_queue(session: AsyncSession, user_id: int, subject_id: int) -> Queue:
-    """Добавить пользователя в очередь по предмету"""
-    entry = Queue(user_id=user_id, subject_id=subject_id, joined_at=datetime.now())
-    session.add(entry)
-    await session.flush()
-    return entry
+# Позиция записи = 1 + число записей той же очереди, вставших раньше неё.
+# Это ROW_NUMBER() OVER (ORDER BY joined_at, user_id), но SQLite не разрешает
+# оконные функции прямо в RETURNING и DML внутри CTE, а коррелированный подсчёт
+# не зависит от того, видит ли подзапрос вставляемую/удаляемую строку.
+# Считается по индексу ix_queues_subject_joined.
+_POSITION_SQL = """
+    (SELECT COUNT(*) FROM "Queues" AS earlier
+     WHERE earlier.subject_id = "Queues".subject_id
+       AND (earlier.joined_at, earlier.user_id) < ("Queues".joined_at, "Queues".user_id)
+    ) + 1
+"""
 
+_JOIN_SQL = text(f"""
+    INSERT INTO "Queues" (user_id, subject_id, joined_at)
+    VALUES (:user_id, :subject_id, :joined_at)
+    ON CONFLICT DO NOTHING
+    RETURNING joined_at, {_POSITION_SQL} AS position
+""").bindparams(bindparam("joined_at", type_=DateTime())).columns(
+    joined_at=DateTime(), position=Integer()
+)
 
-async def remove_from_queue(session: AsyncSession, user_id: int, subject_id: int) -> None:
-    """Удалить пользователя из очереди по предмету"""
-    await session.execute(
-        delete(Queue).where(
-            Queue.user_id == user_id,
-            Queue.subject_id == subject_id,
-        )
+_LEAVE_SQL = text(f"""
+    DELETE FROM "Queues"
+    WHERE user_id = :user_id AND subject_id = :subject_id
+    RETURNING joined_at, {_POSITION_SQL} AS position
+""").columns(joined_at=DateTime(), position=Integer())
+
+# Все записи пользователя: по одной на очередь, позиция у каждой своя
+_LEAVE_ALL_SQL = text(f"""
+    DELETE FROM "Queues"
+    WHERE user_id = :user_id
+    RETURNING subject_id, joined_at, {_POSITION_SQL} AS position
+""").columns(subject_id=Integer(), joined_at=DateTime(), position=Integer())
+
+
+async def join_queue_atomic(
+    session: AsyncSession, user_id: int, subject_id: int, full_name: str
+) -> Optional[int]:
+    """
+    Встать в очередь одним запросом.
+    Возвращает позицию в очереди (с 1) или None, если пользователь уже в ней.
+    """
+    result = await session.execute(
+        _JOIN_SQL,
+        {"user_id": user_id, "subject_id": subject_id, "joined_at": datetime.now()},
+    )
+    row = result.one_or_none()
+    if row is None:
+        return None
+
+    await _log_events(
+        session,
+        [_event(EVENT_JOIN, subject_id, user_id, row.joined_at, position=row.position)],
+    )
+    entry = QueueEntry(user_id, full_name, row.joined_at)
+    on_commit(session, lambda: queue_engine.add(subject_id, entry))
+    return row.position
+
+
+async def leave_queue_atomic(session: AsyncSession, user_id: int, subject_id: int) -> Optional[int]:
+    """
+    Выйти из очереди одним запросом.
+    Возвращает позицию, которую занимал пользователь, или None, если его там не было.
+    Ушедший с первого места считается дождавшимся (served).
+    """
+    result = await session.execute(_LEAVE_SQL, {"user_id": user_id, "subject_id": subject_id})
+    row = result.one_or_none()
+    if row is None:
+        return None
+
+    kind = EVENT_SERVED if row.position == 1 else EVENT_LEAVE
+    await _log_events(
+        session,
+        [_event(kind, subject_id, user_id, datetime.now(), row.position, row.joined_at)],
     )
+    on_commit(session, lambda: queue_engine.remove(subject_id, user_id))
+    return row.position
+
+
+async def _clear_logged(session: AsyncSession, subject_id: int) -> None:
+    """Удалить очередь, записав в журнал каждого снятого"""
+    result = await session.execute(
+        delete(Queue)
+        .where(Queue.subject_id == subject_id)
+        .returning(Queue.user_id, Queue.joined_at)
+    )
+    rows = sorted(result, key=lambda row: (row.joined_at, row.user_id))
+    now = datetime.now()
+    await _log_events(session, [
+        _event(EVENT_CLEAR, subject_id, row.user_id, now, position, row.joined_at)
+        for position, row in enumerate(rows, start=1)
+    ])
 
 
 async def clear_queue(session: AsyncSession, subject_id: int) -> None:
     """Очистить всю очередь по предмету"""
-    await session.execute(delete(Queue).where(Queue.subject_id == subject_id))
+    await _clear_logged(session, subject_id)
+    on_commit(session, lambda: queue_engine.clear(subject_id))
 
 
-async def create_subject(session: AsyncSession, name: str) -> Subject:
-    """Создать новый предмет"""
-    subject = Subject(name=name)
+async def create_subject(
+    session: AsyncSession, name: str, group_id: int = DEFAULT_GROUP_ID
+) -> Subject:
+    """Создать новый предмет группы"""
+    subject = Subject(name=name, group_id=group_id)
     session.add(subject)
     await session.flush()
+    on_commit(session, subject_catalogue.invalidate)
     return subject
 
 
 async def delete_subject(session: AsyncSession, subject_id: int) -> None:
     """Удалить предмет и все связанные записи очереди"""
     # Сначала удаляем все записи очереди для этого предмета
-    await session.execute(delete(Queue).where(Queue.subject_id == subject_id))
-    # Затем удаляем сам предмет
+    await _clear_logged(session, subject_id)
+    # Затем удаляем сам предмет (его статистику удалит триггер, журнал останется)
     await session.execute(delete(Subject).where(Subject.id == subject_id))
+    on_commit(session, lambda: queue_engine.clear(subject_id))
+    on_commit(session, subject_catalogue.invalidate)
 
 
 async def update_subject(session: AsyncSession, subject_id: int, new_name: str) -> Subject:
@@ -128,4 +501,113 @@ async def update_subject(session: AsyncSession, subject_id: int, new_name: str)
     if subject:
         subject.name = new_name
         await session.flush()
-    return subject
\ No newline at end of file
+        on_commit(session, subject_catalogue.invalidate)
+    return subject
+
+
+async def get_subject_stats(session: AsyncSession, subject_id: int) -> SubjectQueueStats:
+    """Статистика очереди по дисциплине: строка агрегатов и гистограмма ожидания"""
+    stats = await session.get(SubjectStats, subject_id)
+    if stats is None:
+        return SubjectQueueStats()
+    result = await session.execute(
+        select(SubjectWaitBucket.le_seconds, SubjectWaitBucket.count)
+        .where(SubjectWaitBucket.subject_id == subject_id)
+        .order_by(SubjectWaitBucket.le_seconds)
+    )
+    return SubjectQueueStats(
+        joins=stats.joins,
+        served=stats.served,
+        left_early=stats.left_early,
+        cleared=stats.cleared,
+        peak_length=stats.peak_length,
+        wait_sum=stats.wait_sum,
+        wait_max=stats.wait_max,
+        buckets=tuple((bound, count) for bound, count in result),
+    )
+
+
+async def import_users_and_subjects(
+    session: AsyncSession,
+    users: List[Tuple[int, str, str]],
+    subjects: List[str],
+    chunk_size: int = 500,
+    group_id: int = DEFAULT_GROUP_ID,
+) -> Tuple[int, int]:
+    """
+    Массовая загрузка в группу в транзакции вызывающего. Пользователи
+    (tg_id, имя, роль) - upsert по tg_id (группу у существующих не меняет),
+    дисциплины - только новые: совпадающие по названию без учёта регистра
+    пропускаются. Строки уходят пачками по chunk_size через executemany.
+    Возвращает (сколько пользователей, сколько новых дисциплин).
+    """
+    user_stmt = sqlite_insert(User)
+    user_stmt = user_stmt.on_conflict_do_update(
+        index_elements=[User.tg_id],
+        set_={"full_name": user_stmt.excluded.full_name, "role": user_stmt.excluded.role},
+    )
+    for start in range(0, len(users), chunk_size):
+        await session.execute(
+            user_stmt,
+            [
+                {"tg_id": tg_id, "full_name": full_name, "role": role, "group_id": group_id}
+                for tg_id, full_name, role in users[start:start + chunk_size]
+            ],
+        )
+
+    subject_stmt = sqlite_insert(Subject).on_conflict_do_nothing()
+    # Через соединение: у результата Core есть rowcount - сколько строк вставлено
+    connection = await session.connection()
+    created = 0
+    for start in range(0, len(subjects), chunk_size):
+        result = await connection.execute(
+            subject_stmt,
+            [
+                {
+                    "name": name,
+                    "name_normalized": normalize_subject_name(name),
+                    "group_id": group_id,
+                }
+                for name in subjects[start:start + chunk_size]
+            ],
+        )
+        created += result.rowcount
+
+    def refresh_caches() -> None:
+        user_cache.clear()
+        for tg_id, full_name, _ in users:
+            # Имена в очередях в памяти; пользователей не из очередей это не трогает
+            queue_engine.rename_user(tg_id, full_name)
+            if shard_router.group_of(tg_id) is None:
+                shard_router.add_member(tg_id, group_id)
+        if created:
+            subject_catalogue.invalidate()
+
+    on_commit(session, refresh_caches)
+    return len(users), created
+
+
+async def stream_backup(
+    session: AsyncSession, batch_size: int = 1000, group_id: Optional[int] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Все пользователи, дисциплины и записи очередей (с group_id - одной группы)
+    по одной, потоком из БД
+    """
+    users = select(User.tg_id, User.full_name, User.role).order_by(User.tg_id)
+    subjects = select(Subject.id, Subject.name).order_by(Subject.id)
+    queues = (
+        select(Queue.subject_id, Queue.user_id, Queue.joined_at)
+        .order_by(Queue.subject_id, Queue.joined_at, Queue.user_id)
+    )
+    if group_id is not None:
+        users = users.where(User.group_id == group_id)
+        subjects = subjects.where(Subject.group_id == group_id)
+        queues = queues.join(Subject, Subject.id == Queue.subject_id).where(
+            Subject.group_id == group_id
+        )
+    queries = (("user", users), ("subject", subjects), ("queue", queues))
+    for kind, stmt in queries:
+        result = await session.stream(stmt.execution_options(yield_per=batch_size))
+        async for row in result:
+            yield {"type": kind, **row._asdict()}
@@ -1,18 +1,216 @@
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from src.config import settings
 
+from .query_stats import instrument_engine
 
-engine = create_async_engine(
-    settings.db_url,
-    echo=False,
-    future=True,
-    connect_args={"check_same_thread": False},  # Для SQLite
-)
 
-async_session_maker = async_sessionmaker(
-    bind=engine,
-    expire_on_commit=False,
-    class_=AsyncSession,
-)
+# Наборы PRAGMA, которые выставляются на каждое новое соединение.
+# "default" - поведение SQLite как есть, "tuned" - для бота под нагрузкой:
+# WAL (читатели не ждут писателя), synchronous=NORMAL (в WAL это безопасно
+# и без fsync на каждый коммит), 32 МБ страничного кэша, 256 МБ mmap
+# и ожидание блокировки вместо мгновенного "database is locked".
+SQLITE_PROFILES: Dict[str, Dict[str, Any]] = {
+    "default": {},
+    "tuned": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -32000,  # в КиБ, если отрицательное
+        "mmap_size": 256 * 1024 * 1024,
+        "busy_timeout": 5000,  # мс
+    },
+}
+
+
+def sqlite_pragmas(profile: str, overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"Неизвестный профиль SQLite: {profile}")
+    return {**SQLITE_PROFILES[profile], **(overrides or {})}
+
+
+def make_engine(url: str, pragmas: Dict[str, Any], **engine_kwargs: Any) -> AsyncEngine:
+    """Создать движок SQLite, который выставляет PRAGMA на каждое соединение"""
+    new_engine = create_async_engine(
+        url,
+        echo=False,
+        future=True,
+        connect_args={"check_same_thread": False},  # Для SQLite
+        **engine_kwargs,
+    )
+
+    @event.listens_for(new_engine.sync_engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    # Время и число запросов для метрик (см. query_stats.py)
+    instrument_engine(new_engine)
+    return new_engine
+
+
+_pragmas = sqlite_pragmas(settings.sqlite_profile, settings.sqlite_pragma_overrides)
+
+
+@dataclass(eq=False)
+class Shard:
+    """
+    Один файл SQLite со всей схемой бота: основная БД или БД группы
+    (см. src/database/shards.py). У каждого шарда свои движки и сессии,
+    а писатель - свой в db_writer.
+    """
+
+    key: str
+    engine: AsyncEngine
+    read_engine: AsyncEngine
+    session_maker: async_sessionmaker
+    write_session_maker: async_sessionmaker
+
+
+def make_shard(key: str, db_file: Path) -> Shard:
+    # Абсолютный путь для SQLAlchemy
+    url = f"sqlite+aiosqlite:///{db_file}"
+    if settings.db_split_engines:
+        # Все изменения идут через одно долгоживущее соединение (см. writer.py),
+        # а чтения - через пул read-only соединений. В режиме WAL читатели
+        # не ждут писателя и видят последний закоммиченный снимок.
+        # У aiosqlite для файловой БД по умолчанию NullPool (новое соединение
+        # на каждую сессию) - здесь соединения долгоживущие
+        write_engine = make_engine(
+            url,
+            _pragmas,
+            poolclass=AsyncAdaptedQueuePool,
+            pool_size=1,
+            max_overflow=0,
+        )
+        reader = make_engine(
+            # Тот же файл, но открытый только на чтение
+            f"sqlite+aiosqlite:///file:{db_file}?mode=ro&uri=true",
+            {
+                **{name: value for name, value in _pragmas.items() if name != "journal_mode"},
+                "query_only": 1,
+            },
+            poolclass=AsyncAdaptedQueuePool,
+            pool_size=settings.db_read_pool_size,
+            max_overflow=0,
+        )
+    else:
+        write_engine = reader = make_engine(url, _pragmas)
+
+    return Shard(
+        key=key,
+        engine=write_engine,
+        read_engine=reader,
+        # Сессии для чтения (в обычном режиме - те же, что и для записи)
+        session_maker=async_sessionmaker(bind=reader, expire_on_commit=False, class_=AsyncSession),
+        # Сессии для записи; в хэндлерах запись идёт через db_writer
+        write_session_maker=async_sessionmaker(
+            bind=write_engine, expire_on_commit=False, class_=AsyncSession
+        ),
+    )
+
+
+# Основная БД: справочник групп, FSM и данные групп без отдельного файла
+main_shard = make_shard("main", settings.db_file)
+engine = main_shard.engine
+read_engine = main_shard.read_engine
+
+# Шард, с которым работает текущий апдейт (ставит ShardMiddleware)
+_current_shard: ContextVar[Shard] = ContextVar("shard", default=main_shard)
+
+
+def current_shard() -> Shard:
+    return _current_shard.get()
+
+
+@contextmanager
+def use_shard(shard: Shard) -> Iterator[Shard]:
+    """Сессии и писатель внутри блока работают с БД этого шарда"""
+    token = _current_shard.set(shard)
+    try:
+        yield shard
+    finally:
+        _current_shard.reset(token)
+
+
+class ShardSessionMaker:
+    """
+    Фабрика сессий текущего шарда. Вызывается так же, как async_sessionmaker:
+    async with async_session_maker() as session - и отдаёт сессию БД того
+    шарда, который выбран для апдейта (use_shard), по умолчанию - основной.
+    """
+
+    def __init__(self, attribute: str) -> None:
+        self.attribute = attribute
+
+    def __call__(self, **kwargs: Any) -> AsyncSession:
+        return getattr(_current_shard.get(), self.attribute)(**kwargs)
+
+
+# Сессии для чтения
+async_session_maker = ShardSessionMaker("session_maker")
+
+# Сессии для записи; в хэндлерах запись идёт через db_writer
+write_session_maker = ShardSessionMaker("write_session_maker")
+
+
+_ON_COMMIT_KEY = "on_commit"
+
+
+def on_commit(session: AsyncSession, callback: Callable[[], None]) -> None:
+    """
+    Выполнить callback после успешного коммита сессии.
+    Используется, чтобы кэши в памяти менялись только вместе с БД:
+    при откате транзакции (или savepoint'а) отложенные callback'и отбрасываются.
+    """
+    sync_session = session.sync_session
+    transaction = sync_session.get_nested_transaction() or sync_session.get_transaction()
+    sync_session.info.setdefault(_ON_COMMIT_KEY, []).append((transaction, callback))
+
+
+@event.listens_for(Session, "after_commit")
+def _run_on_commit(session: Session) -> None:
+    # after_commit вызывается и при release savepoint'а - ждём внешний коммит
+    if session.in_nested_transaction():
+        return
+    callbacks = session.info.pop(_ON_COMMIT_KEY, [])
+    for _, callback in callbacks:
+        callback()
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_on_commit(session: Session, previous_transaction) -> None:
+    callbacks = session.info.get(_ON_COMMIT_KEY)
+    if not callbacks:
+        return
+    if previous_transaction.parent is None:
+        session.info.pop(_ON_COMMIT_KEY, None)
+        return
+
+    def rolled_back(transaction) -> bool:
+        while transaction is not None:
+            if transaction is previous_transaction:
+                return True
+            transaction = transaction.parent
+        return False
 
+    session.info[_ON_COMMIT_KEY] = [
+        (transaction, callback)
+        for transaction, callback in callbacks
+        if not rolled_back(transaction)
+    ]
@@ -0,0 +1,162 @@
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import settings
+
+from .migrate import upgrade_db
+from .models import DEFAULT_GROUP_ID, Group, User
+from .query_stats import collect_queries
+from .session import Shard, main_shard, make_shard, use_shard
+
+# Дисциплины группы в отдельном файле нумеруются с group_id * SUBJECT_ID_STRIDE,
+# так что id дисциплины уникален во всех шардах и кэши в памяти остаются общими
+SUBJECT_ID_STRIDE = 1_000_000
+
+# Строка Subjects в sqlite_sequence появляется уже при миграциях (пересоздание
+# таблицы), поэтому счётчик поднимается до начала диапазона, а не вставляется
+_SEED_SUBJECT_IDS = (
+    text("""
+        INSERT INTO sqlite_sequence (name, seq)
+        SELECT 'Subjects', 0
+        WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'Subjects')
+    """),
+    text("UPDATE sqlite_sequence SET seq = MAX(seq, :start) WHERE name = 'Subjects'"),
+)
+
+
+@dataclass(frozen=True)
+class CachedGroup:
+    """Снимок строки Groups, не привязанный к сессии"""
+
+    id: int
+    name: str
+    shard: Optional[str] = None
+
+    @classmethod
+    def from_model(cls, group: Group) -> "CachedGroup":
+        return cls(id=group.id, name=group.name, shard=group.shard)
+
+
+class ShardRouter:
+    """
+    Какой файл SQLite (шард) обслуживает группу и пользователя.
+
+    Справочник групп лежит в основной БД. Группа без shard хранит данные
+    в основной БД, группа с shard - в своём файле с полной схемой бота
+    рядом с основной БД. Пользователь принадлежит ровно одной группе;
+    карта tg_id -> group_id собирается при старте из Users всех шардов
+    и дальше меняется после коммита create_user/delete_user_bd.
+
+    Шард для апдейта выбирает ShardMiddleware (use_shard), после чего
+    async_session_maker и db_writer работают с его БД.
+    """
+
+    def __init__(self) -> None:
+        self._groups: Dict[int, CachedGroup] = {}
+        self._shards: Dict[str, Shard] = {main_shard.key: main_shard}
+        self._members: Dict[int, int] = {}
+
+    async def load(self) -> None:
+        """Прочитать группы, открыть (и довести миграциями) их файлы, собрать участников"""
+        await self.load_groups()
+        members: Dict[int, int] = {}
+        for shard in self.shards():
+            async with shard.session_maker() as session:
+                members.update(await _list_members(session))
+        self._members = members
+
+    async def load_members(self, shard: Shard, session: AsyncSession) -> None:
+        """Перечитать участников групп одного шарда (их поменял другой процесс)"""
+        members = {
+            tg_id: group_id
+            for tg_id, group_id in self._members.items()
+            if self.shard_for_group(group_id) is not shard
+        }
+        members.update(await _list_members(session))
+        self._members = members
+
+    async def load_groups(self) -> None:
+        """Перечитать справочник групп и открыть файлы новых"""
+        async with main_shard.session_maker() as session:
+            result = await session.execute(select(Group).order_by(Group.name))
+            groups = [CachedGroup.from_model(group) for group in result.scalars()]
+
+        self._groups = {group.id: group for group in groups}
+        for group in groups:
+            if group.shard:
+                await self.open(group)
+
+    async def open(self, group: CachedGroup) -> Shard:
+        """Файл группы: создать при необходимости и применить миграции"""
+        shard = self._shards.get(group.shard)
+        if shard is None:
+            shard = make_shard(group.shard, settings.db_file.parent / group.shard)
+            # Миграции нового файла не засчитываются апдейту, который его создал
+            with collect_queries(None):
+                await upgrade_db(shard.engine)
+                async with shard.engine.begin() as connection:
+                    for statement in _SEED_SUBJECT_IDS:
+                        await connection.execute(
+                            statement, {"start": group.id * SUBJECT_ID_STRIDE}
+                        )
+            self._shards[group.shard] = shard
+        self._groups[group.id] = group
+        return shard
+
+    async def create_group(self, name: str) -> CachedGroup:
+        """Создать группу (в отдельном файле, если включено GROUP_SHARDS)"""
+        # Писатель и запросы сами зависят от шардов
+        from .requests import create_group
+        from .writer import db_writer
+
+        with use_shard(main_shard):
+            group = await db_writer.submit(
+                lambda session: create_group(session, name, settings.group_shards)
+            )
+        if group.shard:
+            await self.open(group)
+        else:
+            self._groups[group.id] = group
+        return group
+
+    def groups(self) -> Tuple[CachedGroup, ...]:
+        return tuple(sorted(self._groups.values(), key=lambda group: group.name))
+
+    def group(self, group_id: int) -> Optional[CachedGroup]:
+        return self._groups.get(group_id)
+
+    def shards(self) -> Tuple[Shard, ...]:
+        return tuple(self._shards.values())
+
+    def shard_for_group(self, group_id: Optional[int]) -> Shard:
+        group = self._groups.get(group_id)
+        if group is None or not group.shard:
+            return main_shard
+        return self._shards[group.shard]
+
+    def group_of(self, tg_id: int) -> Optional[int]:
+        return self._members.get(tg_id)
+
+    def shard_for_user(self, tg_id: int) -> Shard:
+        """Шард группы пользователя; незарегистрированные - в основной БД"""
+        return self.shard_for_group(self._members.get(tg_id))
+
+    def add_member(self, tg_id: int, group_id: Optional[int]) -> None:
+        self._members[tg_id] = group_id if group_id is not None else DEFAULT_GROUP_ID
+
+    def remove_member(self, tg_id: int) -> None:
+        self._members.pop(tg_id, None)
+
+
+async def _list_members(session: AsyncSession) -> Dict[int, int]:
+    result = await session.execute(select(User.tg_id, User.group_id))
+    return {
+        tg_id: group_id if group_id is not None else DEFAULT_GROUP_ID
+        for tg_id, group_id in result
+    }
+
+
+shard_router = ShardRouter()
@@ -0,0 +1,103 @@
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import Subject, normalize_subject_name
+from .session import current_shard
+from .shards import shard_router
+
+
+@dataclass(frozen=True)
+class CachedSubject:
+    """Снимок строки Subjects, не привязанный к сессии"""
+
+    id: int
+    name: str
+    group_id: Optional[int] = None
+
+
+class SubjectCatalogue:
+    """
+    Справочник дисциплин в памяти.
+
+    Загружается из БД лениво и целиком (дисциплин немного) - из всех шардов
+    сразу, id дисциплин в них не пересекаются. После коммита
+    create_subject/update_subject/delete_subject сбрасывается.
+    version растёт при каждом сбросе - по нему можно понять, что список
+    дисциплин поменялся (например, для кэшей клавиатур).
+    """
+
+    def __init__(self) -> None:
+        self.version = 0
+        self._loaded_version: Optional[int] = None
+        self._subjects: Tuple[CachedSubject, ...] = ()
+        # group_id -> дисциплины группы по названию
+        self._groups: Dict[Optional[int], Tuple[CachedSubject, ...]] = {}
+        self._by_id: Dict[int, CachedSubject] = {}
+        # id -> индекс в отсортированном по названию кортеже своей группы
+        self._index: Dict[int, int] = {}
+        self._by_name: Dict[Tuple[Optional[int], str], CachedSubject] = {}
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_version == self.version
+
+    async def ensure_loaded(self, session: AsyncSession) -> None:
+        while not self.loaded:
+            version = self.version
+            subjects: List[CachedSubject] = []
+            for shard in shard_router.shards():
+                if shard is current_shard():
+                    subjects.extend(await self._read(session))
+                else:
+                    async with shard.session_maker() as shard_session:
+                        subjects.extend(await self._read(shard_session))
+            if version != self.version:
+                # Пока читали, справочник успели поменять - перечитываем
+                continue
+
+            subjects.sort(key=lambda s: s.name)
+            groups: Dict[Optional[int], List[CachedSubject]] = defaultdict(list)
+            for subject in subjects:
+                groups[subject.group_id].append(subject)
+
+            self._subjects = tuple(subjects)
+            self._groups = {group_id: tuple(items) for group_id, items in groups.items()}
+            self._by_id = {s.id: s for s in subjects}
+            self._index = {
+                s.id: i for items in self._groups.values() for i, s in enumerate(items)
+            }
+            self._by_name = {(s.group_id, normalize_subject_name(s.name)): s for s in subjects}
+            self._loaded_version = version
+
+    @staticmethod
+    async def _read(session: AsyncSession) -> List[CachedSubject]:
+        result = await session.execute(select(Subject.id, Subject.name, Subject.group_id))
+        return [
+            CachedSubject(id=row.id, name=row.name, group_id=row.group_id) for row in result
+        ]
+
+    def invalidate(self) -> None:
+        self.version += 1
+
+    def all(self, group_id: Optional[int] = None) -> Tuple[CachedSubject, ...]:
+        """Дисциплины группы по названию; без group_id - все"""
+        if group_id is None:
+            return self._subjects
+        return self._groups.get(group_id, ())
+
+    def get(self, subject_id: int) -> Optional[CachedSubject]:
+        return self._by_id.get(subject_id)
+
+    def index_of(self, subject_id: int) -> Optional[int]:
+        """Место дисциплины в all(её группа) - для постраничного вывода"""
+        return self._index.get(subject_id)
+
+    def find_by_name(self, name: str, group_id: Optional[int] = None) -> Optional[CachedSubject]:
+        return self._by_name.get((group_id, normalize_subject_name(name)))
+
+
+subject_catalogue = SubjectCatalogue()
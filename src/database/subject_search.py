@@ -0,0 +1,117 @@
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from .models import normalize_subject_name
+from .subject_cache import CachedSubject, subject_catalogue
+
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+@dataclass
+class _GroupIndex:
+    # Дисциплины группы по названию и их нормализованные названия
+    subjects: Tuple[CachedSubject, ...] = ()
+    names: Tuple[str, ...] = ()
+    # (хвост названия с начала слова, индекс дисциплины), по возрастанию
+    word_starts: List[Tuple[str, int]] = field(default_factory=list)
+    # триграмма -> индексы дисциплин, в названии которых она есть
+    trigrams: Dict[str, Set[int]] = field(default_factory=dict)
+
+
+class SubjectSearchIndex:
+    """
+    Поиск дисциплин по части названия без запросов в БД (inline-режим).
+
+    Строится из subject_catalogue для каждой группы и перестраивается
+    целиком, когда меняется subject_catalogue.version, - то есть после
+    коммита create_subject/update_subject/delete_subject (и изменений
+    из других процессов, см. src/services/worker_sync.py).
+
+    Сначала идут дисциплины, в названии которых каждое слово запроса - начало
+    какого-нибудь слова («лаб пр» - «Лабораторный практикум»): двоичный поиск
+    по отсортированным хвостам названия с начала слова. Затем - те, где
+    запрос встречается внутри слова: кандидаты - пересечение множеств
+    по триграммам запроса, каждый проверяется подстрокой.
+    """
+
+    def __init__(self) -> None:
+        self._version: Optional[int] = None
+        self._groups: Dict[Optional[int], _GroupIndex] = {}
+
+    def search(
+        self, query: str, group_id: Optional[int], limit: int
+    ) -> List[CachedSubject]:
+        """
+        Дисциплины группы по запросу; пустой запрос - первые по алфавиту.
+        Справочник к этому моменту должен быть загружен (ensure_loaded).
+        """
+        index = self._group(group_id)
+        query = " ".join(normalize_subject_name(query).split())
+        if not query:
+            return list(index.subjects[:limit])
+
+        # Каждое слово запроса - начало какого-нибудь слова названия
+        prefixed: Optional[Set[int]] = None
+        for token in query.split(" "):
+            matches = _starting_with(index, token)
+            prefixed = matches if prefixed is None else prefixed & matches
+        found = sorted(prefixed)[:limit]
+
+        if len(found) < limit and len(query) >= 3:
+            candidates: Optional[Set[int]] = None
+            for trigram in _trigrams(query):
+                matches = index.trigrams.get(trigram, set())
+                candidates = matches if candidates is None else candidates & matches
+                if not candidates:
+                    break
+            inside = sorted(
+                i for i in candidates or () if i not in prefixed and query in index.names[i]
+            )
+            found.extend(inside[:limit - len(found)])
+
+        return [index.subjects[i] for i in found]
+
+    def _group(self, group_id: Optional[int]) -> _GroupIndex:
+        if self._version != subject_catalogue.version:
+            self._groups = {}
+            self._version = subject_catalogue.version
+        index = self._groups.get(group_id)
+        if index is None:
+            index = self._groups[group_id] = _build(subject_catalogue.all(group_id))
+        return index
+
+
+def _starting_with(index: _GroupIndex, prefix: str) -> Set[int]:
+    """Дисциплины, где с prefix начинается хвост названия от начала слова"""
+    found: Set[int] = set()
+    position = bisect_left(index.word_starts, (prefix, -1))
+    while position < len(index.word_starts):
+        tail, i = index.word_starts[position]
+        if not tail.startswith(prefix):
+            break
+        found.add(i)
+        position += 1
+    return found
+
+
+def _build(subjects: Tuple[CachedSubject, ...]) -> _GroupIndex:
+    index = _GroupIndex(subjects=subjects)
+    names = []
+    for i, subject in enumerate(subjects):
+        name = " ".join(normalize_subject_name(subject.name).split())
+        names.append(name)
+        start = 0
+        for word in name.split(" "):
+            index.word_starts.append((name[start:], i))
+            start += len(word) + 1
+        for trigram in _trigrams(name):
+            index.trigrams.setdefault(trigram, set()).add(i)
+    index.names = tuple(names)
+    index.word_starts.sort()
+    return index
+
+
+subject_search = SubjectSearchIndex()
@@ -0,0 +1,94 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from src.config import settings
+
+from .models import User
+from .session import async_session_maker
+
+
+@dataclass(frozen=True)
+class CachedUser:
+    """Снимок строки Users, не привязанный к сессии"""
+
+    tg_id: int
+    full_name: str
+    role: str
+    # Группа пользователя; роль admin действует только в ней
+    group_id: Optional[int] = None
+
+    @property
+    def is_admin(self) -> bool:
+        return self.role == "admin"
+
+    @classmethod
+    def from_model(cls, user: User) -> "CachedUser":
+        return cls(
+            tg_id=user.tg_id, full_name=user.full_name, role=user.role, group_id=user.group_id
+        )
+
+
+_MISSING = object()
+
+
+class UserCache:
+    """
+    Ограниченный LRU-кэш пользователей с TTL, ключ - tg_id.
+
+    Кэшируется и отсутствие пользователя (None), чтобы незарегистрированные
+    не ходили в БД на каждый апдейт. Инвалидация - из requests.py после
+    коммита изменений пользователя.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[int, Tuple[float, Optional[CachedUser]]]" = OrderedDict()
+        # Растёт при каждой инвалидации: загрузка, начатая до неё, не попадёт в кэш
+        self._generation = 0
+
+    def lookup(self, tg_id: int):
+        """Вернуть закэшированное значение или _MISSING"""
+        item = self._data.get(tg_id)
+        if item is None:
+            return _MISSING
+        expires_at, user = item
+        if expires_at < time.monotonic():
+            del self._data[tg_id]
+            return _MISSING
+        self._data.move_to_end(tg_id)
+        return user
+
+    def put(self, tg_id: int, user: Optional[CachedUser]) -> None:
+        self._data[tg_id] = (time.monotonic() + self.ttl, user)
+        self._data.move_to_end(tg_id)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, *tg_ids: int) -> None:
+        self._generation += 1
+        for tg_id in tg_ids:
+            self._data.pop(tg_id, None)
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._data.clear()
+
+    async def get(self, tg_id: int) -> Optional[CachedUser]:
+        """Пользователь из кэша, при промахе - из БД"""
+        cached = self.lookup(tg_id)
+        if cached is not _MISSING:
+            return cached
+
+        generation = self._generation
+        async with async_session_maker() as session:
+            user = await session.get(User, tg_id)
+            cached = CachedUser.from_model(user) if user else None
+        if generation == self._generation:
+            self.put(tg_id, cached)
+        return cached
+
+
+user_cache = UserCache(maxsize=settings.user_cache_size, ttl=settings.user_cache_ttl)
@@ -0,0 +1,52 @@
+from collections import OrderedDict
+from typing import Tuple
+
+from .queue_engine import queue_engine
+from .requests import QueuePosition, list_user_queues
+from .session import async_session_maker
+from .subject_cache import subject_catalogue
+
+# Что должно остаться прежним, чтобы ответ был верен: версия справочника
+# дисциплин (названия) и (subject_id, версия очереди) по каждой очереди пользователя
+_Stamp = Tuple[int, Tuple[Tuple[int, int], ...]]
+
+
+class UserQueuesCache:
+    """
+    Ограниченный LRU-кэш «Моих очередей» (list_user_queues), ключ - tg_id.
+
+    Отдельной инвалидации нет: вместе с ответом запоминаются версии очередей
+    пользователя из queue_engine, а они растут при любом изменении очереди -
+    и когда он сам встал или ушёл, и когда сдвинулись стоящие впереди.
+    Пока ни одна из них не поменялась, место и длина в ответе верны.
+    """
+
+    def __init__(self, maxsize: int = 1024) -> None:
+        self.maxsize = maxsize
+        self._data: "OrderedDict[int, Tuple[_Stamp, Tuple[QueuePosition, ...]]]" = OrderedDict()
+
+    def _stamp(self, tg_id: int) -> _Stamp:
+        return subject_catalogue.version, tuple(
+            (subject_id, queue_engine.version(subject_id))
+            for subject_id in sorted(queue_engine.subjects_of(tg_id))
+        )
+
+    async def get(self, tg_id: int) -> Tuple[QueuePosition, ...]:
+        """Очереди пользователя из кэша, при промахе - из БД"""
+        # Снимаем версии до запроса: изменение во время него даст промах в следующий раз
+        stamp = self._stamp(tg_id)
+        item = self._data.get(tg_id)
+        if item is not None and item[0] == stamp:
+            self._data.move_to_end(tg_id)
+            return item[1]
+
+        async with async_session_maker() as session:
+            positions = tuple(await list_user_queues(session, tg_id))
+        self._data[tg_id] = (stamp, positions)
+        self._data.move_to_end(tg_id)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+        return positions
+
+
+user_queues = UserQueuesCache()
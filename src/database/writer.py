@@ -0,0 +1,181 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.config import settings
+
+from .query_stats import QueryStats, collect_queries, current_query_stats
+from .requests import join_queue_atomic, leave_queue_atomic
+from .session import Shard, current_shard, main_shard
+
+Operation = Callable[[AsyncSession], Awaitable[Any]]
+# Операция, её результат и счётчик запросов того, кто её поставил
+Job = Tuple[Operation, asyncio.Future, Optional[QueryStats]]
+
+
+class DatabaseWriter:
+    """
+    Единственный писатель в БД.
+
+    Все изменения из хэндлеров ставятся в asyncio-очередь, и одна фоновая
+    задача выполняет их по порядку через одно соединение (write_session_maker).
+    Так SQLite не приходится разруливать блокировки между писателями,
+    а чтения идут через отдельный пул и запись их не задерживает.
+
+    Операции, пришедшие почти одновременно (например, десятки нажатий
+    «Встать в очередь» при открытии записи на лабу), склеиваются: задача
+    ждёт window секунд и забирает из очереди до max_batch операций,
+    которые выполняются в одной транзакции строго в порядке поступления.
+    Каждый вызывающий получает результат своей операции.
+
+    Если какая-то операция падает, транзакция пачки откатывается,
+    и операции повторяются по одной - ошибку получит только «виновник».
+
+    Запросы операции засчитываются апдейту, который её поставил
+    (query_stats), хотя выполняет их задача писателя.
+    """
+
+    def __init__(
+        self,
+        session_maker: async_sessionmaker,
+        window: float,
+        max_batch: int,
+    ) -> None:
+        self.session_maker = session_maker
+        self.window = window
+        self.max_batch = max_batch
+        self._queue: "asyncio.Queue[Job]" = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run_forever())
+
+    async def stop(self) -> None:
+        """Дописать уже поставленные операции и остановить задачу"""
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def submit(self, operation: Operation) -> Any:
+        """
+        Выполнить операцию в транзакции писателя и вернуть её результат.
+        Коммит делает писатель - операция сама коммитить не должна.
+        """
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((operation, future, current_query_stats()))
+        return await future
+
+    async def join(self, user_id: int, subject_id: int, full_name: str) -> Optional[int]:
+        return await self.submit(
+            lambda session: join_queue_atomic(session, user_id, subject_id, full_name)
+        )
+
+    async def leave(self, user_id: int, subject_id: int) -> Optional[int]:
+        return await self.submit(
+            lambda session: leave_queue_atomic(session, user_id, subject_id)
+        )
+
+    async def _run_forever(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            if self.window > 0:
+                # Даём набежать остальным нажатиям
+                await asyncio.sleep(self.window)
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            try:
+                await self._flush(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _flush(self, batch: List[Job]) -> None:
+        try:
+            results = await self._run([(operation, stats) for operation, _, stats in batch])
+        except Exception:
+            # Кто-то в пачке упал - повторяем по одному
+            for operation, future, stats in batch:
+                try:
+                    (result,) = await self._run([(operation, stats)])
+                except Exception as e:
+                    self._resolve(future, exception=e)
+                else:
+                    self._resolve(future, result=result)
+            return
+
+        for (_, future, _), result in zip(batch, results):
+            self._resolve(future, result=result)
+
+    async def _run(self, operations: List[Tuple[Operation, Optional[QueryStats]]]) -> List[Any]:
+        async with self.session_maker() as session:
+            results = []
+            for operation, stats in operations:
+                with collect_queries(stats):
+                    results.append(await operation(session))
+            # Общий коммит пачки не засчитывается никому
+            with collect_queries(None):
+                await session.commit()
+        return results
+
+    @staticmethod
+    def _resolve(future: asyncio.Future, result: Any = None, exception: Optional[BaseException] = None) -> None:
+        if future.done():
+            # Вызывающий мог не дождаться (например, отменили хэндлер)
+            return
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+
+
+class ShardedWriter:
+    """
+    Писатели по шардам (см. shards.py): у каждого файла SQLite свой
+    DatabaseWriter, и группы не ждут записи друг друга. submit/join/leave
+    отдают операцию писателю шарда текущего апдейта (use_shard).
+    """
+
+    def __init__(self, window: float, max_batch: int) -> None:
+        self.window = window
+        self.max_batch = max_batch
+        self._writers: Dict[str, DatabaseWriter] = {}
+
+    def for_shard(self, shard: Shard) -> DatabaseWriter:
+        writer = self._writers.get(shard.key)
+        if writer is None:
+            writer = DatabaseWriter(shard.write_session_maker, self.window, self.max_batch)
+            self._writers[shard.key] = writer
+        return writer
+
+    def start(self) -> None:
+        # Писатели остальных шардов запускаются при первой операции
+        self.for_shard(main_shard).start()
+
+    async def stop(self) -> None:
+        for writer in list(self._writers.values()):
+            await writer.stop()
+
+    async def submit(self, operation: Operation) -> Any:
+        return await self.for_shard(current_shard()).submit(operation)
+
+    async def join(self, user_id: int, subject_id: int, full_name: str) -> Optional[int]:
+        return await self.for_shard(current_shard()).join(user_id, subject_id, full_name)
+
+    async def leave(self, user_id: int, subject_id: int) -> Optional[int]:
+        return await self.for_shard(current_shard()).leave(user_id, subject_id)
+
+
+db_writer = ShardedWriter(
+    window=settings.write_batch_window_ms / 1000,
+    max_batch=settings.write_batch_max_size,
+)
@@ -1,29 +1,65 @@
-from aiogram import F, Router
+import time
+from html import escape
+from typing import Optional
+
+from aiogram import Bot, F, Router
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.types import CallbackQuery, Message
-
-from src.database import async_session_maker
+from aiogram.types import CallbackQuery, InlineKeyboardMarkup, Message
+from sqlalchemy.exc import IntegrityError
+
+from src.config import settings
+from src.database import async_session_maker, queue_engine, subject_catalogue
+from src.database.shards import shard_router
+from src.database.user_cache import CachedUser, user_cache
+from src.database.writer import db_writer
 from src.database.requests import (
+    Page,
     clear_queue,
     create_subject,
     delete_subject,
     get_subject,
-    get_user_by_tg_id,
-    list_subjects,
+    get_subject_stats,
+    get_subject_by_name,
+    list_subjects_page,
     update_subject,
-    list_users,
+    list_users_page,
     delete_user_bd,
     rename_user,
 )
+from src.keyboards.callbacks import (
+    AdminAction,
+    AdminCb,
+    PageDirection,
+    QueueAction,
+    QueueCb,
+    SubjectsPageCb,
+    UserAction,
+    UserCb,
+    UsersPageCb,
+)
 from src.keyboards.inline import (
     admin_subjects_keyboard,
     confirm_delete_subject_keyboard,
     queue_actions_keyboard,
     queue_clear_confirmation_keyboard,
+    queue_stats_keyboard,
     admin_change_users_keyboard,
 )
 from src.keyboards.reply import main_menu_keyboard
+from src.services import live_views
+from src.services.bulk import (
+    MAX_ERRORS,
+    MAX_FILE_SIZE,
+    BackupDocument,
+    BulkFormatError,
+    download_chunks,
+    foreign_users,
+    parse_import,
+    run_import,
+)
+from .callbacks import callback_table
 
 
 router = Router()
@@ -39,32 +75,39 @@ class EditsubjectStates(StatesGroup):
 class RenameUser(StatesGroup):
     waiting_for_name = State()
 
-@router.callback_query(F.data.startswith("queue:clear1:"))
-async def clear_queue_confirmation(callback: CallbackQuery) -> None:
-    subject_id = int(callback.data.split(":")[2])
+
+class ImportStates(StatesGroup):
+    waiting_for_file = State()
+
+@callback_table.handler(QueueCb, QueueAction.CLEAR_ASK)
+async def clear_queue_confirmation(callback: CallbackQuery, callback_data: QueueCb) -> None:
+    subject_id = callback_data.subject_id
     text = "⚙️ Подтвердите удаление:"
+    # Сообщение больше не показывает очередь - фоновые правки затёрли бы вопрос
+    live_views.untrack(callback.message)
     await callback.message.edit_text(text, reply_markup=queue_clear_confirmation_keyboard(subject_id))
 
 
-@router.callback_query(F.data.startswith("queue:clear2:"))
-async def clear_queue_handler(callback: CallbackQuery) -> None:
-    subject_id = int(callback.data.split(":")[2])
+@callback_table.handler(QueueCb, QueueAction.CLEAR)
+async def clear_queue_handler(
+    callback: CallbackQuery, callback_data: QueueCb, is_admin: bool, group_id: Optional[int]
+) -> None:
+    subject_id = callback_data.subject_id
 
-    async with async_session_maker() as session:
-        user = await get_user_by_tg_id(session, callback.from_user.id)
-        if not user or user.role != "admin":
-            await callback.answer("Эта функция доступна только старостам.", show_alert=True)
-            return
+    if not is_admin:
+        await callback.answer("Эта функция доступна только старостам.", show_alert=True)
+        return
 
-        subject = await get_subject(session, subject_id)
+    async with async_session_maker() as session:
+        subject = await get_subject(session, subject_id, group_id)
         if not subject:
             await callback.answer("Дисциплина не найдена.", show_alert=True)
             return
 
-        await clear_queue(session, subject_id)
-        await session.commit()
+    await db_writer.submit(lambda session: clear_queue(session, subject_id))
 
     text = f"Очередь по дисциплине <b>{subject.name}</b> очищена."
+    live_views.untrack(callback.message)
     await callback.message.edit_text(
         text,
         reply_markup=queue_actions_keyboard(
@@ -76,55 +119,137 @@ async def clear_queue_handler(callback: CallbackQuery) -> None:
     await callback.answer("Очередь очищена.")
 
 
-@router.message(F.text == "⚙️ Управление дисциплинами")
-async def manage_subjects(message: Message) -> None:
-    """Показывает список дисциплин для управления (только для админов)"""
+def _format_wait(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "—"
+    minutes = round(seconds / 60)
+    if minutes < 1:
+        return "меньше минуты"
+    if minutes < 60:
+        return f"{minutes} мин"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours} ч {minutes} мин" if minutes else f"{hours} ч"
+
+
+@callback_table.handler(QueueCb, QueueAction.STATS)
+async def queue_stats_handler(
+    callback: CallbackQuery, callback_data: QueueCb, is_admin: bool, group_id: Optional[int]
+) -> None:
+    subject_id = callback_data.subject_id
+
+    if not is_admin:
+        await callback.answer("Эта функция доступна только старостам.", show_alert=True)
+        return
+
     async with async_session_maker() as session:
-        user = await get_user_by_tg_id(session, message.from_user.id)
-        if not user or user.role != "admin":
-            await message.answer("Эта функция доступна только старостам.")
+        subject = await get_subject(session, subject_id, group_id)
+        if not subject:
+            await callback.answer("Дисциплина не найдена.", show_alert=True)
             return
+        stats = await get_subject_stats(session, subject_id)
+
+    lines = [
+        f"📊 <b>{escape(subject.name)}</b>",
+        "",
+        f"Сейчас в очереди: {queue_engine.length(subject_id)}, максимум был: {stats.peak_length}",
+        f"Вставали в очередь: {stats.joins}",
+        f"Дождались (ушли с первого места): {stats.served}",
+        f"Ушли раньше: {stats.left_early}",
+        f"Сняты очисткой: {stats.cleared}",
+    ]
+    if stats.served:
+        lines += [
+            "",
+            "<b>Ожидание дождавшихся</b>",
+            f"в среднем: {_format_wait(stats.wait_mean)}",
+            f"медиана: ~{_format_wait(stats.wait_percentile(0.5))}",
+            f"90% дождались за: ~{_format_wait(stats.wait_percentile(0.9))}",
+            f"дольше всех: {_format_wait(stats.wait_max)}",
+        ]
+
+    # Сообщение больше не показывает очередь - фоновые правки затёрли бы статистику
+    live_views.untrack(callback.message)
+    await callback.message.edit_text("\n".join(lines), reply_markup=queue_stats_keyboard(subject_id))
+    await callback.answer()
+
+
+def _subjects_markup(page: Page, group_id: Optional[int]) -> InlineKeyboardMarkup:
+    """Клавиатура страницы дисциплин: кэшируется по границам страницы в справочнике"""
+    start = subject_catalogue.index_of(page.items[0].id) if page.items else 0
+    return admin_subjects_keyboard(group_id, (start, start + len(page.items)))
+
+
+@router.message(F.text == "⚙️ Управление дисциплинами")
+async def manage_subjects(message: Message, is_admin: bool, group_id: Optional[int]) -> None:
+    """Показывает список дисциплин для управления (только для админов)"""
+    if not is_admin:
+        await message.answer("Эта функция доступна только старостам.")
+        return
 
-        subjects = await list_subjects(session)
+    async with async_session_maker() as session:
+        page = await list_subjects_page(session, limit=settings.admin_page_size, group_id=group_id)
 
-    if not subjects:
+    if not page.items:
         text = "Нет дисциплин в базе. Нажми '➕ Добавить дисциплину', чтобы создать первую."
         await message.answer(
             text,
-            reply_markup=admin_subjects_keyboard(subjects),
+            reply_markup=_subjects_markup(page, group_id),
         )
         return
 
-    text = "📚 <b>Управление дисциплинами</b>\n\nВыбери дисциплину для удаления или добавь новую:"
+    text = (
+        "📚 <b>Управление дисциплинами</b>\n\nВыбери дисциплину для удаления или добавь новую.\n"
+        "Загрузить студентов и дисциплины файлом - /import, выгрузить всё - /export."
+    )
     await message.answer(
         text,
-        reply_markup=admin_subjects_keyboard(subjects),
+        reply_markup=_subjects_markup(page, group_id),
     )
 
 
-@router.callback_query(F.data == "admin:subjects_back")
-async def subjects_back(callback: CallbackQuery) -> None:
-    """Возврат к главному меню из управления дисциплинами"""
+@callback_table.handler(SubjectsPageCb)
+async def subjects_page(
+    callback: CallbackQuery, callback_data: SubjectsPageCb, is_admin: bool, group_id: Optional[int]
+) -> None:
+    """Листание списка дисциплин"""
+    if not is_admin:
+        await callback.answer("Эта функция доступна только старостам.", show_alert=True)
+        return
+
+    boundary = callback_data.boundary
+    if callback_data.direction == PageDirection.NEXT:
+        after, before = boundary, None
+    else:
+        after, before = None, boundary
     async with async_session_maker() as session:
-        user = await get_user_by_tg_id(session, callback.from_user.id)
-        if not user or user.role != "admin":
-            await callback.answer("Эта функция доступна только старостам.", show_alert=True)
-            return
-        is_admin = user.role == "admin"
+        page = await list_subjects_page(
+            session, after=after, before=before, limit=settings.admin_page_size, group_id=group_id
+        )
+
+    await callback.message.edit_reply_markup(
+        reply_markup=_subjects_markup(page, group_id),
+    )
+    await callback.answer()
+
+
+@callback_table.handler(AdminCb, AdminAction.BACK)
+async def subjects_back(callback: CallbackQuery, is_admin: bool) -> None:
+    """Возврат к главному меню из управления дисциплинами"""
+    if not is_admin:
+        await callback.answer("Эта функция доступна только старостам.", show_alert=True)
+        return
 
     text = "Главное меню"
     await callback.message.answer(text, reply_markup=main_menu_keyboard(is_admin=is_admin))
     await callback.answer()
 
 
-@router.callback_query(F.data == "admin:add_disc")
-async def add_subject_start(callback: CallbackQuery, state: FSMContext) -> None:
+@callback_table.handler(AdminCb, AdminAction.ADD)
+async def add_subject_start(callback: CallbackQuery, state: FSMContext, is_admin: bool) -> None:
     """Начало процесса добавления дисциплины"""
-    async with async_session_maker() as session:
-        user = await get_user_by_tg_id(session, callback.from_user.id)
-        if not user or user.role != "admin":
-            await callback.answer("Эта функция доступна только старостам.", show_alert=True)
-            return
+    if not is_admin:
+        await callback.answer("Эта функция доступна только старостам.", show_alert=True)
+        return
 
     await callback.message.edit_text("Введи название новой дисциплины:")
     await state.set_state(AddsubjectStates.waiting_for_name)
@@ -132,50 +257,55 @@ async def add_subject_start(callback: CallbackQuery, state: FSMContext) -> None:
 
 
 @router.message(AddsubjectStates.waiting_for_name)
-async def add_subject_process(message: Message, state: FSMContext) -> None:
+async def add_subject_process(
+    message: Message, state: FSMContext, is_admin: bool, group_id: Optional[int]
+) -> None:
     """Обработка ввода названия дисциплины"""
-    async with async_session_maker() as session:
-        user = await get_user_by_tg_id(session, message.from_user.id)
-        if not user or user.role != "admin":
-            await message.answer("Эта функция доступна только старостам.")
-            await state.clear()
-            return
+    if not is_admin:
+        await message.answer("Эта функция доступна только старостам.")
+        await state.clear()
+        return
 
+    async with async_session_maker() as session:
         subject_name = message.text.strip()
         if not subject_name or len(subject_name) > 100:
             await message.answer("Название дисциплины должно быть от 1 до 100 символов. Попробуй ещё раз:")
             return
 
         # Проверяем, нет ли уже такой дисциплины
-        existing = await list_subjects(session)
-        if any(d.name.lower() == subject_name.lower() for d in existing):
+        if await get_subject_by_name(session, subject_name, group_id):
             await message.answer(f"Дисциплина '{subject_name}' уже существует. Введи другое название:")
             return
 
-        await create_subject(session, subject_name)
-        await session.commit()
+        try:
+            await db_writer.submit(lambda s: create_subject(s, subject_name, group_id))
+        except IntegrityError:
+            # Такую же дисциплину успели добавить параллельно
+            await message.answer(f"Дисциплина '{subject_name}' уже существует. Введи другое название:")
+            return
 
-        subjects = await list_subjects(session)
+        page = await list_subjects_page(session, limit=settings.admin_page_size, group_id=group_id)
 
     text = f"✅ Дисциплина '<b>{subject_name}</b>' успешно добавлена!\n\n📚 <b>Управление дисциплинами</b>"
     await message.answer(
         text,
-        reply_markup=admin_subjects_keyboard(subjects),
+        reply_markup=_subjects_markup(page, group_id),
     )
     await state.clear()
 
 
-@router.callback_query(F.data.startswith("admin:delete_disc:"))
-async def delete_subject_confirm(callback: CallbackQuery) -> None:
+@callback_table.handler(AdminCb, AdminAction.DELETE_ASK)
+async def delete_subject_confirm(
+    callback: CallbackQuery, callback_data: AdminCb, is_admin: bool, group_id: Optional[int]
+) -> None:
     """Запрос подтверждения удаления дисциплины"""
-    async with async_session_maker() as session:
-        user = await get_user_by_tg_id(session, callback.from_user.id)
-        if not user or user.role != "admin":
-            await callback.answer("Эта функция доступна только старостам.", show_alert=True)
-            return
+    if not is_admin:
+        await callback.answer("Эта функция доступна только старостам.", show_alert=True)
+        return
 
-        subject_id = int(callback.data.split(":")[2])
-        subject = await get_subject(session, subject_id)
+    async with async_session_maker() as session:
+        subject_id = callback_data.subject_id
+        subject = await get_subject(session, subject_id, group_id)
         if not subject:
             await callback.answer("Дисциплина не найдена.", show_alert=True)
             return
@@ -192,46 +322,51 @@ async def delete_subject_confirm(callback: CallbackQuery) -> None:
     await callback.answer()
 
 
-@router.callback_query(F.data.startswith("admin:confirm_delete:"))
-async def delete_subject_process(callback: CallbackQuery) -> None:
+@callback_table.handler(AdminCb, AdminAction.DELETE)
+async def delete_subject_process(
+    callback: CallbackQuery, callback_data: AdminCb, is_admin: bool, group_id: Optional[int]
+) -> None:
     """Удаление дисциплины после подтверждения"""
-    async with async_session_maker() as session:
-        user = await get_user_by_tg_id(session, callback.from_user.id)
-        if not user or user.role != "admin":
-            await callback.answer("Эта функция доступна только старостам.", show_alert=True)
-            return
+    if not is_admin:
+        await callback.answer("Эта функция доступна только старостам.", show_alert=True)
+        return
 
-        subject_id = int(callback.data.split(":")[2])
-        subject = await get_subject(session, subject_id)
+    async with async_session_maker() as session:
+        subject_id = callback_data.subject_id
+        subject = await get_subject(session, subject_id, group_id)
         if not subject:
             await callback.answer("Дисциплина не найдена.", show_alert=True)
             return
 
         subject_name = subject.name
-        await delete_subject(session, subject_id)
-        await session.commit()
+        await db_writer.submit(lambda s: delete_subject(s, subject_id))
 
-        subjects = await list_subjects(session)
+        page = await list_subjects_page(session, limit=settings.admin_page_size, group_id=group_id)
 
     text = f"✅ Дисциплина '<b>{subject_name}</b>' и все связанные очереди удалены.\n\n📚 <b>Управление дисциплинами</b>"
     await callback.message.edit_text(
         text,
-        reply_markup=admin_subjects_keyboard(subjects),
+        reply_markup=_subjects_markup(page, group_id),
     )
     await callback.answer("Дисциплина удалена.")
 
 
-@router.callback_query(F.data.startswith("admin:edit_disc:"))
-async def edit_subject_start(callback: CallbackQuery, state: FSMContext) -> None:
+@callback_table.handler(AdminCb, AdminAction.EDIT)
+async def edit_subject_start(
+    callback: CallbackQuery,
+    callback_data: AdminCb,
+    state: FSMContext,
+    is_admin: bool,
+    group_id: Optional[int],
+) -> None:
     """Начало процесса редактирования дисциплины"""
-    async with async_session_maker() as session:
-        user = await get_user_by_tg_id(session, callback.from_user.id)
-        if not user or user.role != "admin":
-            await callback.answer("Эта функция доступна только старостам.", show_alert=True)
-            return
+    if not is_admin:
+        await callback.answer("Эта функция доступна только старостам.", show_alert=True)
+        return
 
-        subject_id = int(callback.data.split(":")[2])
-        subject = await get_subject(session, subject_id)
+    async with async_session_maker() as session:
+        subject_id = callback_data.subject_id
+        subject = await get_subject(session, subject_id, group_id)
         if not subject:
             await callback.answer("Дисциплина не найдена.", show_alert=True)
             return
@@ -245,15 +380,16 @@ async def edit_subject_start(callback: CallbackQuery, state: FSMContext) -> None
 
 
 @router.message(EditsubjectStates.waiting_for_name)
-async def edit_subject_process(message: Message, state: FSMContext) -> None:
+async def edit_subject_process(
+    message: Message, state: FSMContext, is_admin: bool, group_id: Optional[int]
+) -> None:
     """Обработка ввода нового названия дисциплины"""
-    async with async_session_maker() as session:
-        user = await get_user_by_tg_id(session, message.from_user.id)
-        if not user or user.role != "admin":
-            await message.answer("Эта функция доступна только старостам.")
-            await state.clear()
-            return
+    if not is_admin:
+        await message.answer("Эта функция доступна только старостам.")
+        await state.clear()
+        return
 
+    async with async_session_maker() as session:
         data = await state.get_data()
         subject_id = data.get("subject_id")
         old_name = data.get("old_name")
@@ -269,24 +405,28 @@ async def edit_subject_process(message: Message, state: FSMContext) -> None:
             return
 
         # Проверяем, нет ли уже такой дисциплины (кроме текущей)
-        existing = await list_subjects(session)
-        if any(
-            d.name.lower() == subject_name.lower() and d.id != subject_id
-            for d in existing
-        ):
+        existing = await get_subject_by_name(session, subject_name, group_id)
+        if existing and existing.id != subject_id:
+            await message.answer(
+                f"Дисциплина '{subject_name}' уже существует. Введи другое название:"
+            )
+            return
+
+        try:
+            subject = await db_writer.submit(
+                lambda s: update_subject(s, subject_id, subject_name)
+            )
+        except IntegrityError:
             await message.answer(
                 f"Дисциплина '{subject_name}' уже существует. Введи другое название:"
             )
             return
 
-        subject = await update_subject(session, subject_id, subject_name)
         if not subject:
             await message.answer("Ошибка: дисциплина не найдена.")
             await state.clear()
             return
-
-        await session.commit()
-        subjects = await list_subjects(session)
+        page = await list_subjects_page(session, limit=settings.admin_page_size, group_id=group_id)
 
     text = (
         f"✅ Дисциплина '<b>{old_name}</b>' переименована в '<b>{subject_name}</b>'!\n\n"
@@ -294,36 +434,79 @@ async def edit_subject_process(message: Message, state: FSMContext) -> None:
     )
     await message.answer(
         text,
-        reply_markup=admin_subjects_keyboard(subjects),
+        reply_markup=_subjects_markup(page, group_id),
     )
     await state.clear()
 
 @router.message(F.text == "🤦‍♂️ Управление пользователями")
-async def edit_users(message: Message) -> None:
+async def edit_users(message: Message, is_admin: bool, group_id: Optional[int]) -> None:
+    if not is_admin:
+        await message.answer("Эта функция доступна только старостам.")
+        return
+
     async with async_session_maker() as session:
-        users = await list_users(session)
-        await session.commit()
+        page = await list_users_page(session, limit=settings.admin_page_size, group_id=group_id)
     text = "🤦‍♂️ Выберите пользователя:"
-    await message.answer(text, reply_markup=admin_change_users_keyboard(users))
+    await message.answer(
+        text, reply_markup=admin_change_users_keyboard(page.items, page.has_prev, page.has_next)
+    )
 
-@router.callback_query(F.data.startswith("delete:user:"))
-async def delete_user(callback: CallbackQuery) -> None:
-    user_id = int(callback.data.split(":")[2])
+@callback_table.handler(UsersPageCb)
+async def users_page(
+    callback: CallbackQuery, callback_data: UsersPageCb, is_admin: bool, group_id: Optional[int]
+) -> None:
+    """Листание списка пользователей"""
+    if not is_admin:
+        await callback.answer("Эта функция доступна только старостам.", show_alert=True)
+        return
+
+    boundary = callback_data.boundary
+    if callback_data.direction == PageDirection.NEXT:
+        after, before = boundary, None
+    else:
+        after, before = None, boundary
     async with async_session_maker() as session:
-        if await delete_user_bd(session, user_id):
-            await callback.answer("Пользователь удален")
-        else:
-            await callback.answer("❌ Не удалось удалить пользователя")
-
-@router.callback_query(F.data.startswith("rename:user:"))
-async def rename_user_handler(callback: CallbackQuery, state: FSMContext) -> None:
-    user_id = int(callback.data.split(":")[2])
+        page = await list_users_page(
+            session, after=after, before=before, limit=settings.admin_page_size, group_id=group_id
+        )
+
+    await callback.message.edit_reply_markup(
+        reply_markup=admin_change_users_keyboard(page.items, page.has_prev, page.has_next),
+    )
+    await callback.answer()
+
+@callback_table.handler(UserCb, UserAction.DELETE)
+async def delete_user(
+    callback: CallbackQuery, callback_data: UserCb, is_admin: bool, group_id: Optional[int]
+) -> None:
+    if not is_admin:
+        await callback.answer("Эта функция доступна только старостам.", show_alert=True)
+        return
+
+    user_id = callback_data.user_id
+    if await db_writer.submit(lambda session: delete_user_bd(session, user_id, group_id)):
+        await callback.answer("Пользователь удален")
+    else:
+        await callback.answer("❌ Не удалось удалить пользователя")
+
+@callback_table.handler(UserCb, UserAction.RENAME)
+async def rename_user_handler(
+    callback: CallbackQuery,
+    callback_data: UserCb,
+    state: FSMContext,
+    is_admin: bool,
+    group_id: Optional[int],
+) -> None:
+    if not is_admin:
+        await callback.answer("Эта функция доступна только старостам.", show_alert=True)
+        return
+
+    user_id = callback_data.user_id
     await state.update_data(user_id=user_id)
-    async with async_session_maker() as session:
-        user = await get_user_by_tg_id(session, user_id)
-        if not user:
-            await callback.answer("Пользователь не найден.", show_alert=True)
-            return
+    user = await user_cache.get(user_id)
+    if not user or user.group_id != group_id:
+        await callback.answer("Пользователь не найден.", show_alert=True)
+        return
     await callback.message.edit_text(
         f"Текущее имя: <b>{user.full_name}</b>\n\nВведи новое имя пользователя:"
     )
@@ -331,7 +514,14 @@ async def rename_user_handler(callback: CallbackQuery, state: FSMContext) -> Non
     await callback.answer()
 
 @router.message(RenameUser.waiting_for_name)
-async def enter_new_name(message: Message, state: FSMContext) -> None:
+async def enter_new_name(
+    message: Message, state: FSMContext, is_admin: bool, group_id: Optional[int]
+) -> None:
+    if not is_admin:
+        await message.answer("Эта функция доступна только старостам.")
+        await state.clear()
+        return
+
     data = await state.get_data()
     user_id = data.get("user_id")
     new_name = message.text.strip()
@@ -340,16 +530,128 @@ async def enter_new_name(message: Message, state: FSMContext) -> None:
         await message.answer("Имя не может быть пустым или слишком длинным.")
         return
 
-    async with async_session_maker() as session:
-        is_updated = await rename_user(session, user_id, new_name)
-        if not is_updated:
-            await message.answer("Ошибка: пользователь не найден.")
-            await state.clear()
-            return
-        await session.commit()
-        text = f"Пользователь успешно переименован в <b>{new_name}</b>"
+    is_updated = await db_writer.submit(lambda session: rename_user(session, user_id, new_name, group_id))
+    if not is_updated:
+        await message.answer("Ошибка: пользователь не найден.")
+        await state.clear()
+        return
+    text = f"Пользователь успешно переименован в <b>{new_name}</b>"
+    await message.answer(
+        text,
+        reply_markup=main_menu_keyboard(is_admin=True),
+    )
+    await state.clear()
+
+
+IMPORT_HELP = (
+    "📥 <b>Импорт</b>\n\n"
+    "Пришли файл .csv или .jsonl.\n"
+    "CSV - с заголовком в первой строке, разделитель «,» или «;»:\n"
+    "<code>tg_id,full_name,role</code> - студенты (role: student или admin, можно не указывать)\n"
+    "<code>name</code> - дисциплины\n"
+    "JSON Lines - по объекту на строку с теми же полями; такой же файл даёт /export.\n\n"
+    "Существующие студенты обновятся, существующие дисциплины пропустятся.\n"
+    "Любое сообщение вместо файла отменит импорт."
+)
+
+
+@router.message(Command("import"))
+async def import_start(message: Message, state: FSMContext, is_admin: bool) -> None:
+    if not is_admin:
+        await message.answer("Эта функция доступна только старостам.")
+        return
+    await state.set_state(ImportStates.waiting_for_file)
+    await message.answer(IMPORT_HELP)
+
+
+@router.message(ImportStates.waiting_for_file, F.document)
+async def import_file(
+    message: Message, state: FSMContext, bot: Bot, is_admin: bool, group_id: Optional[int]
+) -> None:
+    await state.clear()
+    if not is_admin:
+        await message.answer("Эта функция доступна только старостам.")
+        return
+
+    document = message.document
+    if document.file_size and document.file_size > MAX_FILE_SIZE:
+        await message.answer("Файл больше 20 МБ - Telegram не даст боту его скачать.")
+        return
+
+    started = time.perf_counter()
+    try:
+        batch = await parse_import(download_chunks(bot, document.file_id), document.file_name or "")
+    except BulkFormatError as e:
+        await message.answer(f"❌ Не удалось прочитать файл: {e}.")
+        return
+
+    if batch.error_count:
+        # Ничего не записываем: лучше исправить файл и загрузить его целиком
+        errors = "\n".join(batch.errors)
+        more = batch.error_count - len(batch.errors)
+        tail = f"\n… и ещё {more}" if more > 0 else ""
         await message.answer(
-            text,
-            reply_markup=main_menu_keyboard(is_admin=True),
+            f"❌ Импорт отменён, ошибок: {batch.error_count}. Ничего не записано.\n\n{errors}{tail}"
         )
-        await state.clear()
+        return
+
+    foreign = foreign_users(batch, group_id)
+    if foreign:
+        shown = ", ".join(map(str, foreign[:MAX_ERRORS]))
+        await message.answer(
+            f"❌ Импорт отменён: {len(foreign)} студентов уже в других группах ({shown}). "
+            "Ничего не записано."
+        )
+        return
+
+    users, subjects = await run_import(batch, group_id)
+    elapsed = time.perf_counter() - started
+    skipped = f"\nПропущено записей очередей: {batch.skipped}" if batch.skipped else ""
+    await message.answer(
+        f"✅ Импорт завершён за {elapsed:.1f} с.\n"
+        f"Студентов загружено: {users}\n"
+        f"Новых дисциплин: {subjects} (из {len(batch.subjects)}){skipped}",
+        reply_markup=main_menu_keyboard(is_admin=True),
+    )
+
+
+@router.message(ImportStates.waiting_for_file)
+async def import_cancel(message: Message, state: FSMContext, is_admin: bool) -> None:
+    await state.clear()
+    await message.answer("Импорт отменён.", reply_markup=main_menu_keyboard(is_admin=is_admin))
+
+
+@router.message(Command("export"))
+async def export_all(message: Message, is_admin: bool, group_id: Optional[int]) -> None:
+    if not is_admin:
+        await message.answer("Эта функция доступна только старостам.")
+        return
+    await message.answer_document(
+        BackupDocument(group_id),
+        caption="📤 Пользователи, дисциплины и очереди. Файл можно загрузить обратно через /import.",
+    )
+
+
+@router.message(Command("newgroup"))
+async def new_group(message: Message, command: CommandObject, user: Optional[CachedUser]) -> None:
+    """Создать группу (только SUPERADMINS): /newgroup <название>"""
+    if not user or user.tg_id not in settings.superadmins:
+        await message.answer("Эта функция доступна только администраторам бота.")
+        return
+
+    name = " ".join((command.args or "").split())
+    if not 2 <= len(name) <= 100:
+        await message.answer("Название группы - от 2 до 100 символов: /newgroup М-101")
+        return
+
+    try:
+        group = await shard_router.create_group(name)
+    except IntegrityError:
+        await message.answer(f"Группа <b>{escape(name)}</b> уже есть.")
+        return
+
+    place = " в отдельной базе" if group.shard else ""
+    await message.answer(
+        f"✅ Группа <b>{escape(group.name)}</b> создана{place}.\n\n"
+        "Первый, кто выберет её при регистрации через /start, станет старостой."
+    )
@@ -0,0 +1,75 @@
+from typing import Any, Callable, Dict, Optional, Tuple, Type
+
+from aiogram import Router
+from aiogram.dispatcher.event.handler import CallableObject
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import CallbackQuery
+
+# Разобранная кнопка и её обработчик
+Route = Tuple[CallbackData, CallableObject]
+
+
+class CallbackTable:
+    """
+    Маршрутизация inline-кнопок по таблице вместо цепочки фильтров.
+
+    Обработчик регистрируется на тип CallbackData (и действие, если оно
+    есть): callback_table.handler(QueueCb, QueueAction.JOIN). Входящие
+    данные разбираются один раз (decode): префикс -> тип -> unpack ->
+    поиск обработчика в словаре по (префикс, действие). Обработчик
+    получает готовый callback_data и остальные зависимости, как обычно
+    в aiogram (state, user, is_admin, ...).
+
+    Разбор делает CallbackDataMiddleware ещё до UserMiddleware, так что
+    битые или устаревшие кнопки отклоняются без обращения к БД.
+    """
+
+    def __init__(self) -> None:
+        self._types: Dict[str, Type[CallbackData]] = {}
+        self._handlers: Dict[Tuple[str, Optional[str]], CallableObject] = {}
+        self.router = Router(name="callbacks")
+        self.router.callback_query.register(self._dispatch)
+
+    def handler(self, cb_type: Type[CallbackData], action: Any = None) -> Callable:
+        def decorator(func: Callable) -> Callable:
+            prefix = cb_type.__prefix__
+            if self._types.setdefault(prefix, cb_type) is not cb_type:
+                raise ValueError(f"Префикс {prefix!r} уже занят другим типом кнопок")
+            key = (prefix, None if action is None else action.value)
+            if key in self._handlers:
+                raise ValueError(f"Обработчик для {key} уже зарегистрирован")
+            self._handlers[key] = CallableObject(func)
+            return func
+
+        return decorator
+
+    def decode(self, data: Optional[str]) -> Optional[Route]:
+        """Кнопка и её обработчик или None, если данные не распознаны"""
+        if not data:
+            return None
+        cb_type = self._types.get(data.split(":", 1)[0])
+        if cb_type is None:
+            return None
+        try:
+            callback_data = cb_type.unpack(data)
+        except (TypeError, ValueError):
+            # ValidationError pydantic - тоже ValueError
+            return None
+        action = getattr(callback_data, "action", None)
+        handler = self._handlers.get(
+            (cb_type.__prefix__, None if action is None else action.value)
+        )
+        if handler is None:
+            return None
+        return callback_data, handler
+
+    async def _dispatch(self, callback: CallbackQuery, **data: Any) -> Any:
+        route = data.pop("callback_route", None) or self.decode(callback.data)
+        if route is None:
+            await callback.answer("Кнопка устарела, открой меню заново.", show_alert=True)
+            return None
+        callback_data, handler = route
+        return await handler.call(callback, callback_data=callback_data, **data)
+
+
+callback_table = CallbackTable()
@@ -1,31 +1,33 @@
 from curses.textpad import Textbox
+from typing import Optional
 
 from aiogram import F, Router
 from aiogram.types import CallbackQuery, Message
 
-from src.database import async_session_maker
-from src.database.models import Subject
+from src.database import async_session_maker, queue_engine
+from src.config import settings
 from src.database.requests import (
-    add_to_queue,
     get_subject,
-    get_user_by_tg_id,
-    is_user_in_queue,
     list_subjects,
-    list_queue_for_subject,
-    remove_from_queue,
+    set_notify_at,
 )
+from src.database.writer import db_writer
+from src.database.user_cache import CachedUser
+from src.database.user_queues import user_queues
 # Если ты переименовал файлы клавиатур, проверь импорты здесь:
-from src.keyboards.inline import subjects_keyboard, queue_actions_keyboard, available_queues
+from src.keyboards.callbacks import NotifyCb, QueueAction, QueueCb, SubjectCb
+from src.keyboards.inline import notify_settings_keyboard, subjects_keyboard, available_queues
 from src.keyboards.reply import main_menu_keyboard
+from src.services import live_views, turn_notifier
+from src.services.queue_view import QueueDocument
+from .callbacks import callback_table
 
 router = Router()
 
 @router.message(F.text == "Выбрать дисциплину")
-async def choose_discipline(message: Message) -> None:
+async def choose_discipline(message: Message, is_admin: bool, group_id: Optional[int]) -> None:
     async with async_session_maker() as session:
-        subjects = await list_subjects(session)
-        user = await get_user_by_tg_id(session, message.from_user.id)
-        is_admin = user.role == "admin" if user else False
+        subjects = await list_subjects(session, group_id)
 
     if not subjects:
         text = (
@@ -37,124 +39,172 @@ async def choose_discipline(message: Message) -> None:
 
     await message.answer(
         "Выбери дисциплину из списка:",
-        reply_markup=subjects_keyboard(subjects),
+        reply_markup=subjects_keyboard(group_id),
     )
 
-def _format_queue_text(subject_name: str, entries) -> str:
-    if not entries:
-        return f"Очередь по предмету <b>{subject_name}</b> пуста."
+@callback_table.handler(SubjectCb)
+async def show_queue(
+    callback: CallbackQuery,
+    callback_data: SubjectCb,
+    user: Optional[CachedUser],
+    is_admin: bool,
+    group_id: Optional[int],
+) -> None:
+    subject_id = callback_data.subject_id
 
-    lines = [f"Очередь по предмету <b>{subject_name}</b>:"]
-    for idx, entry in enumerate(entries, start=1):
-        # Используем full_name связанного пользователя
-        lines.append(f"{idx}. {entry.user.full_name}")
-    return "\n".join(lines)
+    async with async_session_maker() as session:
+        subject = await get_subject(session, subject_id, group_id)
+        if not subject:
+            await callback.answer("Предмет не найден", show_alert=True)
+            return
 
-@router.callback_query(F.data.startswith("subject:"))
-async def show_queue(callback: CallbackQuery) -> None:
-    subject_id = int(callback.data.split(":")[1])
+    # Сообщение остаётся «живым»: дальше оно обновляется само
+    await live_views.show(
+        callback.message,
+        subject,
+        viewer_id=user.tg_id if user else None,
+        is_admin=is_admin,
+    )
+    await callback.answer()
+
+@callback_table.handler(QueueCb, QueueAction.JOIN)
+async def join_queue(
+    callback: CallbackQuery,
+    callback_data: QueueCb,
+    user: Optional[CachedUser],
+    is_admin: bool,
+    group_id: Optional[int],
+) -> None:
+    subject_id = callback_data.subject_id
+
+    if not user:
+        await callback.answer("Сначала нажми /start", show_alert=True)
+        return
 
     async with async_session_maker() as session:
-        subject = await get_subject(session, subject_id)
+        # Справочник дисциплин в памяти - запроса в БД здесь нет
+        subject = await get_subject(session, subject_id, group_id)
         if not subject:
             await callback.answer("Предмет не найден", show_alert=True)
             return
 
-        entries = await list_queue_for_subject(session, subject_id)
-        user = await get_user_by_tg_id(session, callback.from_user.id)
+    # Проверка и запись - один INSERT ... ON CONFLICT DO NOTHING,
+    # в общей транзакции с другими нажатиями за те же миллисекунды
+    position = await db_writer.join(user.tg_id, subject_id, user.full_name)
 
-        in_queue = False
-        is_admin = False
-        if user:
-            in_queue = await is_user_in_queue(session, user.tg_id, subject_id)
-            is_admin = user.role == "admin"
+    if position is None:
+        await callback.answer("Ты уже в этой очереди!", show_alert=True)
+        return
 
-    text = _format_queue_text(subject.name, entries)
-    await callback.message.edit_text(
-        text,
-        reply_markup=queue_actions_keyboard(
-            subject_id=subject_id, # Оставляем аргумент как в клавиатуре
-            in_queue=in_queue,
-            is_admin=is_admin,
-        ),
-    )
-    await callback.answer()
+    await live_views.show(callback.message, subject, user.tg_id, is_admin)
+    await callback.answer(f"Записано! Ты {position}-й в очереди.")
 
-@router.callback_query(F.data.startswith("queue:join:"))
-async def join_queue(callback: CallbackQuery) -> None:
-    subject_id = int(callback.data.split(":")[2])
+@callback_table.handler(QueueCb, QueueAction.LEAVE)
+async def leave_queue(
+    callback: CallbackQuery,
+    callback_data: QueueCb,
+    user: Optional[CachedUser],
+    is_admin: bool,
+    group_id: Optional[int],
+) -> None:
+    subject_id = callback_data.subject_id
+
+    if not user: return
 
     async with async_session_maker() as session:
-        user = await get_user_by_tg_id(session, callback.from_user.id)
-        if not user:
-            await callback.answer("Сначала нажми /start", show_alert=True)
+        subject = await get_subject(session, subject_id, group_id)
+        if not subject:
+            await callback.answer("Предмет не найден", show_alert=True)
             return
 
-        if await is_user_in_queue(session, user.tg_id, subject_id):
-            await callback.answer("Ты уже в этой очереди!", show_alert=True)
+    await db_writer.leave(user.tg_id, subject_id)
+
+    await live_views.show(callback.message, subject, user.tg_id, is_admin)
+    await callback.answer("Ты вышел из очереди.")
+
+@callback_table.handler(QueueCb, QueueAction.EXPORT)
+async def export_queue(
+    callback: CallbackQuery, callback_data: QueueCb, group_id: Optional[int]
+) -> None:
+    subject_id = callback_data.subject_id
+
+    async with async_session_maker() as session:
+        subject = await get_subject(session, subject_id, group_id)
+        if not subject:
+            await callback.answer("Предмет не найден", show_alert=True)
             return
 
-        await add_to_queue(session, user.tg_id, subject_id)
-        # Обязательно коммитим изменения
-        await session.commit()
+    # Снимок очереди неизменяемый - файл соберётся из него по кускам при отправке
+    entries = queue_engine.entries(subject_id)
+    await callback.answer()
+    await callback.message.answer_document(
+        QueueDocument(subject, entries),
+        caption=f"Очередь по предмету <b>{subject.name}</b>: {len(entries)} чел.",
+    )
 
-        subject = await get_subject(session, subject_id)
-        entries = await list_queue_for_subject(session, subject_id)
-        is_admin = user.role == "admin"
+@router.message(F.text == "Мои очереди")
+async def my_queues(message: Message, user: Optional[CachedUser], is_admin: bool) -> None:
+    if not user:
+        await message.answer("Сначала нажми /start.")
+        return
 
-    text = _format_queue_text(str(subject.name), entries)
-    await callback.message.edit_text(
+    queues = await user_queues.get(user.tg_id)
+    if not queues:
+        await message.answer("Ты пока не записан ни в одну очередь.",
+                             reply_markup=main_menu_keyboard(is_admin=is_admin))
+        return
+
+    text = "Твои очереди:\n" + "\n".join(
+        f"• {queue.name} - {queue.position}-й из {queue.length}" for queue in queues
+    )
+    await message.answer(
         text,
-        reply_markup=queue_actions_keyboard(subject_id, in_queue=True, is_admin=is_admin),
+        reply_markup=available_queues(tuple((queue.subject_id, queue.name) for queue in queues)),
     )
-    await callback.answer("Записано!")
 
-@router.callback_query(F.data.startswith("queue:leave:"))
-async def leave_queue(callback: CallbackQuery) -> None:
-    subject_id = int(callback.data.split(":")[2])
 
-    async with async_session_maker() as session:
-        user = await get_user_by_tg_id(session, callback.from_user.id)
-        if not user: return
+def _notify_text(notify_at: Optional[int]) -> str:
+    if notify_at is None:
+        state = "Сейчас уведомления выключены."
+    elif notify_at == 1:
+        state = "Сейчас пришлю сообщение, когда ты станешь первым."
+    else:
+        state = f"Сейчас пришлю сообщение, когда ты станешь {notify_at}-м, и ещё раз - первым."
+    return f"🔔 <b>Уведомления об очереди</b>\n\n{state}\nКогда предупредить?"
 
-        await remove_from_queue(session, user.tg_id, subject_id)
-        await session.commit()
 
-        subject = await get_subject(session, subject_id)
-        entries = await list_queue_for_subject(session, subject_id)
-        is_admin = user.role == "admin"
+@router.message(F.text == "🔔 Уведомления")
+async def notify_settings(message: Message, user: Optional[CachedUser]) -> None:
+    if not user:
+        await message.answer("Сначала нажми /start.")
+        return
 
-    text = _format_queue_text(str(subject.name), entries)
-    await callback.message.edit_text(
-        text,
-        reply_markup=queue_actions_keyboard(subject_id, in_queue=False, is_admin=is_admin),
+    notify_at = turn_notifier.preference(user.tg_id)
+    await message.answer(
+        _notify_text(notify_at),
+        reply_markup=notify_settings_keyboard(tuple(settings.turn_notify_positions), notify_at),
     )
-    await callback.answer("Ты вышел из очереди.")
-
-@router.message(F.text == "Мои очереди")
-async def my_queues(message: Message) -> None:
-    async with async_session_maker() as session:
-        user = await get_user_by_tg_id(session, message.from_user.id)
-        if not user:
-            await message.answer("Сначала нажми /start.")
-            return
 
 
-        raw_sql = """
-            SELECT s.name, s.id
-            FROM Queues q
-            JOIN Subjects s ON s.id = q.subject_id
-            WHERE q.user_id = :user_id
-            ORDER BY s.name
-        """
-        from sqlalchemy import text
-        result = await session.execute(text(raw_sql), {"user_id": user.tg_id})
-        subjects = [Subject(name=row[0], id=row[1]) for row in result.fetchall()]
+@callback_table.handler(NotifyCb)
+async def set_notify(
+    callback: CallbackQuery, callback_data: NotifyCb, user: Optional[CachedUser]
+) -> None:
+    if not user:
+        await callback.answer("Сначала нажми /start", show_alert=True)
+        return
 
-    if not subjects:
-        await message.answer("Ты пока не записан ни в одну очередь.",
-                             reply_markup=main_menu_keyboard(is_admin=(user.role == "admin")))
+    positions = tuple(settings.turn_notify_positions)
+    notify_at = callback_data.position or None
+    if notify_at is not None and notify_at not in positions:
+        await callback.answer("Кнопка устарела, открой меню заново.", show_alert=True)
         return
 
-    text = "Твои очереди:\n" + "\n".join(f"• {subject.name}" for subject in subjects)
-    await message.answer(text, reply_markup=available_queues(subjects))
\ No newline at end of file
+    await db_writer.submit(lambda session: set_notify_at(session, user.tg_id, notify_at))
+    turn_notifier.set_preference(user.tg_id, notify_at)
+
+    await callback.message.edit_text(
+        _notify_text(notify_at),
+        reply_markup=notify_settings_keyboard(positions, notify_at),
+    )
+    await callback.answer("Уведомления выключены." if notify_at is None else "Готово!")
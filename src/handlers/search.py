@@ -0,0 +1,98 @@
+import re
+from html import escape
+from typing import Optional
+
+from aiogram import Bot, F, Router
+from aiogram.filters import CommandObject, CommandStart
+from aiogram.types import (
+    InlineQuery,
+    InlineQueryResultArticle,
+    InlineQueryResultsButton,
+    InputTextMessageContent,
+    Message,
+)
+from aiogram.utils.deep_linking import create_start_link
+
+from src.database import async_session_maker, queue_engine, subject_catalogue
+from src.database.requests import get_subject
+from src.database.subject_search import subject_search
+from src.database.user_cache import CachedUser
+from src.database.writer import db_writer
+from src.keyboards.inline import join_link_keyboard, turn_notification_keyboard
+
+router = Router()
+
+# Telegram показывает не больше 50 результатов
+INLINE_RESULTS = 20
+# Длина очереди в описании меняется - надолго не кэшируем
+INLINE_CACHE_TIME = 5
+
+JOIN_PAYLOAD = re.compile(r"^join_(\d+)$")
+
+
+@router.inline_query()
+async def search_subjects(
+    inline_query: InlineQuery, bot: Bot, user: Optional[CachedUser], group_id: Optional[int]
+) -> None:
+    """@бот <часть названия>: дисциплины своей группы со ссылкой на запись"""
+    if not user:
+        await inline_query.answer(
+            [],
+            cache_time=INLINE_CACHE_TIME,
+            is_personal=True,
+            button=InlineQueryResultsButton(text="Сначала зарегистрируйся", start_parameter="register"),
+        )
+        return
+
+    if not subject_catalogue.loaded:
+        # Только после изменения справочника, а не на каждую букву
+        async with async_session_maker() as session:
+            await subject_catalogue.ensure_loaded(session)
+
+    results = []
+    for subject in subject_search.search(inline_query.query, group_id, INLINE_RESULTS):
+        name = escape(subject.name)
+        length = queue_engine.length(subject.id)
+        results.append(
+            InlineQueryResultArticle(
+                id=str(subject.id),
+                title=subject.name,
+                description=f"В очереди: {length} чел.",
+                input_message_content=InputTextMessageContent(
+                    message_text=f"Очередь по <b>{name}</b>: {length} чел."
+                ),
+                reply_markup=join_link_keyboard(
+                    await create_start_link(bot, f"join_{subject.id}")
+                ),
+            )
+        )
+    await inline_query.answer(results, cache_time=INLINE_CACHE_TIME, is_personal=True)
+
+
+@router.message(CommandStart(deep_link=True, magic=F.args.regexp(JOIN_PAYLOAD)))
+async def join_by_link(
+    message: Message,
+    command: CommandObject,
+    user: Optional[CachedUser],
+    group_id: Optional[int],
+) -> None:
+    """/start join_<id> - переход по ссылке из inline-поиска"""
+    if not user:
+        await message.answer("Сначала зарегистрируйся: нажми /start.")
+        return
+
+    subject_id = int(JOIN_PAYLOAD.match(command.args).group(1))
+    async with async_session_maker() as session:
+        # Дисциплина чужой группы для пользователя не существует
+        subject = await get_subject(session, subject_id, group_id)
+    if not subject:
+        await message.answer("Предмет не найден.")
+        return
+
+    position = await db_writer.join(user.tg_id, subject_id, user.full_name)
+    name = escape(subject.name)
+    if position is None:
+        text = f"Ты уже в очереди по <b>{name}</b>."
+    else:
+        text = f"Записано! Ты {position}-й в очереди по <b>{name}</b>."
+    await message.answer(text, reply_markup=turn_notification_keyboard(subject_id))
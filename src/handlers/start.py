@@ -1,43 +1,82 @@
+from html import escape
+from typing import Optional
+
 from aiogram import F, Router
 from aiogram.filters import CommandStart
-from aiogram.types import Message
+from aiogram.types import CallbackQuery, Message
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.context import FSMContext
 
 from src.config import settings
-from src.database import async_session_maker
+from src.database.models import DEFAULT_GROUP_ID
+from src.database.session import use_shard
+from src.database.shards import shard_router
+from src.database.writer import db_writer
 from src.database.requests import (
     ensure_admin_roles,
     create_user,
-    get_user_by_tg_id,
+    group_has_users,
 )
+from src.database.user_cache import CachedUser
+from src.keyboards.callbacks import GroupCb
+from src.keyboards.inline import groups_keyboard
 from src.keyboards.reply import main_menu_keyboard
+from .callbacks import callback_table
 
 router = Router()
 
 class Register(StatesGroup):
+    waiting_for_group = State()
     waiting_for_name = State()
 
 @router.message(CommandStart())
-async def cmd_start(message: Message, state: FSMContext) -> None:
-    async with async_session_maker() as session:
-        user = await get_user_by_tg_id(
-            session=session,
-            tg_id=message.from_user.id
+async def cmd_start(
+    message: Message, state: FSMContext, user: Optional[CachedUser], is_admin: bool
+) -> None:
+    if user:
+        await db_writer.submit(lambda session: ensure_admin_roles(session, settings.superadmins))
+        # Роль могла только что повыситься через SUPERADMINS
+        is_admin = is_admin or user.tg_id in settings.superadmins
+        text = (
+            "Привет! Я бот для управления очередью студентов.\n\n"
+            "Используй меню ниже, чтобы выбрать дисциплину и посмотреть свои очереди."
+        )
+        await message.answer(text, reply_markup=main_menu_keyboard(is_admin=is_admin))
+    elif len(shard_router.groups()) > 1:
+        # Групп несколько - сначала выбираем свою
+        await message.answer(
+            "Привет! Давай знакомиться. Из какой ты группы?",
+            reply_markup=groups_keyboard(shard_router.groups()),
         )
-        if user:
-            await ensure_admin_roles(session, settings.superadmins)
-            await session.commit()
-            is_admin = user.role == "admin"
-            text = (
-                "Привет! Я бот для управления очередью студентов.\n\n"
-                "Используй меню ниже, чтобы выбрать дисциплину и посмотреть свои очереди."
-            )
-            await message.answer(text, reply_markup=main_menu_keyboard(is_admin=is_admin))
-        else:
-            # Если юзера нет, просим имя и переходим в состояние ожидания
-            await message.answer("Привет! Давай знакомиться. Введи свои Фамилию и Имя:")
-            await state.set_state(Register.waiting_for_name)
+        await state.set_state(Register.waiting_for_group)
+    else:
+        # Если юзера нет, просим имя и переходим в состояние ожидания
+        await message.answer("Привет! Давай знакомиться. Введи свои Фамилию и Имя:")
+        await state.set_state(Register.waiting_for_name)
+
+
+@callback_table.handler(GroupCb)
+async def choose_group(
+    callback: CallbackQuery,
+    callback_data: GroupCb,
+    state: FSMContext,
+    user: Optional[CachedUser],
+) -> None:
+    if user:
+        await callback.answer("Ты уже зарегистрирован.", show_alert=True)
+        return
+
+    group = shard_router.group(callback_data.group_id)
+    if group is None:
+        await callback.answer("Группа не найдена.", show_alert=True)
+        return
+
+    await state.update_data(group_id=group.id)
+    await state.set_state(Register.waiting_for_name)
+    await callback.message.edit_text(
+        f"Группа <b>{escape(group.name)}</b>. Теперь введи свои Фамилию и Имя:"
+    )
+    await callback.answer()
 
 
 @router.message(Register.waiting_for_name)
@@ -48,18 +87,30 @@ async def process_name(message: Message, state: FSMContext) -> None:
         await message.answer("Имя слишком короткое. Введи имя полностью:")
         return
 
-    async with async_session_maker() as session:
+    group_id = (await state.get_data()).get("group_id", DEFAULT_GROUP_ID)
+    if shard_router.group(group_id) is None:
+        # Группу удалили из справочника, пока человек вводил имя
+        group_id = DEFAULT_GROUP_ID
+
+    async def register(session) -> bool:
+        # Первый зарегистрированный в новой группе становится её старостой
+        first = group_id != DEFAULT_GROUP_ID and not await group_has_users(session, group_id)
         # Создаем пользователя с введенным именем
         user = await create_user(
             session=session,
             tg_id=message.from_user.id,
-            full_name=full_name
+            full_name=full_name,
+            group_id=group_id,
         )
+        if first:
+            user.role = "admin"
+        # ensure_admin_roles меняет тот же объект user, если он в SUPERADMINS
         await ensure_admin_roles(session, settings.superadmins)
-        await session.commit()
-        # Обновляем объект пользователя, чтобы узнать его новую роль
-        await session.refresh(user)
-        is_admin = user.role == "admin"
+        return user.role == "admin"
+
+    # Пользователь записывается в БД своей группы
+    with use_shard(shard_router.shard_for_group(group_id)):
+        is_admin = await db_writer.submit(register)
 
     await state.clear()  # Выключаем состояние ожидания
 
@@ -0,0 +1,72 @@
+from collections import OrderedDict
+from functools import lru_cache, wraps
+from typing import Any, Callable, Hashable, Optional, Tuple, TypeVar
+
+from src.database.subject_cache import subject_catalogue
+
+F = TypeVar("F", bound=Callable)
+
+
+def cached_markup(maxsize: int = 1024) -> Callable[[F], F]:
+    """
+    Кэш готовых клавиатур по аргументам фабрики.
+
+    Клавиатура строится (и проходит валидацию pydantic) один раз,
+    дальше возвращается тот же объект - его нельзя менять после получения.
+    Списки в аргументах превращаются в кортежи, чтобы быть ключом.
+    """
+
+    def decorator(func: F) -> F:
+        cached = lru_cache(maxsize=maxsize)(func)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            args = tuple(tuple(a) if isinstance(a, list) else a for a in args)
+            return cached(*args, **kwargs)
+
+        wrapper.cache_clear = cached.cache_clear
+        wrapper.cache_info = cached.cache_info
+        return wrapper
+
+    return decorator
+
+
+def cached_catalogue_markup(maxsize: int = 256) -> Callable[[F], F]:
+    """
+    Кэш клавиатур со списком дисциплин группы.
+
+    Фабрика func(group_id, page) сама берёт дисциплины из subject_catalogue
+    (он должен быть загружен), поэтому ключ - (subject_catalogue.version,
+    group_id, page), а не сам список: ничего не хэшируется на каждый вызов,
+    и на страницу одна запись. Со сменой версии старые записи выбрасываются;
+    пока справочник не перечитан после сброса, клавиатура не кэшируется.
+    """
+
+    def decorator(func: F) -> F:
+        cache: "OrderedDict[Tuple[int, Optional[int], Hashable], Any]" = OrderedDict()
+        version = subject_catalogue.version
+
+        @wraps(func)
+        def wrapper(group_id: Optional[int], page: Hashable = None):
+            nonlocal version
+            if not subject_catalogue.loaded:
+                # Справочник сбросили после загрузки: в нём данные прошлой
+                # версии, и под новой их запоминать нельзя
+                return func(group_id, page)
+            if version != subject_catalogue.version:
+                cache.clear()
+                version = subject_catalogue.version
+            key = (version, group_id, page)
+            markup = cache.get(key)
+            if markup is None:
+                markup = cache[key] = func(group_id, page)
+                if len(cache) > maxsize:
+                    cache.popitem(last=False)
+            else:
+                cache.move_to_end(key)
+            return markup
+
+        wrapper.cache_clear = cache.clear
+        return wrapper
+
+    return decorator
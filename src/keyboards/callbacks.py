@@ -0,0 +1,74 @@
+from enum import Enum
+from typing import Optional
+
+from aiogram.filters.callback_data import CallbackData
+
+# Данные inline-кнопок. Формат «prefix:поле:поле» совпадает со старыми
+# строками subject:<id> и queue:<действие>:<id>, поэтому кнопки в уже
+# отправленных сообщениях продолжают работать.
+
+
+class QueueAction(str, Enum):
+    JOIN = "join"
+    LEAVE = "leave"
+    CLEAR_ASK = "clear1"
+    CLEAR = "clear2"
+    EXPORT = "export"
+    STATS = "stats"
+
+
+class AdminAction(str, Enum):
+    ADD = "add_disc"
+    EDIT = "edit_disc"
+    DELETE_ASK = "delete_disc"
+    DELETE = "confirm_delete"
+    BACK = "subjects_back"
+
+
+class UserAction(str, Enum):
+    RENAME = "rename"
+    DELETE = "delete"
+
+
+class PageDirection(str, Enum):
+    PREV = "prev"
+    NEXT = "next"
+
+
+class SubjectCb(CallbackData, prefix="subject"):
+    subject_id: int
+
+
+class QueueCb(CallbackData, prefix="queue"):
+    action: QueueAction
+    subject_id: int
+
+
+class AdminCb(CallbackData, prefix="admin"):
+    action: AdminAction
+    subject_id: Optional[int] = None
+
+
+class SubjectsPageCb(CallbackData, prefix="subjects"):
+    direction: PageDirection
+    # Граничная дисциплина текущей страницы
+    boundary: int
+
+
+class UserCb(CallbackData, prefix="user"):
+    action: UserAction
+    user_id: int
+
+
+class UsersPageCb(CallbackData, prefix="users"):
+    direction: PageDirection
+    boundary: int
+
+
+class NotifyCb(CallbackData, prefix="notify"):
+    # За сколько мест уведомлять; 0 - выключить
+    position: int
+
+
+class GroupCb(CallbackData, prefix="group"):
+    group_id: int
@@ -1,34 +1,83 @@
+from typing import List, Optional, Tuple, Type
+
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 
+from src.database.subject_cache import subject_catalogue
+
+from .cache import cached_catalogue_markup, cached_markup
+from .callbacks import (
+    AdminAction,
+    AdminCb,
+    GroupCb,
+    NotifyCb,
+    PageDirection,
+    QueueAction,
+    QueueCb,
+    SubjectCb,
+    SubjectsPageCb,
+    UserAction,
+    UserCb,
+    UsersPageCb,
+)
 
-def subjects_keyboard(subjects: list) -> InlineKeyboardMarkup:
+
+@cached_catalogue_markup()
+def subjects_keyboard(group_id: Optional[int], page: None = None) -> InlineKeyboardMarkup:
+    """Все дисциплины группы одним списком"""
     buttons = [
-        [InlineKeyboardButton(text=disc.name, callback_data=f"subject:{disc.id}")]
-        for disc in subjects
+        [InlineKeyboardButton(text=disc.name, callback_data=SubjectCb(subject_id=disc.id).pack())]
+        for disc in subject_catalogue.all(group_id)
     ]
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
-def admin_change_users_keyboard(users: list) -> InlineKeyboardMarkup:
+def page_nav_row(
+    cb_type: Type[SubjectsPageCb | UsersPageCb],
+    first_id: int,
+    last_id: int,
+    has_prev: bool,
+    has_next: bool,
+) -> Optional[List[InlineKeyboardButton]]:
+    """Кнопки «назад/вперёд»: в callback - id граничного элемента страницы"""
+    row = []
+    if has_prev:
+        data = cb_type(direction=PageDirection.PREV, boundary=first_id)
+        row.append(InlineKeyboardButton(text="◀️", callback_data=data.pack()))
+    if has_next:
+        data = cb_type(direction=PageDirection.NEXT, boundary=last_id)
+        row.append(InlineKeyboardButton(text="▶️", callback_data=data.pack()))
+    return row or None
+
+def admin_change_users_keyboard(
+    users: list, has_prev: bool = False, has_next: bool = False
+) -> InlineKeyboardMarkup:
     buttons = []
-    for idx, user in enumerate(users, start=1):
+    for user in users:
         buttons.append([
-            InlineKeyboardButton(text=f"{idx}. {user.full_name}", callback_data=f"rename:user:{user.tg_id}"),
-            InlineKeyboardButton(text="❌Удалить", callback_data=f"delete:user:{user.tg_id}")
+            InlineKeyboardButton(text=user.full_name, callback_data=UserCb(action=UserAction.RENAME, user_id=user.tg_id).pack()),
+            InlineKeyboardButton(text="❌Удалить", callback_data=UserCb(action=UserAction.DELETE, user_id=user.tg_id).pack())
         ]
         )
+    if users:
+        nav = page_nav_row(UsersPageCb, users[0].tg_id, users[-1].tg_id, has_prev, has_next)
+        if nav:
+            buttons.append(nav)
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
-def available_queues(subjects: list) -> InlineKeyboardMarkup:
+@cached_markup()
+def available_queues(subjects: tuple) -> InlineKeyboardMarkup:
+    """subjects - пары (subject_id, название): без мест, чтобы клавиатура кэшировалась"""
     buttons = [
-        [InlineKeyboardButton(text=disc.name, callback_data=f"subject:{disc.id}")]
-        for disc in subjects
+        [InlineKeyboardButton(text=name, callback_data=SubjectCb(subject_id=subject_id).pack())]
+        for subject_id, name in subjects
     ]
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
+@cached_markup(maxsize=4096)
 def queue_actions_keyboard(
     subject_id: int,
     in_queue: bool,
     is_admin: bool,
+    show_export: bool = False,
 ) -> InlineKeyboardMarkup:
     buttons = []
 
@@ -37,7 +86,7 @@ def queue_actions_keyboard(
             [
                 InlineKeyboardButton(
                     text="Покинуть очередь",
-                    callback_data=f"queue:leave:{subject_id}",
+                    callback_data=QueueCb(action=QueueAction.LEAVE, subject_id=subject_id).pack(),
                 )
             ]
         )
@@ -46,7 +95,17 @@ def queue_actions_keyboard(
             [
                 InlineKeyboardButton(
                     text="Встать в очередь",
-                    callback_data=f"queue:join:{subject_id}",
+                    callback_data=QueueCb(action=QueueAction.JOIN, subject_id=subject_id).pack(),
+                )
+            ]
+        )
+
+    if show_export:
+        buttons.append(
+            [
+                InlineKeyboardButton(
+                    text="📄 Вся очередь файлом",
+                    callback_data=QueueCb(action=QueueAction.EXPORT, subject_id=subject_id).pack(),
                 )
             ]
         )
@@ -56,50 +115,89 @@ def queue_actions_keyboard(
             [
                 InlineKeyboardButton(
                     text="Очистить очередь",
-                    callback_data=f"queue:clear1:{subject_id}",
+                    callback_data=QueueCb(action=QueueAction.CLEAR_ASK, subject_id=subject_id).pack(),
+                )
+            ]
+        )
+        buttons.append(
+            [
+                InlineKeyboardButton(
+                    text="📊 Статистика",
+                    callback_data=QueueCb(action=QueueAction.STATS, subject_id=subject_id).pack(),
                 )
             ]
         )
 
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
+@cached_markup()
 def queue_clear_confirmation_keyboard(subject_id: int)-> InlineKeyboardMarkup:
     buttons = []
     buttons.append([
         InlineKeyboardButton(
             text="❌ Отмена",
-            callback_data=f"subject:{subject_id}",
+            callback_data=SubjectCb(subject_id=subject_id).pack(),
         ),
         InlineKeyboardButton(
             text="✅ Подтвердить",
-            callback_data=f"queue:clear2:{subject_id}",
+            callback_data=QueueCb(action=QueueAction.CLEAR, subject_id=subject_id).pack(),
         ),
     ])
 
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
-def admin_subjects_keyboard(subjects: list) -> InlineKeyboardMarkup:
-    """Клавиатура для админов: список дисциплин с кнопками редактирования и удаления"""
+@cached_markup()
+def queue_stats_keyboard(subject_id: int) -> InlineKeyboardMarkup:
+    """Под статистикой: назад к очереди"""
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            [
+                InlineKeyboardButton(
+                    text="◀️ К очереди",
+                    callback_data=SubjectCb(subject_id=subject_id).pack(),
+                )
+            ]
+        ]
+    )
+
+
+@cached_catalogue_markup()
+def admin_subjects_keyboard(
+    group_id: Optional[int], page: Tuple[int, int] = (0, 0)
+) -> InlineKeyboardMarkup:
+    """
+    Клавиатура для админов: страница дисциплин с кнопками редактирования и удаления.
+    page - границы страницы (start, stop) в subject_catalogue.all(group_id).
+    """
+    catalogue = subject_catalogue.all(group_id)
+    start, stop = page
+    subjects = catalogue[start:stop]
+    has_prev, has_next = start > 0, stop < len(catalogue)
     buttons = []
     for disc in subjects:
         buttons.append(
             [
                 InlineKeyboardButton(
                     text=f"✏️ {disc.name}",
-                    callback_data=f"admin:edit_disc:{disc.id}",
+                    callback_data=AdminCb(action=AdminAction.EDIT, subject_id=disc.id).pack(),
                 ),
                 InlineKeyboardButton(
                     text="❌",
-                    callback_data=f"admin:delete_disc:{disc.id}",
+                    callback_data=AdminCb(action=AdminAction.DELETE_ASK, subject_id=disc.id).pack(),
                 ),
             ]
         )
-    buttons.append([InlineKeyboardButton(text="➕ Добавить дисциплину", callback_data="admin:add_disc")])
-    buttons.append([InlineKeyboardButton(text="◀️ Назад", callback_data="admin:subjects_back")])
+    if subjects:
+        nav = page_nav_row(SubjectsPageCb, subjects[0].id, subjects[-1].id, has_prev, has_next)
+        if nav:
+            buttons.append(nav)
+    buttons.append([InlineKeyboardButton(text="➕ Добавить дисциплину", callback_data=AdminCb(action=AdminAction.ADD).pack())])
+    buttons.append([InlineKeyboardButton(text="◀️ Назад", callback_data=AdminCb(action=AdminAction.BACK).pack())])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
+@cached_markup()
 def confirm_delete_subject_keyboard(subject_id: int) -> InlineKeyboardMarkup:
     """Клавиатура подтверждения удаления дисциплины"""
     return InlineKeyboardMarkup(
@@ -107,13 +205,58 @@ def confirm_delete_subject_keyboard(subject_id: int) -> InlineKeyboardMarkup:
             [
                 InlineKeyboardButton(
                     text="✅ Да, удалить",
-                    callback_data=f"admin:confirm_delete:{subject_id}",
+                    callback_data=AdminCb(action=AdminAction.DELETE, subject_id=subject_id).pack(),
                 ),
                 InlineKeyboardButton(
                     text="❌ Отмена",
-                    callback_data="admin:subjects_back",
+                    callback_data=AdminCb(action=AdminAction.BACK).pack(),
                 ),
             ]
         ]
     )
 
+
+@cached_markup()
+def notify_settings_keyboard(positions: tuple, current: Optional[int]) -> InlineKeyboardMarkup:
+    """Выбор позиции для уведомлений; текущий выбор отмечен"""
+    buttons = []
+    for position in positions:
+        text = "Когда я первый" if position == 1 else f"Когда я {position}-й"
+        if position == current:
+            text = f"✅ {text}"
+        buttons.append([InlineKeyboardButton(text=text, callback_data=NotifyCb(position=position).pack())])
+    off = "✅ Выключить" if current is None else "Выключить"
+    buttons.append([InlineKeyboardButton(text=off, callback_data=NotifyCb(position=0).pack())])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+@cached_markup()
+def turn_notification_keyboard(subject_id: int) -> InlineKeyboardMarkup:
+    """Под уведомлением: открыть очередь"""
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            [
+                InlineKeyboardButton(
+                    text="Открыть очередь",
+                    callback_data=SubjectCb(subject_id=subject_id).pack(),
+                )
+            ]
+        ]
+    )
+
+
+@cached_markup()
+def join_link_keyboard(url: str) -> InlineKeyboardMarkup:
+    """Под результатом inline-поиска: ссылка в бота, которая записывает в очередь"""
+    return InlineKeyboardMarkup(
+        inline_keyboard=[[InlineKeyboardButton(text="Встать в очередь", url=url)]]
+    )
+
+
+@cached_markup()
+def groups_keyboard(groups: tuple) -> InlineKeyboardMarkup:
+    buttons = [
+        [InlineKeyboardButton(text=group.name, callback_data=GroupCb(group_id=group.id).pack())]
+        for group in groups
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
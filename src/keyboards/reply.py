@@ -1,12 +1,16 @@
 from aiogram.types import KeyboardButton, ReplyKeyboardMarkup
 
+from .cache import cached_markup
 
+
+@cached_markup(maxsize=4)
 def main_menu_keyboard(is_admin: bool = False) -> ReplyKeyboardMarkup:
     keyboard = [
         [
             KeyboardButton(text="Выбрать дисциплину"),
             KeyboardButton(text="Мои очереди"),
         ],
+        [KeyboardButton(text="🔔 Уведомления")],
     ]
     if is_admin:
         keyboard.append([KeyboardButton(text="⚙️ Управление дисциплинами")])
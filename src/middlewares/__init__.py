@@ -0,0 +1,5 @@
+from .callback_data import CallbackDataMiddleware  # noqa: F401
+from .metrics import HandlerNameMiddleware, MetricsMiddleware  # noqa: F401
+from .query_budget import QueryBudgetMiddleware  # noqa: F401
+from .user import UserMiddleware  # noqa: F401
+from .shard import ShardMiddleware  # noqa: F401
@@ -0,0 +1,34 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from src.handlers.callbacks import CallbackTable
+
+
+class CallbackDataMiddleware(BaseMiddleware):
+    """
+    Разбирает данные inline-кнопки по таблице CallbackTable.
+    Регистрируется раньше UserMiddleware: нераспознанная кнопка получает
+    ответ сразу, до похода за пользователем в БД.
+    """
+
+    def __init__(self, table: CallbackTable) -> None:
+        self.table = table
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        callback = event.callback_query if isinstance(event, Update) else None
+        if callback is None:
+            return await handler(event, data)
+
+        route = self.table.decode(callback.data)
+        if route is None:
+            await callback.answer("Кнопка устарела, открой меню заново.", show_alert=True)
+            return None
+        data["callback_route"] = route
+        return await handler(event, data)
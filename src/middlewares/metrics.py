@@ -0,0 +1,68 @@
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from src.services.metrics import UpdateMetrics, collect_update, current_update, observe_update
+
+
+def handler_name(data: Dict[str, Any]) -> str:
+    """Имя хэндлера вида «queue.join_queue» для метки метрик"""
+    # Для inline-кнопок data["handler"] - общий диспетчер таблицы
+    route = data.get("callback_route")
+    callback = route[1].callback if route else data["handler"].callback
+    return f"{callback.__module__.rsplit('.', 1)[-1]}.{callback.__name__}"
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """
+    Время обработки апдейта, время и число запросов к БД и к Telegram.
+    Регистрируется первым outer-middleware, чтобы учитывать и остальные.
+    Метки: хэндлер (его имя проставляет HandlerNameMiddleware) и префикс
+    кнопки - для сообщений это тип апдейта.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if not isinstance(event, Update):
+            return await handler(event, data)
+
+        metrics = UpdateMetrics(prefix=event.event_type)
+        failed = False
+        started = time.perf_counter()
+        with collect_update(metrics):
+            try:
+                return await handler(event, data)
+            except Exception:
+                failed = True
+                raise
+            finally:
+                if event.callback_query is not None:
+                    # callback_route кладёт CallbackDataMiddleware в тот же data
+                    route = data.get("callback_route")
+                    if route is None:
+                        # Префикс нераспознанной кнопки в метку не берём
+                        metrics.handler, metrics.prefix = "stale_callback", "invalid"
+                    else:
+                        metrics.prefix = route[0].__prefix__
+                observe_update(metrics, time.perf_counter() - started, failed)
+
+
+class HandlerNameMiddleware(BaseMiddleware):
+    """Inner-middleware: запоминает, какой хэндлер обработал апдейт"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        metrics = current_update()
+        if metrics is not None:
+            metrics.handler = handler_name(data)
+        return await handler(event, data)
@@ -0,0 +1,68 @@
+import logging
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from src.database.query_stats import QueryBudgetExceeded
+from src.services.metrics import UpdateMetrics, collect_update, current_update
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetMiddleware(BaseMiddleware):
+    """
+    Проверка запросов к БД на апдейт - для отладки и тестов.
+
+    Каждый запрос апдейта (в том числе выполненный писателем БД по его
+    просьбе) получает отпечаток. После обработки проверяется, что хэндлер
+    уложился в свой бюджет (budgets, иначе default_budget), не повторил один
+    и тот же запрос repeat_limit раз (признак N+1) и не подгружал связи
+    отдельными запросами. Нарушения пишутся в лог, а в строгом режиме
+    апдейт падает с QueryBudgetExceeded.
+    """
+
+    def __init__(
+        self,
+        default_budget: int,
+        budgets: Dict[str, int],
+        repeat_limit: int,
+        strict: bool,
+    ) -> None:
+        self.default_budget = default_budget
+        self.budgets = budgets
+        self.repeat_limit = repeat_limit
+        self.strict = strict
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        metrics = current_update()
+        if metrics is not None:
+            # Метрики включены - считаем в тот же счётчик
+            return await self._checked(handler, event, data, metrics)
+        with collect_update(UpdateMetrics()) as metrics:
+            return await self._checked(handler, event, data, metrics)
+
+    async def _checked(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+        metrics: UpdateMetrics,
+    ) -> Any:
+        metrics.db.statements = Counter()
+        result = await handler(event, data)
+
+        budget = self.budgets.get(metrics.handler, self.default_budget)
+        problems = metrics.db.problems(budget, self.repeat_limit)
+        if problems:
+            message = f"{metrics.handler}: " + "; ".join(problems)
+            if self.strict:
+                raise QueryBudgetExceeded(message)
+            logger.warning("Бюджет запросов: %s", message)
+        return result
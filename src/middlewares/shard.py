@@ -0,0 +1,27 @@
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, User as TgUser
+
+from src.database.session import use_shard
+from src.database.shards import shard_router
+
+
+class ShardMiddleware(BaseMiddleware):
+    """
+    Выбирает БД группы пользователя на весь апдейт: дальше
+    async_session_maker и db_writer работают с её файлом (см. shards.py).
+    Группа известна из памяти, в БД за ней не ходим.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        tg_user: Optional[TgUser] = data.get("event_from_user")
+        if tg_user is None:
+            return await handler(event, data)
+        with use_shard(shard_router.shard_for_user(tg_user.id)):
+            return await handler(event, data)
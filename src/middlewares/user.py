@@ -0,0 +1,27 @@
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, User as TgUser
+
+from src.database.user_cache import user_cache
+
+
+class UserMiddleware(BaseMiddleware):
+    """
+    Подставляет в хэндлеры пользователя из БД, его роль и группу:
+    user (CachedUser или None), is_admin и group_id (None - не зарегистрирован).
+    Пользователь берётся из кэша, в БД идём только при промахе.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        tg_user: Optional[TgUser] = data.get("event_from_user")
+        user = await user_cache.get(tg_user.id) if tg_user else None
+        data["user"] = user
+        data["is_admin"] = user.is_admin if user else False
+        data["group_id"] = user.group_id if user else None
+        return await handler(event, data)
@@ -0,0 +1,3 @@
+from .live_views import live_views  # noqa: F401
+from .outbound import outbound  # noqa: F401
+from .turn_notifier import turn_notifier  # noqa: F401
@@ -0,0 +1,256 @@
+import codecs
+import csv
+import json
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, AsyncGenerator, AsyncIterable, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.types.input_file import InputFile
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import settings
+from src.database.models import DEFAULT_GROUP_ID, normalize_subject_name
+from src.database.requests import ensure_admin_roles, import_users_and_subjects, stream_backup
+from src.database.session import current_shard
+from src.database.shards import shard_router
+from src.database.writer import db_writer
+
+# Telegram отдаёт боту файлы не больше 20 МБ
+MAX_FILE_SIZE = 20 * 1024 * 1024
+# Сколько ошибок показать админу
+MAX_ERRORS = 10
+ROLES = ("student", "admin")
+
+Record = Dict[str, Any]
+
+
+class BulkFormatError(ValueError):
+    """Файл импорта нельзя разобрать целиком (формат, заголовок)"""
+
+
+@dataclass
+class ImportBatch:
+    """Проверенные строки файла, готовые к записи"""
+
+    # tg_id -> (tg_id, имя, роль); при повторе в файле побеждает последняя строка
+    users: Dict[int, Tuple[int, str, str]] = field(default_factory=dict)
+    # Нормализованное название -> название
+    subjects: Dict[str, str] = field(default_factory=dict)
+    rows: int = 0
+    skipped: int = 0
+    errors: List[str] = field(default_factory=list)
+    error_count: int = 0
+
+    def error(self, line: int, text: str) -> None:
+        self.error_count += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(f"строка {line}: {text}")
+
+
+async def download_chunks(bot: Bot, file_id: str) -> AsyncIterator[bytes]:
+    """Файл из Telegram кусками, без загрузки целиком в память"""
+    file = await bot.get_file(file_id)
+    url = bot.session.api.file_url(bot.token, file.file_path)
+    async for chunk in bot.session.stream_content(url, chunk_size=64 * 1024):
+        yield chunk
+
+
+async def iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[Tuple[int, str]]:
+    """Строки (номер, текст) из потока байтов UTF-8, BOM от Excel отбрасывается"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    tail = ""
+    number = 0
+    async for chunk in chunks:
+        *lines, tail = (tail + decoder.decode(chunk)).split("\n")
+        for line in lines:
+            number += 1
+            yield number, line.rstrip("\r")
+    tail += decoder.decode(b"", final=True)
+    if tail.strip():
+        yield number + 1, tail.rstrip("\r")
+
+
+class _PendingLines:
+    """
+    Строки для одного csv.reader на весь файл. Файл приходит потоком, поэтому
+    строки подкладываются по мере чтения, а reader просит следующую запись,
+    только когда она целиком здесь (кавычки закрыты).
+    """
+
+    def __init__(self) -> None:
+        self._lines: Deque[str] = deque()
+
+    def append(self, line: str) -> None:
+        self._lines.append(line)
+
+    def __iter__(self) -> "_PendingLines":
+        return self
+
+    def __next__(self) -> str:
+        if not self._lines:
+            raise StopIteration
+        return self._lines.popleft()
+
+
+async def iter_records(chunks: AsyncIterable[bytes], filename: str) -> AsyncIterator[Tuple[int, Record]]:
+    """
+    Записи файла импорта: CSV с заголовком (разделитель «,» или «;»)
+    или JSON Lines - по объекту на строку.
+    """
+    name = filename.lower()
+    if name.endswith(".csv"):
+        header: Optional[List[str]] = None
+        lines = _PendingLines()
+        reader = None
+        # Строка файла, с которой началась текущая запись, и открыта ли кавычка:
+        # поле в кавычках может продолжаться на следующих строках
+        start: Optional[int] = None
+        quoted = False
+        async for number, line in iter_lines(chunks):
+            if start is None:
+                if not line.strip():
+                    continue
+                start = number
+            lines.append(line + "\n")
+            if line.count('"') % 2:
+                quoted = not quoted
+            if quoted:
+                continue
+            if reader is None:
+                # Excel в русской локали сохраняет CSV через «;»
+                delimiter = ";" if line.count(";") > line.count(",") else ","
+                reader = csv.reader(lines, delimiter=delimiter)
+            values = next(reader)
+            record_start, start = start, None
+            if header is None:
+                header = [column.strip().lower() for column in values]
+                if "tg_id" not in header and "name" not in header:
+                    raise BulkFormatError(
+                        "в первой строке нужен заголовок: tg_id,full_name,role или name"
+                    )
+                continue
+            yield record_start, dict(zip(header, values))
+        if start is not None and reader is not None:
+            # Кавычку так и не закрыли - отдаём запись как есть, до конца файла
+            yield start, dict(zip(header or [], next(reader, [])))
+    elif name.endswith((".jsonl", ".ndjson", ".json")):
+        async for number, line in iter_lines(chunks):
+            if not line.strip():
+                continue
+            if number == 1 and line.lstrip().startswith("["):
+                raise BulkFormatError("нужен JSON Lines: по одному объекту на строку, без общего массива")
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                record = None
+            yield number, record if isinstance(record, dict) else {"type": "?"}
+    else:
+        raise BulkFormatError("поддерживаются файлы .csv и .jsonl")
+
+
+def _kind(record: Record) -> str:
+    kind = str(record.get("type") or "").strip().lower()
+    if kind:
+        return kind
+    if record.get("tg_id") not in (None, ""):
+        return "user"
+    if record.get("name") not in (None, ""):
+        return "subject"
+    return "?"
+
+
+async def parse_import(chunks: AsyncIterable[bytes], filename: str) -> ImportBatch:
+    """
+    Разобрать и проверить файл потоком. В памяти остаются только
+    проверенные строки - сам файл целиком не читается.
+    """
+    batch = ImportBatch()
+    async for number, record in iter_records(chunks, filename):
+        batch.rows += 1
+        kind = _kind(record)
+        if kind == "user":
+            try:
+                tg_id = int(str(record.get("tg_id", "")).strip())
+            except ValueError:
+                batch.error(number, "tg_id должен быть числом")
+                continue
+            full_name = " ".join(str(record.get("full_name") or "").split())
+            role = str(record.get("role") or "student").strip().lower()
+            if tg_id <= 0:
+                batch.error(number, "tg_id должен быть положительным")
+            elif not 2 <= len(full_name) <= 100:
+                batch.error(number, "имя должно быть от 2 до 100 символов")
+            elif role not in ROLES:
+                batch.error(number, f"роль должна быть одной из: {', '.join(ROLES)}")
+            else:
+                batch.users[tg_id] = (tg_id, full_name, role)
+        elif kind == "subject":
+            subject_name = str(record.get("name") or "").strip()
+            if not 1 <= len(subject_name) <= 100:
+                batch.error(number, "название дисциплины должно быть от 1 до 100 символов")
+            else:
+                batch.subjects.setdefault(normalize_subject_name(subject_name), subject_name)
+        elif kind == "queue":
+            # Записи очередей есть в выгрузке, но обратно не загружаются
+            batch.skipped += 1
+        else:
+            batch.error(number, "не понять, пользователь это или дисциплина")
+    return batch
+
+
+def foreign_users(batch: ImportBatch, group_id: int) -> List[int]:
+    """tg_id из файла, которые уже зарегистрированы в другой группе"""
+    return [
+        tg_id for tg_id in batch.users
+        if shard_router.group_of(tg_id) not in (None, group_id)
+    ]
+
+
+async def run_import(batch: ImportBatch, group_id: int = DEFAULT_GROUP_ID) -> Tuple[int, int]:
+    """Записать проверенные строки в группу одной транзакцией писателя её БД"""
+
+    async def operation(session: AsyncSession) -> Tuple[int, int]:
+        result = await import_users_and_subjects(
+            session,
+            list(batch.users.values()),
+            list(batch.subjects.values()),
+            chunk_size=settings.bulk_chunk_size,
+            group_id=group_id,
+        )
+        # Импорт не должен отнимать права у суперадминов
+        await ensure_admin_roles(session, settings.superadmins)
+        return result
+
+    return await db_writer.submit(operation)
+
+
+class BackupDocument(InputFile):
+    """
+    Выгрузка пользователей, дисциплин и очередей группы в JSON Lines.
+    Строки читаются из БД потоком и отдаются кусками по мере отправки.
+    Файл подходит для обратной загрузки через импорт.
+    """
+
+    def __init__(self, group_id: Optional[int] = None) -> None:
+        super().__init__(filename=f"suai_queue_{datetime.now():%Y%m%d_%H%M}.jsonl")
+        self.group_id = group_id
+        # Файл читается при отправке, возможно уже не в контексте апдейта
+        self.shard = current_shard()
+
+    async def read(self, bot: Bot) -> AsyncGenerator[bytes, None]:
+        chunk: List[str] = []
+        size = 0
+        async with self.shard.session_maker() as session:
+            async for record in stream_backup(session, group_id=self.group_id):
+                if "joined_at" in record:
+                    record["joined_at"] = record["joined_at"].isoformat()
+                line = json.dumps(record, ensure_ascii=False) + "\n"
+                chunk.append(line)
+                size += len(line)
+                if size >= self.chunk_size:
+                    yield "".join(chunk).encode()
+                    chunk, size = [], 0
+        if chunk:
+            yield "".join(chunk).encode()
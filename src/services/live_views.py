@@ -0,0 +1,275 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramRetryAfter,
+)
+from aiogram.types import InlineKeyboardMarkup, Message
+
+from src.config import settings
+from src.database import async_session_maker, queue_engine, subject_catalogue
+from src.database.subject_cache import CachedSubject
+
+from .outbound import Lane, outbound
+from .queue_view import render_queue
+
+logger = logging.getLogger(__name__)
+
+# (chat_id, message_id)
+ViewKey = Tuple[int, int]
+
+
+@dataclass
+class LiveView:
+    """Открытое сообщение с очередью и то, что в нём сейчас показано"""
+
+    subject_id: int
+    viewer_id: Optional[int]
+    is_admin: bool
+    touched_at: float
+    text: Optional[str] = None
+    markup: Optional[InlineKeyboardMarkup] = None
+
+
+def _is_not_modified(error: TelegramBadRequest) -> bool:
+    return "message is not modified" in error.message
+
+
+class LiveViews:
+    """
+    «Живые» сообщения с очередью.
+
+    Каждое сообщение, в котором показана очередь, запоминается, и после
+    изменения очереди (подписка на queue_engine) фоновая задача
+    перерисовывает его:
+
+    - правки склеиваются: сообщение помечается «грязным» не чаще раза
+      за debounce секунд, а текст строится в момент отправки - уходит
+      только последнее состояние;
+    - если текст и клавиатура не поменялись, запроса к Telegram нет;
+    - в один чат - не чаще раза в chat_interval секунд; общий лимит
+      Telegram соблюдает outbound, где фоновые правки идут после
+      ответов пользователям;
+    - в каждом чате живым остаётся только последнее сообщение
+      по дисциплине, а всего по дисциплине - не больше max_per_subject
+      (самые старые забываются), и не дольше ttl секунд с последнего
+      нажатия.
+    """
+
+    def __init__(
+        self,
+        debounce: float,
+        max_per_subject: int,
+        ttl: float,
+        chat_interval: float,
+    ) -> None:
+        self.debounce = debounce
+        self.max_per_subject = max_per_subject
+        self.ttl = ttl
+        self.chat_interval = chat_interval
+
+        self._views: Dict[ViewKey, LiveView] = {}
+        # subject_id -> chat_id -> сообщение (от старых к новым)
+        self._by_subject: Dict[int, "OrderedDict[int, ViewKey]"] = {}
+        # сообщение -> когда его можно перерисовать
+        self._dirty: "OrderedDict[ViewKey, float]" = OrderedDict()
+        # chat_id -> когда в этот чат можно снова писать
+        self._chat_ready: Dict[int, float] = {}
+
+        self._wakeup = asyncio.Event()
+        self._bot: Optional[Bot] = None
+        self._task: Optional[asyncio.Task] = None
+
+        queue_engine.subscribe(self._on_change)
+
+    def start(self, bot: Bot) -> None:
+        self._bot = bot
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run_forever())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def show(
+        self,
+        message: Message,
+        subject: CachedSubject,
+        viewer_id: Optional[int],
+        is_admin: bool,
+    ) -> None:
+        """Показать очередь в сообщении и дальше держать его актуальным"""
+        key = (message.chat.id, message.message_id)
+        view = self._track(key, subject.id, viewer_id, is_admin)
+        # Сейчас покажем актуальное состояние - фоновая правка не нужна
+        self._dirty.pop(key, None)
+
+        text, markup = render_queue(subject, viewer_id, is_admin)
+        if text == view.text and markup == view.markup:
+            return
+
+        try:
+            await message.edit_text(text, reply_markup=markup)
+        except TelegramBadRequest as e:
+            if not _is_not_modified(e):
+                raise
+        view.text, view.markup = text, markup
+        self._chat_ready[key[0]] = time.monotonic() + self.chat_interval
+
+    def untrack(self, message: Message) -> None:
+        """Сообщение больше не показывает очередь (например, его заменили)"""
+        self._forget((message.chat.id, message.message_id))
+
+    # --- учёт сообщений ---
+
+    def _track(
+        self, key: ViewKey, subject_id: int, viewer_id: Optional[int], is_admin: bool
+    ) -> LiveView:
+        chat_id = key[0]
+        view = self._views.get(key)
+        if view is not None and view.subject_id != subject_id:
+            self._forget(key)
+            view = None
+
+        chats = self._by_subject.setdefault(subject_id, OrderedDict())
+        if view is None:
+            previous = chats.get(chat_id)
+            if previous is not None:
+                # Старое сообщение в этом же чате больше не обновляем
+                self._forget(previous)
+                chats = self._by_subject.setdefault(subject_id, OrderedDict())
+            view = LiveView(subject_id, viewer_id, is_admin, time.monotonic())
+            self._views[key] = view
+            chats[chat_id] = key
+            while len(chats) > self.max_per_subject:
+                _, oldest = next(iter(chats.items()))
+                self._forget(oldest)
+        else:
+            chats.move_to_end(chat_id)
+
+        view.viewer_id = viewer_id
+        view.is_admin = is_admin
+        view.touched_at = time.monotonic()
+        return view
+
+    def _forget(self, key: ViewKey) -> None:
+        view = self._views.pop(key, None)
+        self._dirty.pop(key, None)
+        if view is None:
+            return
+        chats = self._by_subject.get(view.subject_id)
+        if chats is not None and chats.get(key[0]) == key:
+            del chats[key[0]]
+            if not chats:
+                del self._by_subject[view.subject_id]
+
+    def _on_change(self, subject_id: int) -> None:
+        chats = self._by_subject.get(subject_id)
+        if not chats:
+            return
+        now = time.monotonic()
+        for key in list(chats.values()):
+            if self._views[key].touched_at + self.ttl < now:
+                self._forget(key)
+            elif key not in self._dirty:
+                # Уже «грязные» не откладываем - иначе при постоянном
+                # потоке изменений сообщение не обновилось бы никогда
+                self._dirty[key] = now + self.debounce
+        self._wakeup.set()
+
+    # --- фоновая перерисовка ---
+
+    def _next_ready(self, now: float) -> Tuple[Optional[ViewKey], Optional[float]]:
+        """Сообщение, которое можно править прямо сейчас, или время, когда появится"""
+        wake_at = None
+        for key, ready_at in self._dirty.items():
+            ready_at = max(ready_at, self._chat_ready.get(key[0], 0.0))
+            if ready_at <= now:
+                return key, None
+            if wake_at is None or ready_at < wake_at:
+                wake_at = ready_at
+        return None, wake_at
+
+    async def _run_forever(self) -> None:
+        outbound.set_lane(Lane.LIVE)
+        while True:
+            now = time.monotonic()
+            key, wake_at = self._next_ready(now)
+            if key is None:
+                self._wakeup.clear()
+                timeout = None if wake_at is None else wake_at - now
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            del self._dirty[key]
+            view = self._views.get(key)
+            if view is not None:
+                await self._refresh(key, view)
+
+    async def _refresh(self, key: ViewKey, view: LiveView) -> None:
+        chat_id, message_id = key
+        subject = await self._get_subject(view.subject_id)
+        if subject is None:
+            # Дисциплину удалили
+            self._forget(key)
+            return
+
+        text, markup = render_queue(subject, view.viewer_id, view.is_admin)
+        if text == view.text and markup == view.markup:
+            return
+
+        self._chat_ready[chat_id] = time.monotonic() + self.chat_interval
+        try:
+            await self._bot.edit_message_text(
+                text=text,
+                chat_id=chat_id,
+                message_id=message_id,
+                reply_markup=markup,
+            )
+        except TelegramRetryAfter as e:
+            # Чат уже на паузе в outbound - просто вернёмся к сообщению позже
+            self._dirty[key] = time.monotonic() + e.retry_after
+            return
+        except TelegramBadRequest as e:
+            if not _is_not_modified(e):
+                # Сообщение удалили или его больше нельзя редактировать
+                self._forget(key)
+                return
+        except TelegramForbiddenError:
+            self._forget(key)
+            return
+        except Exception:
+            logger.exception("Не удалось обновить очередь в чате %s", chat_id)
+            return
+        view.text, view.markup = text, markup
+
+    @staticmethod
+    async def _get_subject(subject_id: int) -> Optional[CachedSubject]:
+        if not subject_catalogue.loaded:
+            async with async_session_maker() as session:
+                await subject_catalogue.ensure_loaded(session)
+        return subject_catalogue.get(subject_id)
+
+
+live_views = LiveViews(
+    debounce=settings.live_view_debounce_ms / 1000,
+    max_per_subject=settings.live_view_max_per_subject,
+    ttl=settings.live_view_ttl,
+    chat_interval=settings.live_view_chat_interval,
+)
@@ -0,0 +1,247 @@
+import bisect
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiohttp import web
+
+from src.database.query_stats import QueryStats, collect_queries, query_observers
+
+if TYPE_CHECKING:
+    from aiogram import Bot
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+
+    def _label_text(self, values: LabelValues, extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *values: str, amount: float = 1.0) -> None:
+        self._values[values] = self._values.get(values, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for values, total in sorted(self._values.items()):
+            lines.append(f"{self.name}{self._label_text(values)} {total:g}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        # Для каждого набора меток: счётчики по корзинам (последняя - +Inf) и сумма
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, *values: str) -> None:
+        counts = self._counts.get(values)
+        if counts is None:
+            counts = self._counts[values] = [0] * (len(self.buckets) + 1)
+            self._sums[values] = 0.0
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._sums[values] += value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for values, counts in sorted(self._counts.items()):
+            cumulative = 0
+            bounds = [f"{bound:g}" for bound in self.buckets] + ["+Inf"]
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                le = self._label_text(values, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_text(values)} {self._sums[values]:g}")
+            lines.append(f"{self.name}_count{self._label_text(values)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: "_Metric") -> "_Metric":
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+UPDATE_LABELS = ("handler", "prefix")
+
+update_seconds = registry.register(
+    Histogram("bot_update_seconds", "Полное время обработки апдейта", UPDATE_LABELS)
+)
+update_db_seconds = registry.register(
+    Histogram("bot_update_db_seconds", "Время запросов к БД за апдейт", UPDATE_LABELS)
+)
+update_db_queries = registry.register(
+    Histogram("bot_update_db_queries", "Запросов к БД за апдейт", UPDATE_LABELS, COUNT_BUCKETS)
+)
+update_api_seconds = registry.register(
+    Histogram("bot_update_api_seconds", "Время запросов к Telegram за апдейт", UPDATE_LABELS)
+)
+update_errors = registry.register(
+    Counter("bot_update_errors_total", "Апдейты, упавшие с исключением", UPDATE_LABELS)
+)
+db_query_seconds = registry.register(
+    Histogram("bot_db_query_seconds", "Время одного запроса к БД (включая фоновые задачи)")
+)
+api_request_seconds = registry.register(
+    Histogram("bot_api_request_seconds", "Время одного запроса к Telegram", ("method",))
+)
+api_errors = registry.register(
+    Counter("bot_api_errors_total", "Запросы к Telegram, закончившиеся ошибкой", ("method",))
+)
+
+
+@dataclass
+class UpdateMetrics:
+    """Что потратил один апдейт; собирается, пока он обрабатывается"""
+
+    handler: str = "unhandled"
+    prefix: str = ""
+    db: QueryStats = field(default_factory=QueryStats)
+    api_seconds: float = 0.0
+    api_calls: int = 0
+
+
+_current_update: ContextVar[Optional[UpdateMetrics]] = ContextVar("update_metrics", default=None)
+
+
+def current_update() -> Optional[UpdateMetrics]:
+    return _current_update.get()
+
+
+@contextmanager
+def collect_update(metrics: UpdateMetrics) -> Iterator[UpdateMetrics]:
+    """Запросы к БД и Telegram внутри блока засчитываются в metrics"""
+    token = _current_update.set(metrics)
+    try:
+        with collect_queries(metrics.db):
+            yield metrics
+    finally:
+        _current_update.reset(token)
+
+
+def observe_update(metrics: UpdateMetrics, seconds: float, failed: bool) -> None:
+    labels = (metrics.handler, metrics.prefix)
+    update_seconds.observe(seconds, *labels)
+    update_db_seconds.observe(metrics.db.seconds, *labels)
+    update_db_queries.observe(metrics.db.queries, *labels)
+    update_api_seconds.observe(metrics.api_seconds, *labels)
+    if failed:
+        update_errors.inc(*labels)
+
+
+# Каждый запрос к БД - в общую гистограмму, в том числе из фоновых задач
+query_observers.append(db_query_seconds.observe)
+
+
+class ApiTimer(BaseRequestMiddleware):
+    """
+    Время запросов к Telegram. Подключается к сессии бота после outbound,
+    поэтому считается сам запрос, без ожидания лимитов.
+    """
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: "Bot",
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception:
+            api_errors.inc(type(method).__name__)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            api_request_seconds.observe(elapsed, type(method).__name__)
+            metrics = _current_update.get()
+            if metrics is not None:
+                metrics.api_seconds += elapsed
+                metrics.api_calls += 1
+
+
+api_timer = ApiTimer()
+
+
+class MetricsServer:
+    """Локальный HTTP-сервер: GET /metrics в текстовом формате Prometheus"""
+
+    def __init__(self, host: str, port: int) -> None:
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info("Метрики: http://%s:%s/metrics", self.host, self.port)
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
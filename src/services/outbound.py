@@ -0,0 +1,169 @@
+import asyncio
+import heapq
+import itertools
+import logging
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple, Union
+
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import AnswerCallbackQuery, Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+from src.config import settings
+
+from .rate_limit import TokenBucket
+
+if TYPE_CHECKING:
+    from aiogram import Bot
+
+logger = logging.getLogger(__name__)
+
+
+class Lane(IntEnum):
+    """Полоса исходящих запросов: чем меньше значение, тем раньше уходит"""
+
+    INTERACTIVE = 0  # ответы на нажатия и сообщения пользователей
+    LIVE = 1  # фоновые правки «живых» очередей
+    BULK = 2  # массовые уведомления
+
+
+_current_lane: ContextVar[Lane] = ContextVar("outbound_lane", default=Lane.INTERACTIVE)
+
+
+class OutboundScheduler(BaseRequestMiddleware):
+    """
+    Планировщик всех исходящих запросов к Telegram.
+
+    Подключается к сессии бота (bot.session.middleware), поэтому через него
+    проходят все send/edit/answer из хэндлеров без изменений в их коде.
+
+    - общий лимит - корзина токенов на global_rate запросов в секунду;
+      ждущие запросы получают токены по приоритету полосы, внутри
+      полосы - по очереди;
+    - на каждый чат - своя корзина (в группах Telegram разрешает меньше);
+      ответы на callback сообщениями не считаются и лимит чата не тратят;
+    - на TelegramRetryAfter корзина чата (или общая, если чата нет)
+      ставится на паузу, а запрос повторяется - сколько раз, зависит от
+      полосы. Фоновые правки не повторяются: живые очереди сами
+      перепланируют сообщение.
+
+    Полоса берётся из контекста: with outbound.lane(Lane.BULK): ...
+    """
+
+    def __init__(
+        self,
+        global_rate: float,
+        chat_rate: float,
+        chat_burst: float,
+        group_rate: float,
+        max_retry_after: float,
+        max_chats: int = 10000,
+    ) -> None:
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.max_retry_after = max_retry_after
+        self.max_chats = max_chats
+        self.retries: Dict[Lane, int] = {Lane.INTERACTIVE: 1, Lane.LIVE: 0, Lane.BULK: 5}
+
+        self._global = TokenBucket(global_rate)
+        self._chats: "OrderedDict[Union[int, str], TokenBucket]" = OrderedDict()
+        self._waiting: List[Tuple[int, int]] = []
+        self._seq = itertools.count()
+        self._cond: Optional[asyncio.Condition] = None
+
+    @contextmanager
+    def lane(self, lane: Lane) -> Iterator[None]:
+        token = _current_lane.set(lane)
+        try:
+            yield
+        finally:
+            _current_lane.reset(token)
+
+    @staticmethod
+    def set_lane(lane: Lane) -> None:
+        """Задать полосу до конца текущей задачи (для фоновых воркеров)"""
+        _current_lane.set(lane)
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: "Bot",
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        lane = _current_lane.get()
+        chat_id = None
+        if isinstance(method, AnswerCallbackQuery):
+            lane = Lane.INTERACTIVE
+        else:
+            chat_id = getattr(method, "chat_id", None)
+
+        attempt = 0
+        while True:
+            if chat_id is not None:
+                await self._chat_bucket(chat_id).acquire()
+            await self._acquire_global(lane)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                bucket = self._chat_bucket(chat_id) if chat_id is not None else self._global
+                bucket.pause(e.retry_after)
+                attempt += 1
+                if attempt > self.retries[lane] or e.retry_after > self.max_retry_after:
+                    raise
+                logger.warning(
+                    "Flood control: %s, повтор через %s с", type(method).__name__, e.retry_after
+                )
+
+    def _chat_bucket(self, chat_id: Union[int, str]) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            rate = self.group_rate if is_group else self.chat_rate
+            bucket = self._chats[chat_id] = TokenBucket(rate, capacity=self.chat_burst)
+            while len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        return bucket
+
+    async def _acquire_global(self, lane: Lane) -> None:
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        ticket = (int(lane), next(self._seq))
+
+        async with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            # Возможно, пришедший обгоняет текущего первого - пусть тот перепроверит
+            self._cond.notify_all()
+            try:
+                while True:
+                    if self._waiting[0] == ticket:
+                        if self._global.try_acquire():
+                            return
+                        try:
+                            await asyncio.wait_for(self._cond.wait(), self._global.delay())
+                        except asyncio.TimeoutError:
+                            pass
+                    else:
+                        await self._cond.wait()
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+
+
+outbound = OutboundScheduler(
+    global_rate=settings.outbound_global_rate,
+    chat_rate=settings.outbound_chat_rate,
+    chat_burst=settings.outbound_chat_burst,
+    group_rate=settings.outbound_group_rate,
+    max_retry_after=settings.outbound_max_retry_after,
+)
@@ -0,0 +1,152 @@
+from dataclasses import dataclass
+from html import escape
+from typing import AsyncGenerator, Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.types import InlineKeyboardMarkup
+from aiogram.types.input_file import InputFile
+
+from src.config import settings
+from src.database import queue_engine
+from src.database.queue_engine import QueueEntry
+from src.database.subject_cache import CachedSubject
+from src.keyboards.inline import queue_actions_keyboard
+
+# Лимит Telegram на длину сообщения
+MESSAGE_LIMIT = 4096
+# Длинные имена в списке обрезаются, полные - в выгрузке
+NAME_LIMIT = 64
+
+
+@dataclass(frozen=True)
+class _RenderedQueue:
+    """Готовые строки очереди для одной версии"""
+
+    version: int
+    subject_name: str
+    lines: Tuple[str, ...]
+    size: int
+
+
+class QueueRenderer:
+    """
+    Текст сообщения с очередью.
+
+    Строки «N. Имя» строятся один раз на версию очереди (queue_engine.version)
+    и кэшируются, так что показ очереди десяткам зрителей не пересобирает
+    список. Для зрителя его строка выделяется, а длинная очередь
+    показывается окном: первые head человек и radius человек вокруг
+    зрителя - так сообщение всегда укладывается в лимит Telegram. Полная
+    очередь доступна выгрузкой в файл (QueueDocument).
+    """
+
+    def __init__(self, max_lines: int, head: int, radius: int) -> None:
+        self.max_lines = max_lines
+        self.head = head
+        self.radius = radius
+        self._cache: Dict[int, _RenderedQueue] = {}
+
+    def _rendered(self, subject: CachedSubject) -> _RenderedQueue:
+        version = queue_engine.version(subject.id)
+        cached = self._cache.get(subject.id)
+        if cached is not None and cached.version == version and cached.subject_name == subject.name:
+            return cached
+
+        lines = tuple(
+            f"{idx}. {escape(_shorten(entry.full_name))}"
+            for idx, entry in enumerate(queue_engine.entries(subject.id), start=1)
+        )
+        cached = _RenderedQueue(version, subject.name, lines, sum(len(line) + 1 for line in lines))
+        self._cache[subject.id] = cached
+        return cached
+
+    def render(self, subject: CachedSubject, viewer_id: Optional[int]) -> Tuple[str, bool]:
+        """Текст для зрителя и признак того, что показана не вся очередь"""
+        rendered = self._rendered(subject)
+        lines = rendered.lines
+        name = escape(subject.name)
+        if not lines:
+            return f"Очередь по предмету <b>{name}</b> пуста.", False
+
+        position = queue_engine.position(subject.id, viewer_id) if viewer_id else None
+        viewer = None if position is None else position - 1
+
+        total = len(lines)
+        if total <= self.max_lines and rendered.size < MESSAGE_LIMIT - 200:
+            header = f"Очередь по предмету <b>{name}</b>:"
+            return _join(header, lines, list(range(total)), viewer), False
+
+        shown = set(range(min(self.head, total)))
+        if viewer is not None:
+            shown.update(range(max(0, viewer - self.radius), min(total, viewer + self.radius + 1)))
+        indices = sorted(shown)
+
+        header = f"Очередь по предмету <b>{name}</b> ({total} чел.):"
+        text = _join(header, lines, indices, viewer)
+        while len(text) > MESSAGE_LIMIT and len(indices) > 1:
+            # Слишком длинные имена - убираем самые дальние от зрителя строки
+            anchor = viewer if viewer is not None else 0
+            indices.remove(max(indices, key=lambda i: (abs(i - anchor), i)))
+            text = _join(header, lines, indices, viewer)
+        return text, True
+
+
+def _shorten(name: str) -> str:
+    return name if len(name) <= NAME_LIMIT else name[:NAME_LIMIT - 1] + "…"
+
+
+def _join(header: str, lines: Tuple[str, ...], indices: List[int], viewer: Optional[int]) -> str:
+    parts = [header]
+    previous = -1
+    for i in indices:
+        if i != previous + 1:
+            parts.append("…")
+        parts.append(f"<b>{lines[i]}</b> ← ты" if i == viewer else lines[i])
+        previous = i
+    if previous < len(lines) - 1:
+        parts.append(f"… и ещё {len(lines) - 1 - previous}")
+    return "\n".join(parts)
+
+
+class QueueDocument(InputFile):
+    """
+    Полная очередь текстовым файлом. Файл не собирается в памяти целиком:
+    строки кодируются и отдаются кусками по мере отправки.
+    """
+
+    def __init__(self, subject: CachedSubject, entries: Tuple[QueueEntry, ...]) -> None:
+        super().__init__(filename=f"queue_{subject.id}.txt")
+        self.subject = subject
+        self.entries = entries
+
+    async def read(self, bot: Bot) -> AsyncGenerator[bytes, None]:
+        chunk: List[str] = [f"Очередь по предмету {self.subject.name}\n"]
+        size = 0
+        for idx, entry in enumerate(self.entries, start=1):
+            line = f"{idx}. {entry.full_name}\t{entry.joined_at:%d.%m.%Y %H:%M:%S}\n"
+            chunk.append(line)
+            size += len(line)
+            if size >= self.chunk_size:
+                yield "".join(chunk).encode()
+                chunk, size = [], 0
+        if chunk:
+            yield "".join(chunk).encode()
+
+
+queue_renderer = QueueRenderer(
+    max_lines=settings.queue_view_max_lines,
+    head=settings.queue_view_head,
+    radius=settings.queue_view_radius,
+)
+
+
+def render_queue(
+    subject: CachedSubject, viewer_id: Optional[int], is_admin: bool
+) -> Tuple[str, InlineKeyboardMarkup]:
+    """Текст и клавиатура сообщения с очередью для конкретного зрителя"""
+    in_queue = viewer_id is not None and queue_engine.contains(subject.id, viewer_id)
+    text, windowed = queue_renderer.render(subject, viewer_id)
+    markup = queue_actions_keyboard(
+        subject.id, in_queue=in_queue, is_admin=is_admin, show_export=windowed
+    )
+    return text, markup
@@ -0,0 +1,46 @@
+import asyncio
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    Корзина токенов: в среднем rate операций в секунду и всплеск до capacity.
+
+    pause() останавливает выдачу токенов на заданное время - так
+    обрабатывается retry_after от Telegram.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self) -> float:
+        """Сколько секунд ждать до следующего токена"""
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        self._refill(now)
+        if self._tokens >= 1:
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def try_acquire(self) -> bool:
+        if self.delay() > 0:
+            return False
+        self._tokens -= 1
+        return True
+
+    async def acquire(self) -> None:
+        while not self.try_acquire():
+            await asyncio.sleep(self.delay())
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
@@ -0,0 +1,164 @@
+import asyncio
+import logging
+from collections import Counter
+from html import escape
+from typing import Callable, Dict, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.config import settings
+from src.database import async_session_maker, queue_engine, subject_catalogue
+from src.database.requests import list_notify_subscriptions
+from src.keyboards.inline import turn_notification_keyboard
+
+from .outbound import Lane, outbound
+
+logger = logging.getLogger(__name__)
+
+# (user_id, subject_id)
+PendingKey = Tuple[int, int]
+
+
+class TurnNotifier:
+    """
+    Уведомления «скоро твоя очередь».
+
+    Пользователь выбирает позицию N (notify_at) и получает сообщение,
+    когда поднимается до N-го места, и ещё одно - когда становится первым.
+    Очередь никогда не пересматривается целиком: queue_engine сообщает,
+    какое место освободилось (subscribe_shift), а сдвинуться на пороговую
+    позицию мог только тот, кто теперь стоит ровно на ней. Поэтому на каждый
+    выход проверяется по одному человеку на каждый различный выбранный
+    порог - независимо от длины очереди.
+
+    Уведомления копятся delay секунд и уходят одной рассылкой в полосе
+    BULK outbound - после ответов пользователям и правок живых очередей.
+    Если до рассылки человек успел уйти, ему ничего не приходит.
+
+    В режиме нескольких процессов (src/workers.py) owns оставляет процессу
+    только его пользователей: сдвиг, сделанный другим процессом, приходит
+    сюда при синхронизации очереди, и уведомление уходит ровно один раз.
+    """
+
+    def __init__(self, delay: float) -> None:
+        self.delay = delay
+        # tg_id -> выбранная позиция
+        self._subscribers: Dict[int, int] = {}
+        self._thresholds: Counter = Counter()
+        # Кому и по какой дисциплине написать -> позиция, на которую поднялся
+        self._pending: Dict[PendingKey, int] = {}
+        self._wakeup = asyncio.Event()
+        self._bot: Optional[Bot] = None
+        self._task: Optional[asyncio.Task] = None
+        # Каким пользователям пишет этот процесс
+        self.owns: Callable[[int], bool] = lambda user_id: True
+
+        queue_engine.subscribe_shift(self._on_shift)
+        # Повторная регистрация начинается без уведомлений, как и в БД
+        queue_engine.subscribe_drop(lambda user_id: self.set_preference(user_id, None))
+
+    async def load(self, *sessions: AsyncSession) -> None:
+        """Прочитать подписки из БД (при старте, по сессии на каждый шард)"""
+        self._subscribers = {}
+        for session in sessions:
+            self._subscribers.update(await list_notify_subscriptions(session))
+        self._thresholds = Counter(self._subscribers.values())
+
+    def start(self, bot: Bot) -> None:
+        self._bot = bot
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run_forever())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def preference(self, user_id: int) -> Optional[int]:
+        return self._subscribers.get(user_id)
+
+    def set_preference(self, user_id: int, notify_at: Optional[int]) -> None:
+        """Вызывается после коммита set_notify_at"""
+        previous = self._subscribers.pop(user_id, None)
+        if previous is not None:
+            self._thresholds[previous] -= 1
+            if not self._thresholds[previous]:
+                del self._thresholds[previous]
+        if notify_at is not None:
+            self._subscribers[user_id] = notify_at
+            self._thresholds[notify_at] += 1
+
+    def _on_shift(self, subject_id: int, position: int) -> None:
+        if not self._subscribers:
+            return
+        entries = queue_engine.entries(subject_id)
+        # Сдвинулись только стоявшие за position: порог T пересёк тот,
+        # кто теперь стоит на T-м месте, если T >= position
+        thresholds = set(self._thresholds)
+        thresholds.add(1)
+        for threshold in thresholds:
+            if threshold < position or threshold > len(entries):
+                continue
+            user_id = entries[threshold - 1].user_id
+            if not self.owns(user_id):
+                continue
+            notify_at = self._subscribers.get(user_id)
+            if notify_at is None or threshold not in (1, notify_at):
+                continue
+            self._pending[(user_id, subject_id)] = threshold
+            self._wakeup.set()
+
+    async def _run_forever(self) -> None:
+        outbound.set_lane(Lane.BULK)
+        while True:
+            await self._wakeup.wait()
+            # Копим: за delay секунд очередь может сдвинуться ещё не раз
+            await asyncio.sleep(self.delay)
+            self._wakeup.clear()
+            pending, self._pending = self._pending, {}
+            try:
+                await self.flush(pending)
+            except Exception:
+                logger.exception("Не удалось разослать уведомления об очереди")
+
+    async def flush(self, pending: Dict[PendingKey, int]) -> None:
+        """Одна рассылка на все накопленные уведомления"""
+        if not subject_catalogue.loaded:
+            async with async_session_maker() as session:
+                await subject_catalogue.ensure_loaded(session)
+        await asyncio.gather(
+            *(
+                self._send(user_id, subject_id, threshold)
+                for (user_id, subject_id), threshold in pending.items()
+            )
+        )
+
+    async def _send(self, user_id: int, subject_id: int, threshold: int) -> None:
+        position = queue_engine.position(subject_id, user_id)
+        subject = subject_catalogue.get(subject_id)
+        if position is None or position > threshold or subject is None:
+            # Успел уйти (или дисциплину удалили) до рассылки
+            return
+
+        name = escape(subject.name)
+        if position == 1:
+            text = f"🔔 Твоя очередь по <b>{name}</b>: ты первый!"
+        else:
+            text = f"🔔 Скоро твоя очередь по <b>{name}</b>: ты {position}-й."
+        try:
+            await self._bot.send_message(
+                user_id, text, reply_markup=turn_notification_keyboard(subject_id)
+            )
+        except (TelegramForbiddenError, TelegramBadRequest) as e:
+            # Бот заблокирован или чат недоступен - остальным это не мешает
+            logger.info("Уведомление для %s не доставлено: %s", user_id, e)
+
+
+turn_notifier = TurnNotifier(delay=settings.turn_notify_delay_ms / 1000)
@@ -0,0 +1,139 @@
+import asyncio
+import logging
+from typing import Dict, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from src.database import queue_engine, subject_catalogue
+from src.database.models import EVENT_CLEAR, ChangeCounter, QueueEvent
+from src.database.query_stats import collect_queries
+from src.database.session import Shard, main_shard
+from src.database.shards import shard_router
+from src.database.user_cache import user_cache
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerSync:
+    """
+    Состояние в памяти процесса-воркера (src/workers.py) при общих файлах БД.
+
+    Источник правды - SQLite: позиции при вставке в очередь считает сама БД,
+    а писатели разных процессов SQLite выстраивает по очереди, поэтому
+    порядок записи в очередь верен при любом числе процессов. Устаревать
+    может только то, что каждый процесс держит в памяти, - это и догоняется
+    здесь раз в interval секунд:
+
+    - PRAGMA data_version на отдельном соединении к каждому шарду меняется,
+      только если в файл коммитил кто-то ещё; иначе шард пропускается
+      без единого запроса к таблицам;
+    - дисциплины, по которым с прошлого раза появились события в журнале
+      QueueEvents (каждое изменение очереди пишет туда строку), перечитываются
+      в queue_engine - живые очереди и уведомления срабатывают как обычно;
+    - по ChangeCounters видно, менялись ли Users, Subjects и Groups -
+      тогда сбрасываются кэш пользователей (и перечитываются участники
+      групп шарда), справочник дисциплин или перечитывается список групп.
+
+    Свои изменения процесс видит сразу (on_commit), чужие - с задержкой
+    не больше interval.
+    """
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self._connections: Dict[str, AsyncConnection] = {}
+        self._data_versions: Dict[str, int] = {}
+        self._last_event: Dict[str, int] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        for shard in shard_router.shards():
+            await self._watch(shard)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for connection in self._connections.values():
+            await connection.close()
+        self._connections.clear()
+
+    async def poll(self) -> None:
+        """Догнать изменения других процессов во всех шардах"""
+        for shard in shard_router.shards():
+            if shard.key not in self._connections:
+                # Файл новой группы: открыт только что, догонять нечего
+                await self._watch(shard)
+                continue
+            version = await self._data_version(shard)
+            if version == self._data_versions[shard.key]:
+                continue
+            self._data_versions[shard.key] = version
+            async with shard.session_maker() as session:
+                await self._catch_up(shard, session)
+
+    async def _watch(self, shard: Shard) -> None:
+        """Запомнить, до какого состояния шард уже есть в памяти"""
+        self._connections[shard.key] = await shard.read_engine.connect()
+        self._data_versions[shard.key] = await self._data_version(shard)
+        async with shard.session_maker() as session:
+            self._last_event[shard.key] = (
+                await session.execute(select(func.max(QueueEvent.id)))
+            ).scalar() or 0
+            self._counters[shard.key] = await _read_counters(session)
+
+    async def _data_version(self, shard: Shard) -> int:
+        connection = self._connections[shard.key]
+        version = (await connection.exec_driver_sql("PRAGMA data_version")).scalar()
+        # Не держим открытую транзакцию между проверками
+        await connection.rollback()
+        return version
+
+    async def _catch_up(self, shard: Shard, session: AsyncSession) -> None:
+        # Одно чтение - один снимок: события новее него догонит следующий проход
+        result = await session.execute(
+            select(QueueEvent.id, QueueEvent.subject_id, QueueEvent.kind)
+            .where(QueueEvent.id > self._last_event[shard.key])
+        )
+        subject_ids = set()
+        cleared = set()
+        for event_id, subject_id, kind in result:
+            subject_ids.add(subject_id)
+            if kind == EVENT_CLEAR:
+                cleared.add(subject_id)
+            self._last_event[shard.key] = max(self._last_event[shard.key], event_id)
+        await queue_engine.reload(session, subject_ids, cleared)
+
+        counters = await _read_counters(session)
+        previous, self._counters[shard.key] = self._counters[shard.key], counters
+        changed = {name for name, value in counters.items() if previous.get(name) != value}
+        if "Users" in changed:
+            user_cache.clear()
+            # Кто в какой группе: по этой карте выбирается шард и проверяется импорт
+            await shard_router.load_members(shard, session)
+        if "Subjects" in changed:
+            subject_catalogue.invalidate()
+        if "Groups" in changed and shard is main_shard:
+            await shard_router.load_groups()
+
+    async def _run_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                # Фоновая работа, а не запросы какого-то апдейта
+                with collect_queries(None):
+                    await self.poll()
+            except Exception:
+                logger.exception("Не удалось синхронизировать состояние с БД")
+
+
+async def _read_counters(session: AsyncSession) -> Dict[str, int]:
+    result = await session.execute(select(ChangeCounter.name, ChangeCounter.value))
+    return {name: value for name, value in result}
@@ -0,0 +1,172 @@
+import asyncio
+import hmac
+import json
+import logging
+from typing import List, Optional, TextIO
+
+from aiogram import Bot, Dispatcher
+from aiogram.methods import TelegramMethod
+from aiohttp import web
+
+from src.config import settings
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """
+    Приём апдейтов через вебхук на локальном aiohttp-сервере.
+
+    POST на webhook_path передаётся в Dispatcher.feed_webhook_update.
+    Одновременно обрабатывается не больше max_concurrency апдейтов:
+    остальные запросы ждут свободного слота, и Telegram (или
+    scripts/replay_updates.py) естественно притормаживает.
+
+    Если задан secret, запросы без правильного заголовка
+    X-Telegram-Bot-Api-Secret-Token отклоняются с 401.
+    GET /healthz отвечает, жив ли сервер и сколько апдейтов в работе.
+
+    С record_path апдейты дописываются в файл (JSON построчно, в порядке
+    прихода) фоновой задачей между start и stop: файл открыт всё это время,
+    а пишется в отдельном потоке, чтобы диск не держал event loop.
+    """
+
+    def __init__(
+        self,
+        dp: Dispatcher,
+        bot: Bot,
+        path: str,
+        secret: Optional[str],
+        max_concurrency: int,
+        record_path: Optional[str] = None,
+    ) -> None:
+        self.dp = dp
+        self.bot = bot
+        self.path = path
+        self.secret = secret
+        self.record_path = record_path
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._in_flight = 0
+        self._handled = 0
+        # Строки для файла записи; None - конец записи
+        self._records: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+        self._recorder: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self.record_path and self._recorder is None:
+            self._recorder = asyncio.get_running_loop().create_task(self._record_forever())
+
+    async def stop(self) -> None:
+        """Дописать уже принятые апдейты и закрыть файл записи"""
+        if self._recorder is not None:
+            self._records.put_nowait(None)
+            await self._recorder
+            self._recorder = None
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_update)
+        app.router.add_get("/healthz", self.health)
+        return app
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        if self.secret is not None:
+            token = request.headers.get(SECRET_HEADER, "")
+            if not hmac.compare_digest(token, self.secret):
+                return web.Response(status=401)
+
+        try:
+            update = await request.json()
+        except json.JSONDecodeError:
+            return web.Response(status=400)
+        if not isinstance(update, dict):
+            return web.Response(status=400)
+
+        if self._recorder is not None:
+            # Сохраняем апдейты, чтобы потом проиграть их локально
+            self._records.put_nowait(json.dumps(update, ensure_ascii=False) + "\n")
+
+        self._in_flight += 1
+        try:
+            async with self._semaphore:
+                result = await self.dp.feed_webhook_update(self.bot, update)
+            if isinstance(result, TelegramMethod):
+                await self.dp.silent_call_request(self.bot, result)
+        except Exception:
+            # Ошибку хэндлера Telegram не исправит - повторять апдейт незачем
+            logger.exception("Ошибка при обработке апдейта %s", update.get("update_id"))
+        finally:
+            self._in_flight -= 1
+            self._handled += 1
+        return web.Response()
+
+    async def _record_forever(self) -> None:
+        file = await asyncio.to_thread(open, self.record_path, "a", encoding="utf-8")
+        try:
+            while True:
+                # Всё, что накопилось, пока писалась прошлая пачка, - одной записью
+                lines = [await self._records.get()]
+                while not self._records.empty():
+                    lines.append(self._records.get_nowait())
+                finished = lines[-1] is None
+                if finished:
+                    lines.pop()
+                if lines:
+                    try:
+                        await asyncio.to_thread(_append, file, lines)
+                    except OSError:
+                        logger.exception("Не удалось записать апдейты в %s", self.record_path)
+                if finished:
+                    return
+        finally:
+            await asyncio.to_thread(file.close)
+
+    async def health(self, request: web.Request) -> web.Response:
+        return web.json_response(
+            {"status": "ok", "in_flight": self._in_flight, "handled": self._handled}
+        )
+
+
+def _append(file: TextIO, lines: List[str]) -> None:
+    file.writelines(lines)
+    file.flush()
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot) -> None:
+    """Поднять сервер и, если задан WEBHOOK_URL, зарегистрировать вебхук в Telegram"""
+    server = WebhookServer(
+        dp,
+        bot,
+        path=settings.webhook_path,
+        secret=settings.webhook_secret,
+        max_concurrency=settings.webhook_max_concurrency,
+        record_path=settings.webhook_record_path,
+    )
+    runner = web.AppRunner(server.create_app())
+    await runner.setup()
+    server.start()
+    # Как и start_polling: хэндлеры startup/shutdown (в том числе закрытие FSM)
+    await dp.emit_startup(bot=bot)
+    site = web.TCPSite(runner, settings.webhook_host, settings.webhook_port)
+    await site.start()
+    logger.info(
+        "Вебхук слушает %s:%s%s", settings.webhook_host, settings.webhook_port, settings.webhook_path
+    )
+
+    if settings.webhook_url:
+        await bot.set_webhook(
+            settings.webhook_url.rstrip("/") + settings.webhook_path,
+            secret_token=settings.webhook_secret,
+            max_connections=settings.webhook_max_concurrency,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+
+    try:
+        # Работаем, пока задачу не отменят
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        await server.stop()
+        await dp.emit_shutdown(bot=bot)
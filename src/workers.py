@@ -0,0 +1,327 @@
+"""
+Несколько процессов-воркеров на одного бота (WORKERS > 1).
+
+Главный процесс (супервизор) один раз применяет миграции, получает апдейты
+(long polling или вебхук) и раздаёт их воркерам: апдейт пользователя всегда
+уходит в процесс tg_id % WORKERS, апдейты без пользователя - по чату.
+Воркер - это обычный бот со всеми роутерами и middleware, только апдейты
+он читает построчно (JSON) из stdin, а не из Telegram.
+
+Почему так можно:
+
+- диалоги (FSM) и ответы пользователю: все апдейты пользователя обрабатывает
+  один процесс и строго по порядку, поэтому его состояние не гоняется между
+  процессами; SQLiteStorage каждого воркера читает только свои ключи;
+- порядок в очереди: позицию и время записи считает сама БД одним
+  INSERT ... RETURNING, а SQLite пропускает писателей всех процессов по
+  одному (ждать блокировку - SQLITE_BUSY_TIMEOUT, рекомендуется WAL),
+  поэтому «кто раньше нажал» решается так же, как и в одном процессе;
+- очереди, дисциплины, группы и кэш пользователей в памяти воркера
+  догоняют изменения других процессов через WorkerSync
+  (см. src/services/worker_sync.py) с задержкой WORKER_SYNC_INTERVAL_MS;
+  имя, изменённое в другом процессе, в живой очереди появится при следующем
+  изменении этой очереди;
+- уведомления «скоро твоя очередь» шлёт только процесс, которому
+  принадлежит пользователь, - ровно одно на сдвиг, кто бы его ни сделал.
+
+Лимит исходящих сообщений OUTBOUND_GLOBAL_RATE делится между воркерами
+поровну, метрики воркера i - на METRICS_PORT + i.
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.types import TelegramObject, Update
+
+from src.bot import (
+    bot_routers,
+    create_bot,
+    create_dispatcher,
+    create_fsm_storage,
+    init_db,
+    notify_superadmins,
+)
+from src.config import BASE_DIR, settings
+from src.database.writer import db_writer
+from src.services import live_views, turn_notifier
+from src.services.metrics import MetricsServer
+from src.services.worker_sync import WorkerSync
+from src.webhook import run_webhook
+
+logger = logging.getLogger(__name__)
+
+# Строка JSON с апдейтом может быть длинной (подписи, сущности)
+_MAX_LINE = 16 * 1024 * 1024
+
+
+def worker_of(tg_id: int) -> int:
+    """Номер воркера, который обслуживает пользователя (или чат)"""
+    return tg_id % settings.workers
+
+
+class UpdatePartitioner(BaseMiddleware):
+    """Outer middleware супервизора: вместо обработки - отдать апдейт воркеру"""
+
+    def __init__(self, supervisor: "Supervisor") -> None:
+        self.supervisor = supervisor
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        # Пользователя и чат уже достал UserContextMiddleware
+        user = data.get("event_from_user")
+        chat = data.get("event_chat")
+        if user is not None:
+            key = user.id
+        elif chat is not None:
+            key = chat.id
+        else:
+            key = event.update_id
+        payload = event.model_dump_json(exclude_unset=True, by_alias=True)
+        await self.supervisor.dispatch(worker_of(key), payload.encode() + b"\n")
+        return True
+
+
+class WorkerCrashLoop(RuntimeError):
+    """Воркер падает сразу после каждого перезапуска"""
+
+
+class Supervisor:
+    """
+    Запуск воркеров, перезапуск упавших и запись апдейтов в их stdin.
+
+    Упавший воркер перезапускается с растущей паузой (RESTART_DELAY,
+    удваивается до RESTART_DELAY_MAX). Счёт падений сбрасывается, если
+    воркер проработал дольше RESTART_RESET; после MAX_RESTARTS падений
+    подряд (например, воркер не может даже импортироваться) супервизор
+    сдаётся - failed выставляется, и run_supervisor завершается с ошибкой.
+    """
+
+    RESTART_DELAY = 1.0
+    RESTART_DELAY_MAX = 30.0
+    RESTART_RESET = 60.0
+    MAX_RESTARTS = 5
+
+    def __init__(self, count: int) -> None:
+        self.count = count
+        self.failed = asyncio.Event()
+        self._processes: List[Optional[asyncio.subprocess.Process]] = [None] * count
+        self._watchers: List[Optional[asyncio.Task]] = [None] * count
+        self._started_at = [0.0] * count
+        self._crashes = [0] * count
+        self._respawn_locks = [asyncio.Lock() for _ in range(count)]
+        self._stopping = False
+
+    async def start(self) -> None:
+        for index in range(self.count):
+            await self._spawn(index)
+
+    async def stop(self) -> None:
+        self._stopping = True
+        for task in self._watchers:
+            if task is not None:
+                task.cancel()
+        for process in self._processes:
+            if process is not None and process.returncode is None:
+                # Конец ввода: воркер доделает начатое и выйдет сам
+                process.stdin.close()
+        for process in self._processes:
+            if process is None:
+                continue
+            try:
+                await asyncio.wait_for(process.wait(), timeout=30)
+            except asyncio.TimeoutError:
+                logger.warning("Воркер %s не завершился, останавливаем", process.pid)
+                process.kill()
+                await process.wait()
+
+    async def dispatch(self, index: int, payload: bytes) -> None:
+        process = self._processes[index]
+        try:
+            process.stdin.write(payload)
+            await process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            # Воркер упал между апдейтами - отдаём апдейт новому
+            process = await self._respawn(index, process)
+            process.stdin.write(payload)
+            await process.stdin.drain()
+
+    async def _spawn(self, index: int) -> asyncio.subprocess.Process:
+        env = dict(os.environ)
+        env["OUTBOUND_GLOBAL_RATE"] = str(settings.outbound_global_rate / self.count)
+        if settings.metrics_port:
+            env["METRICS_PORT"] = str(settings.metrics_port + index)
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "src.workers", str(index),
+            stdin=asyncio.subprocess.PIPE,
+            env=env,
+            cwd=BASE_DIR,
+        )
+        self._processes[index] = process
+        self._started_at[index] = time.monotonic()
+        # Одна задача наблюдения на воркер: старая закончилась вместе с ним
+        self._watchers[index] = asyncio.get_running_loop().create_task(
+            self._watch(index, process)
+        )
+        logger.info("Воркер %s запущен (pid %s)", index, process.pid)
+        return process
+
+    async def _watch(self, index: int, process: asyncio.subprocess.Process) -> None:
+        await process.wait()
+        if not self._stopping:
+            try:
+                await self._respawn(index, process)
+            except WorkerCrashLoop:
+                self.failed.set()
+
+    async def _respawn(
+        self, index: int, dead: asyncio.subprocess.Process
+    ) -> asyncio.subprocess.Process:
+        """Заменить упавший воркер; если его уже заменили - вернуть замену"""
+        async with self._respawn_locks[index]:
+            if self._processes[index] is not dead:
+                return self._processes[index]
+            await dead.wait()
+
+            if time.monotonic() - self._started_at[index] > self.RESTART_RESET:
+                self._crashes[index] = 0
+            self._crashes[index] += 1
+            if self._crashes[index] > self.MAX_RESTARTS:
+                logger.critical(
+                    "Воркер %s упал %s раз подряд (код %s), больше не перезапускаем",
+                    index, self._crashes[index], dead.returncode,
+                )
+                raise WorkerCrashLoop(f"воркер {index} падает при каждом запуске")
+
+            delay = min(
+                self.RESTART_DELAY * 2 ** (self._crashes[index] - 1), self.RESTART_DELAY_MAX
+            )
+            logger.error(
+                "Воркер %s завершился с кодом %s, перезапуск через %.0f с",
+                index, dead.returncode, delay,
+            )
+            await asyncio.sleep(delay)
+            return await self._spawn(index)
+
+
+async def run_supervisor() -> None:
+    has_disciplines = await init_db()
+    bot = create_bot()
+    supervisor = Supervisor(settings.workers)
+    # Роутеры нужны только для allowed_updates: до хэндлеров апдейт не доходит
+    dp = Dispatcher(disable_fsm=True)
+    dp.update.outer_middleware(UpdatePartitioner(supervisor))
+    dp.include_routers(*bot_routers())
+
+    if not has_disciplines and settings.superadmins:
+        await notify_superadmins(bot)
+
+    await supervisor.start()
+    serving = asyncio.get_running_loop().create_task(_serve(dp, bot))
+    giving_up = asyncio.get_running_loop().create_task(supervisor.failed.wait())
+    try:
+        await asyncio.wait({serving, giving_up}, return_when=asyncio.FIRST_COMPLETED)
+        if giving_up.done():
+            raise WorkerCrashLoop("воркеры не запускаются, см. лог выше")
+        serving.result()
+    finally:
+        for task in (serving, giving_up):
+            task.cancel()
+        await asyncio.gather(serving, giving_up, return_exceptions=True)
+        await supervisor.stop()
+        await bot.session.close()
+
+
+async def _serve(dp: Dispatcher, bot: Bot) -> None:
+    if settings.bot_mode == "webhook":
+        await run_webhook(dp, bot)
+    else:
+        await bot.delete_webhook()
+        # По одному апдейту: порядок записи в воркер = порядок в Telegram
+        await dp.start_polling(bot, handle_as_tasks=False)
+
+
+async def run_worker(index: int) -> None:
+    await init_db()
+    bot = create_bot()
+    metrics_server = None
+    if settings.metrics_port:
+        metrics_server = MetricsServer(settings.metrics_host, settings.metrics_port)
+        await metrics_server.start()
+    dp = create_dispatcher(
+        await create_fsm_storage(owns=lambda key: worker_of(key.user_id) == index)
+    )
+    turn_notifier.owns = lambda user_id: worker_of(user_id) == index
+    sync = WorkerSync(interval=settings.worker_sync_interval_ms / 1000)
+
+    db_writer.start()
+    live_views.start(bot)
+    turn_notifier.start(bot)
+    await sync.start()
+    await dp.emit_startup(bot=bot)
+    try:
+        await _feed_stdin(dp, bot)
+    finally:
+        await dp.emit_shutdown(bot=bot)
+        await sync.stop()
+        await live_views.stop()
+        await turn_notifier.stop()
+        if metrics_server is not None:
+            await metrics_server.stop()
+        await db_writer.stop()
+        await bot.session.close()
+
+
+async def _feed_stdin(dp: Dispatcher, bot: Bot) -> None:
+    """Обрабатывать апдейты из stdin до его закрытия"""
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=_MAX_LINE)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+
+    # Последний апдейт каждого пользователя: следующий ждёт его завершения
+    tails: Dict[int, asyncio.Task] = {}
+
+    async def handle(key: int, update: Dict[str, Any], previous: Optional[asyncio.Task]) -> None:
+        if previous is not None:
+            await asyncio.wait([previous])
+        try:
+            await dp.feed_raw_update(bot, update)
+        except Exception:
+            logger.exception("Ошибка при обработке апдейта %s", update.get("update_id"))
+        finally:
+            if tails.get(key) is asyncio.current_task():
+                del tails[key]
+
+    while line := await reader.readline():
+        update = json.loads(line)
+        key = _update_key(update)
+        tails[key] = loop.create_task(handle(key, update, tails.get(key)))
+
+    if tails:
+        await asyncio.wait(list(tails.values()))
+
+
+def _update_key(update: Dict[str, Any]) -> int:
+    """Пользователь апдейта для упорядочивания (без разбора в модели aiogram)"""
+    for event in update.values():
+        if isinstance(event, dict):
+            user = event.get("from") or event.get("user")
+            if isinstance(user, dict):
+                return user["id"]
+            chat = event.get("chat")
+            if isinstance(chat, dict):
+                return chat["id"]
+    return update["update_id"]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run_worker(int(sys.argv[1])))
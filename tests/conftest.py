@@ -0,0 +1,139 @@
+"""
+Общие фикстуры тестов.
+
+Настройки бота читаются из окружения при импорте src, поэтому окружение
+готовится здесь, до первого импорта: временная БД, строгая проверка
+запросов на апдейт (см. src/middlewares/query_budget.py) и группы в
+отдельных файлах. Все тесты делят один event loop и одну БД, поэтому
+у каждого теста свои пользователи и дисциплины (new_id, new_name).
+
+Запуск из корня проекта: python -m pytest -q
+"""
+import asyncio
+import itertools
+import os
+import shutil
+import tempfile
+
+import pytest
+
+_DATA_DIR = tempfile.mkdtemp(prefix="queue-bot-tests-")
+os.environ.update(
+    BOT_TOKEN="0:test",
+    DB_PATH=os.path.join(_DATA_DIR, "bot.db"),
+    SUPERADMINS="[]",
+    FSM_STORAGE="memory",
+    GROUP_SHARDS="1",
+    WORKERS="1",
+    QUERY_BUDGET_MODE="strict",
+)
+os.environ.pop("METRICS_PORT", None)
+
+from aiogram import Bot  # noqa: E402
+from aiogram.fsm.storage.memory import MemoryStorage  # noqa: E402
+
+from scripts.loadtest import RecordingSession, UpdateFactory  # noqa: E402
+from src.bot import create_dispatcher, init_db  # noqa: E402
+from src.database import async_session_maker, engine, subject_catalogue  # noqa: E402
+from src.database.requests import create_subject, create_user  # noqa: E402
+from src.database.writer import db_writer  # noqa: E402
+from src.services import live_views  # noqa: E402
+
+_ids = itertools.count(1000)
+
+
+@pytest.fixture(scope="session")
+def loop():
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(init_db())
+    yield loop
+    loop.run_until_complete(live_views.stop())
+    loop.run_until_complete(db_writer.stop())
+    loop.run_until_complete(engine.dispose())
+    loop.close()
+    shutil.rmtree(_DATA_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def run(loop):
+    """Выполнить корутину в общем event loop тестов"""
+    return loop.run_until_complete
+
+
+@pytest.fixture
+def new_id():
+    """Новый tg_id (или любой другой уникальный номер)"""
+    return lambda: next(_ids)
+
+
+@pytest.fixture
+def new_name():
+    return lambda prefix="Дисциплина": f"{prefix} {next(_ids)}"
+
+
+class BotHarness:
+    """
+    Бот с настоящим Dispatcher и фейковым Telegram (как в scripts/loadtest.py).
+    Роутеры бота - модульные, поэтому Dispatcher один на все тесты.
+    """
+
+    def __init__(self) -> None:
+        self.session = RecordingSession(latency=0)
+        self.bot = Bot(token="0:test", session=self.session)
+        self.dp = create_dispatcher(MemoryStorage())
+        self.updates = UpdateFactory(self.session)
+
+    async def start(self) -> "BotHarness":
+        live_views.start(self.bot)
+        return self
+
+    async def message(self, user_id: int, text: str) -> None:
+        await self.dp.feed_update(self.bot, self.updates.message(user_id, text))
+
+    async def callback(self, user_id: int, data: str) -> None:
+        await self.dp.feed_update(self.bot, self.updates.callback(user_id, data))
+
+
+@pytest.fixture(scope="session")
+def _harness(loop):
+    return loop.run_until_complete(BotHarness().start())
+
+
+@pytest.fixture
+def harness(_harness):
+    """Общий бот; счётчик вызовов API - только этого теста"""
+    _harness.session.calls.clear()
+    return _harness
+
+
+@pytest.fixture
+def student(run, new_id):
+    """Зарегистрированный пользователь группы по умолчанию, возвращает tg_id"""
+
+    def make(name: str = "Студент") -> int:
+        tg_id = new_id()
+        run(db_writer.submit(lambda session: create_user(session, tg_id, f"{name} {tg_id}")))
+        return tg_id
+
+    return make
+
+
+@pytest.fixture
+def subject(run, new_name):
+    """
+    Новая дисциплина группы по умолчанию, возвращает её id. Справочник
+    дисциплин сразу перечитывается: это разовая цена изменения, а не
+    запрос горячего хэндлера.
+    """
+
+    async def reload_catalogue() -> None:
+        async with async_session_maker() as session:
+            await subject_catalogue.ensure_loaded(session)
+
+    def make(name: str = None) -> int:
+        name = name or new_name()
+        created = run(db_writer.submit(lambda session: create_subject(session, name)))
+        run(reload_catalogue())
+        return created.id
+
+    return make
@@ -0,0 +1,47 @@
+"""Разбор файла импорта (src/services/bulk.py)"""
+import pytest
+
+from src.services.bulk import BulkFormatError, parse_import
+
+
+async def _chunks(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def _parse(run, text: str, filename: str = "import.csv", size: int = 7):
+    # Маленькие куски: строки и кавычки рвутся между ними
+    return run(parse_import(_chunks(text.encode("utf-8-sig"), size), filename))
+
+
+def test_quoted_field_spans_lines(run):
+    batch = _parse(
+        run,
+        'tg_id;full_name;role\r\n'
+        '1;"Иванов\r\nИван";student\r\n'
+        '2;"Петров ""Пётр""\n\nПетрович";admin\n'
+        '\n'
+        '3;Сидоров;student\n',
+    )
+    assert batch.errors == []
+    assert batch.users == {
+        1: (1, "Иванов Иван", "student"),
+        2: (2, 'Петров "Пётр" Петрович', "admin"),
+        3: (3, "Сидоров", "student"),
+    }
+
+
+def test_errors_point_at_record_start(run):
+    batch = _parse(
+        run,
+        'tg_id,full_name\n'
+        '1,"Иванов\nИван"\n'
+        'x,Петров\n',
+    )
+    assert list(batch.users) == [1]
+    assert batch.errors == ["строка 4: tg_id должен быть числом"]
+
+
+def test_header_required(run):
+    with pytest.raises(BulkFormatError):
+        _parse(run, "1,Иванов,student\n")
@@ -0,0 +1,91 @@
+"""
+SQLiteStorage (src/database/fsm_storage.py), когда одну БД делят
+несколько воркеров: каждый читает и сбрасывает только свои ключи.
+"""
+from datetime import datetime, timedelta
+
+from aiogram.fsm.storage.base import StorageKey
+from sqlalchemy import select, update
+
+from src.database import async_session_maker
+from src.database.fsm_storage import SQLiteStorage, _dump_key
+from src.database.models import FsmState
+from src.database.session import main_shard
+from src.database.writer import db_writer
+
+
+def _storage(owns, ttl: float = 60) -> SQLiteStorage:
+    return SQLiteStorage(
+        main_shard.session_maker,
+        db_writer.for_shard(main_shard),
+        max_size=100,
+        ttl=ttl,
+        flush_interval=60,
+        owns=owns,
+    )
+
+
+def _key(user_id: int) -> StorageKey:
+    return StorageKey(bot_id=0, chat_id=user_id, user_id=user_id)
+
+
+async def _age_states(*keys: StorageKey) -> None:
+    """Состояние читали, но не меняли: updated_at давно в прошлом"""
+    async def old(session):
+        await session.execute(
+            update(FsmState)
+            .where(FsmState.key.in_([_dump_key(key) for key in keys]))
+            .values(updated_at=datetime.now() - timedelta(hours=1))
+        )
+
+    await db_writer.for_shard(main_shard).submit(old)
+
+
+async def _stored_keys(*keys: StorageKey):
+    async with async_session_maker() as session:
+        result = await session.execute(
+            select(FsmState.key).where(FsmState.key.in_([_dump_key(key) for key in keys]))
+        )
+        return set(result.scalars())
+
+
+def test_sweep_keeps_other_workers_states(run, new_id):
+    mine, theirs = _key(new_id()), _key(new_id())
+    first = _storage(lambda key: key.user_id == mine.user_id, ttl=60)
+    second = _storage(lambda key: key.user_id == theirs.user_id, ttl=60)
+
+    async def scenario():
+        await first.set_state(mine, "Form:name")
+        await second.set_state(theirs, "Form:name")
+        await first.flush()
+        await second.flush()
+        await _age_states(mine, theirs)
+
+        # Уборка первого воркера - и при старте, и по таймеру
+        await _storage(first.owns, ttl=60).load()
+        await first._sweep()
+        return await _stored_keys(mine, theirs)
+
+    assert run(scenario()) == {_dump_key(theirs)}
+
+    async def after_eviction():
+        # Второй воркер вытеснил состояние из кэша (или перезапустился)
+        second._cache.clear()
+        return await second.get_state(theirs)
+
+    assert run(after_eviction()) == "Form:name"
+
+
+def test_sweep_without_owns_deletes_all_expired(run, new_id):
+    keys = [_key(new_id()), _key(new_id())]
+    storage = _storage(None)
+
+    async def scenario():
+        for key in keys:
+            await storage.set_state(key, "Form:name")
+        await storage.flush()
+        await _age_states(*keys)
+        await storage._sweep()
+        return await _stored_keys(*keys)
+
+    assert run(scenario()) == set()
@@ -0,0 +1,36 @@
+"""Кэш клавиатур со списком дисциплин (src/keyboards/cache.py)"""
+from src.database import async_session_maker, subject_catalogue
+from src.database.models import DEFAULT_GROUP_ID, Subject
+from src.database.writer import db_writer
+from src.keyboards.inline import subjects_keyboard
+
+
+def _names(markup):
+    return {row[0].text for row in markup.inline_keyboard}
+
+
+async def _reload() -> None:
+    async with async_session_maker() as session:
+        await subject_catalogue.ensure_loaded(session)
+
+
+def test_keyboard_reused_until_catalogue_changes(run, subject):
+    subject()
+    assert subjects_keyboard(DEFAULT_GROUP_ID) is subjects_keyboard(DEFAULT_GROUP_ID)
+
+
+def test_stale_catalogue_is_not_cached(run, subject, new_name):
+    subject()
+    name = new_name()
+
+    async def add_quietly(session):
+        # Дисциплина уже в БД, а справочник сбросят чуть позже
+        session.add(Subject(name=name, group_id=DEFAULT_GROUP_ID))
+
+    run(db_writer.submit(add_quietly))
+    subject_catalogue.invalidate()
+    # Хэндлер между сбросом и перечитыванием строит клавиатуру из старых данных
+    assert name not in _names(subjects_keyboard(DEFAULT_GROUP_ID))
+
+    run(_reload())
+    assert name in _names(subjects_keyboard(DEFAULT_GROUP_ID))
@@ -0,0 +1,105 @@
+"""
+Миграции (src/database/migrations) на новой базе и на базе, которую
+создавал Base.metadata.create_all до alembic.
+"""
+import sqlite3
+
+from alembic.script import ScriptDirectory
+
+from src.database.migrate import alembic_config, upgrade_db
+from src.database.session import make_engine
+
+# Схема исходной версии бота (create_all): имена уникальны с учётом регистра
+_LEGACY_SCHEMA = """
+CREATE TABLE "Users" (
+    tg_id BIGINT NOT NULL,
+    full_name VARCHAR NOT NULL,
+    role VARCHAR NOT NULL,
+    PRIMARY KEY (tg_id)
+);
+CREATE TABLE "Subjects" (
+    id INTEGER NOT NULL,
+    name VARCHAR NOT NULL,
+    PRIMARY KEY (id),
+    UNIQUE (name)
+);
+CREATE TABLE "Queues" (
+    user_id BIGINT NOT NULL,
+    subject_id INTEGER NOT NULL,
+    joined_at DATETIME NOT NULL,
+    PRIMARY KEY (user_id, subject_id),
+    FOREIGN KEY(user_id) REFERENCES "Users" (tg_id) ON DELETE CASCADE,
+    FOREIGN KEY(subject_id) REFERENCES "Subjects" (id) ON DELETE CASCADE
+);
+"""
+
+
+def _head() -> str:
+    return ScriptDirectory.from_config(alembic_config(None)).get_current_head()
+
+
+def _upgrade(run, path) -> sqlite3.Connection:
+    async def upgrade():
+        engine = make_engine(f"sqlite+aiosqlite:///{path}", {})
+        try:
+            await upgrade_db(engine)
+        finally:
+            await engine.dispose()
+
+    run(upgrade())
+    return sqlite3.connect(path)
+
+
+def _tables(connection: sqlite3.Connection) -> set:
+    return {name for (name,) in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def test_new_database_reaches_head(run, tmp_path):
+    connection = _upgrade(run, tmp_path / "new.db")
+    assert connection.execute("SELECT version_num FROM alembic_version").fetchall() == [(_head(),)]
+    assert {"Users", "Subjects", "Queues", "Groups", "QueueEvents", "ChangeCounters"} <= _tables(connection)
+
+
+def test_legacy_database_is_upgraded(run, tmp_path):
+    path = tmp_path / "legacy.db"
+    connection = sqlite3.connect(path)
+    connection.executescript(_LEGACY_SCHEMA)
+    connection.executescript("""
+        INSERT INTO "Users" VALUES (1, 'А', 'student'), (2, 'Б', 'student'), (3, 'В', 'admin');
+        INSERT INTO "Subjects" (id, name) VALUES (1, 'Физика'), (2, 'физика '), (3, 'Химия');
+        INSERT INTO "Queues" VALUES
+            (1, 1, '2024-01-01 10:00:05'),
+            (1, 2, '2024-01-01 10:00:00'),
+            (2, 2, '2024-01-01 10:00:01'),
+            (3, 3, '2024-01-01 10:00:00');
+    """)
+    connection.commit()
+    connection.close()
+
+    connection = _upgrade(run, path)
+    assert connection.execute("SELECT version_num FROM alembic_version").fetchall() == [(_head(),)]
+    # Дубликат по регистру и пробелам слит в старшую дисциплину, записи
+    # перенесены, а стоявший в обеих очередях остался на более раннем месте
+    assert connection.execute('SELECT id, name FROM "Subjects" ORDER BY id').fetchall() == [
+        (1, "Физика"),
+        (3, "Химия"),
+    ]
+    assert connection.execute(
+        'SELECT user_id, subject_id, joined_at FROM "Queues" ORDER BY subject_id, joined_at'
+    ).fetchall() == [
+        (1, 1, "2024-01-01 10:00:00"),
+        (2, 1, "2024-01-01 10:00:01"),
+        (3, 3, "2024-01-01 10:00:00"),
+    ]
+    assert connection.execute('SELECT tg_id, group_id FROM "Users" ORDER BY tg_id').fetchall() == [
+        (1, 1),
+        (2, 1),
+        (3, 1),
+    ]
+
+
+def test_upgrade_is_idempotent(run, tmp_path):
+    path = tmp_path / "twice.db"
+    _upgrade(run, path).close()
+    connection = _upgrade(run, path)
+    assert connection.execute("SELECT version_num FROM alembic_version").fetchall() == [(_head(),)]
@@ -0,0 +1,105 @@
+"""
+Горячие хэндлеры укладываются в свои бюджеты запросов (QUERY_BUDGETS),
+а проверка действительно ловит N+1 и подгрузку связей.
+
+Хэндлеры идут через настоящий Dispatcher в строгом режиме: нарушение
+бюджета роняет апдейт с QueryBudgetExceeded, и тест падает. Кэш
+пользователей перед каждым апдейтом холодный - это худший случай, под
+который и заданы бюджеты.
+"""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from src.config import settings
+from src.database import async_session_maker
+from src.database.models import Queue, User
+from src.database.query_stats import QueryBudgetExceeded, assert_queries
+from src.database.user_cache import user_cache
+from src.keyboards.callbacks import QueueAction, QueueCb, SubjectCb
+
+
+def _cold(tg_id: int) -> None:
+    user_cache.invalidate(tg_id)
+
+
+def test_choose_discipline(run, harness, student, subject):
+    user = student()
+    subject()
+    _cold(user)
+    run(harness.message(user, "Выбрать дисциплину"))
+    assert harness.session.calls["SendMessage"] == 1
+
+
+def test_show_queue(run, harness, student, subject):
+    user, subject_id = student(), subject()
+    _cold(user)
+    run(harness.callback(user, SubjectCb(subject_id=subject_id).pack()))
+    assert harness.session.calls["EditMessageText"] == 1
+
+
+def test_join_and_leave(run, harness, student, subject):
+    users, subject_id = [student() for _ in range(5)], subject()
+    for user in users:
+        _cold(user)
+        run(harness.callback(user, QueueCb(action=QueueAction.JOIN, subject_id=subject_id).pack()))
+    # Повторное нажатие - тот же бюджет
+    _cold(users[0])
+    run(harness.callback(users[0], QueueCb(action=QueueAction.JOIN, subject_id=subject_id).pack()))
+    for user in users[1:3]:
+        _cold(user)
+        run(harness.callback(user, QueueCb(action=QueueAction.LEAVE, subject_id=subject_id).pack()))
+
+
+def test_my_queues(run, harness, student, subject):
+    user = student()
+    for _ in range(5):
+        subject_id = subject()
+        run(harness.callback(user, QueueCb(action=QueueAction.JOIN, subject_id=subject_id).pack()))
+    # Промах и по пользователю, и по кэшу «Моих очередей»: одна очередь -
+    # один запрос, сколько бы очередей ни было
+    _cold(user)
+    run(harness.message(user, "Мои очереди"))
+    assert harness.session.calls["SendMessage"] == 1
+
+
+def test_over_budget_fails_update(run, harness, student, subject, monkeypatch):
+    user, subject_id = student(), subject()
+    # Бюджет без места на промах кэша пользователей
+    monkeypatch.setitem(settings.query_budgets, "queue.show_queue", 0)
+    _cold(user)
+    with pytest.raises(QueryBudgetExceeded, match="queue.show_queue"):
+        run(harness.callback(user, SubjectCb(subject_id=subject_id).pack()))
+
+
+def test_repeated_queries_reported(run, student):
+    users = [student() for _ in range(3)]
+
+    async def one_by_one():
+        async with async_session_maker() as session:
+            for tg_id in users:
+                await session.get(User, tg_id)
+
+    with pytest.raises(QueryBudgetExceeded, match="3 одинаковых запросов"):
+        with assert_queries(budget=10):
+            run(one_by_one())
+
+
+def test_relationship_load_reported(run, student, subject):
+    user, subject_id = student(), subject()
+
+    async def with_users():
+        async with async_session_maker() as session:
+            session.add(Queue(user_id=user, subject_id=subject_id, joined_at=datetime.now()))
+            await session.flush()
+            result = await session.execute(
+                select(Queue).where(Queue.subject_id == subject_id).options(selectinload(Queue.user))
+            )
+            result.scalars().all()
+            await session.rollback()
+
+    with pytest.raises(QueryBudgetExceeded, match="подгрузка связи"):
+        with assert_queries(budget=10):
+            run(with_users())
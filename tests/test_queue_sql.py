@@ -0,0 +1,78 @@
+"""
+Позиции в очереди считает SQLite (_JOIN_SQL, _LEAVE_SQL и удаление
+пользователя): по (joined_at, user_id), независимо от очереди в памяти.
+"""
+from datetime import datetime
+
+from sqlalchemy import select
+
+from src.database import async_session_maker, queue_engine
+from src.database.models import EVENT_JOIN, EVENT_LEAVE, EVENT_SERVED, QueueEvent
+from src.database.requests import _JOIN_SQL, delete_user_bd
+from src.database.writer import db_writer
+
+
+async def _events(subject_id: int):
+    async with async_session_maker() as session:
+        result = await session.execute(
+            select(QueueEvent.user_id, QueueEvent.kind, QueueEvent.position)
+            .where(QueueEvent.subject_id == subject_id)
+            .order_by(QueueEvent.id)
+        )
+        return [tuple(row) for row in result]
+
+
+def test_join_and_leave_positions(run, student, subject):
+    a, b, c = student(), student(), student()
+    subject_id = subject()
+
+    assert [run(db_writer.join(user, subject_id, "x")) for user in (a, b, c)] == [1, 2, 3]
+    assert run(db_writer.leave(b, subject_id)) == 2
+    assert run(db_writer.leave(b, subject_id)) is None
+    assert run(db_writer.join(b, subject_id, "x")) == 3
+    assert run(db_writer.leave(a, subject_id)) == 1
+
+    assert run(_events(subject_id)) == [
+        (a, EVENT_JOIN, 1),
+        (b, EVENT_JOIN, 2),
+        (c, EVENT_JOIN, 3),
+        (b, EVENT_LEAVE, 2),
+        (b, EVENT_JOIN, 3),
+        # Ушедший с первого места дождался своей очереди
+        (a, EVENT_SERVED, 1),
+    ]
+
+
+def test_same_joined_at_ordered_by_user_id(run, student, subject):
+    first, second = student(), student()
+    subject_id = subject()
+    joined_at = datetime.now()
+
+    async def join(session, user_id):
+        result = await session.execute(
+            _JOIN_SQL, {"user_id": user_id, "subject_id": subject_id, "joined_at": joined_at}
+        )
+        return result.one().position
+
+    async def both(session):
+        # Больший id вставлен раньше, но стоит вторым
+        return await join(session, second), await join(session, first)
+
+    assert run(db_writer.submit(both)) == (1, 1)
+    assert run(db_writer.leave(second, subject_id)) == 2
+
+
+def test_deleted_user_positions_come_from_db(run, student, subject):
+    a, b = student(), student()
+    first_subject, second_subject = subject(), subject()
+    for user in (a, b):
+        run(db_writer.join(user, first_subject, "x"))
+    for user in (b, a):
+        run(db_writer.join(user, second_subject, "x"))
+
+    # Очередь в памяти отстала (как у воркера до синхронизации)
+    queue_engine.clear(first_subject)
+    assert run(db_writer.submit(lambda session: delete_user_bd(session, b)))
+
+    assert run(_events(first_subject))[-1] == (b, EVENT_LEAVE, 2)
+    assert run(_events(second_subject))[-1] == (b, EVENT_LEAVE, 1)
@@ -0,0 +1,104 @@
+"""
+Группы в отдельных файлах SQLite (GROUP_SHARDS, src/database/shards.py):
+куда попадают пользователи и дисциплины группы и что видит её участник.
+"""
+import sqlite3
+
+from src.config import settings
+from src.database import async_session_maker, subject_catalogue
+from src.database.models import DEFAULT_GROUP_ID
+from src.database.requests import create_subject, create_user
+from src.database.session import main_shard, use_shard
+from src.database.shards import SUBJECT_ID_STRIDE, shard_router
+from src.database.writer import db_writer
+from src.keyboards.callbacks import QueueAction, QueueCb
+
+
+def _group(run, new_name):
+    group = run(shard_router.create_group(new_name("Группа")))
+    return group, shard_router.shard_for_group(group.id)
+
+
+def _member(run, shard, tg_id, group_id):
+    with use_shard(shard):
+        run(db_writer.submit(lambda session: create_user(session, tg_id, f"Студент {tg_id}", group_id)))
+
+
+def _subject(run, shard, name, group_id):
+    async def create():
+        with use_shard(shard):
+            subject = await db_writer.submit(lambda session: create_subject(session, name, group_id))
+            async with async_session_maker() as session:
+                await subject_catalogue.ensure_loaded(session)
+        return subject.id
+
+    return run(create())
+
+
+def test_group_gets_own_file(run, new_name):
+    group, shard = _group(run, new_name)
+    assert group.shard
+    assert shard is not main_shard
+    assert (settings.db_file.parent / group.shard).exists()
+    assert shard in shard_router.shards()
+
+
+def test_members_and_subjects_live_in_group_file(run, new_id, new_name):
+    group, shard = _group(run, new_name)
+    tg_id = new_id()
+    _member(run, shard, tg_id, group.id)
+    subject_id = _subject(run, shard, "Физика", group.id)
+
+    assert shard_router.group_of(tg_id) == group.id
+    assert shard_router.shard_for_user(tg_id) is shard
+    # id дисциплин разных файлов не пересекаются
+    assert group.id * SUBJECT_ID_STRIDE < subject_id < (group.id + 1) * SUBJECT_ID_STRIDE
+
+    connection = sqlite3.connect(settings.db_file.parent / group.shard)
+    assert connection.execute('SELECT group_id FROM "Users" WHERE tg_id = ?', (tg_id,)).fetchall() == [(group.id,)]
+    main = sqlite3.connect(settings.db_file)
+    assert main.execute('SELECT 1 FROM "Users" WHERE tg_id = ?', (tg_id,)).fetchall() == []
+
+
+def test_member_sees_only_own_group(run, harness, new_id, new_name, subject):
+    group, shard = _group(run, new_name)
+    tg_id = new_id()
+    _member(run, shard, tg_id, group.id)
+    own_name = new_name()
+    own = _subject(run, shard, own_name, group.id)
+    foreign = subject()
+
+    run(harness.callback(tg_id, QueueCb(action=QueueAction.JOIN, subject_id=foreign).pack()))
+    run(harness.callback(tg_id, QueueCb(action=QueueAction.JOIN, subject_id=own).pack()))
+
+    assert [subject.name for subject in subject_catalogue.all(group.id)] == [own_name]
+    assert harness.session.calls["AnswerCallbackQuery"] == 2
+    with use_shard(shard):
+        assert run(db_writer.leave(tg_id, own)) == 1
+    assert run(db_writer.leave(tg_id, foreign)) is None
+
+
+def test_load_members_picks_up_other_process(run, new_id, new_name):
+    group, shard = _group(run, new_name)
+    known, registered_elsewhere = new_id(), new_id()
+    _member(run, shard, known, group.id)
+    main_member = new_id()
+    _member(run, main_shard, main_member, DEFAULT_GROUP_ID)
+
+    # Другой процесс зарегистрировал студента прямо в файле группы
+    connection = sqlite3.connect(settings.db_file.parent / group.shard)
+    connection.execute(
+        'INSERT INTO "Users" (tg_id, full_name, role, group_id) VALUES (?, ?, ?, ?)',
+        (registered_elsewhere, "Новый", "student", group.id),
+    )
+    connection.commit()
+    assert shard_router.group_of(registered_elsewhere) is None
+
+    async def reload():
+        async with shard.session_maker() as session:
+            await shard_router.load_members(shard, session)
+
+    run(reload())
+    assert shard_router.group_of(registered_elsewhere) == group.id
+    assert shard_router.group_of(known) == group.id
+    assert shard_router.group_of(main_member) == DEFAULT_GROUP_ID
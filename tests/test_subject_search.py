@@ -0,0 +1,71 @@
+"""Поиск дисциплин для inline-режима (src/database/subject_search.py)"""
+import pytest
+
+from src.database import subject_search as search_module
+from src.database.subject_cache import CachedSubject
+from src.database.subject_search import SubjectSearchIndex
+
+
+class FakeCatalogue:
+    """Справочник дисциплин без БД: version и all(group_id), как у subject_catalogue"""
+
+    def __init__(self, *subjects: CachedSubject) -> None:
+        self.version = 0
+        self.subjects = subjects
+
+    def all(self, group_id=None):
+        found = [s for s in self.subjects if group_id is None or s.group_id == group_id]
+        return tuple(sorted(found, key=lambda s: s.name))
+
+    def replace(self, *subjects: CachedSubject) -> None:
+        self.subjects = subjects
+        self.version += 1
+
+
+@pytest.fixture
+def catalogue(monkeypatch):
+    catalogue = FakeCatalogue(
+        CachedSubject(1, "Лабораторный практикум", 1),
+        CachedSubject(2, "Физика", 1),
+        CachedSubject(3, "Прикладная физика", 1),
+        CachedSubject(4, "Биофизика", 1),
+        CachedSubject(5, "Физкультура", 2),
+    )
+    monkeypatch.setattr(search_module, "subject_catalogue", catalogue)
+    return catalogue
+
+
+def _ids(subjects):
+    return [subject.id for subject in subjects]
+
+
+def test_word_prefix_first_then_inside(catalogue):
+    index = SubjectSearchIndex()
+    # С начала слова - по алфавиту, затем внутри слова
+    assert _ids(index.search("физ", 1, 10)) == [3, 2, 4]
+
+
+def test_every_word_is_a_prefix(catalogue):
+    index = SubjectSearchIndex()
+    assert _ids(index.search("лаб пр", 1, 10)) == [1]
+    assert _ids(index.search("  ПРИКЛ  Физ ", 1, 10)) == [3]
+    assert index.search("лаб био", 1, 10) == []
+
+
+def test_only_own_group(catalogue):
+    index = SubjectSearchIndex()
+    assert _ids(index.search("физ", 2, 10)) == [5]
+    assert index.search("практ", 2, 10) == []
+
+
+def test_empty_query_and_limit(catalogue):
+    index = SubjectSearchIndex()
+    assert _ids(index.search("", 1, 2)) == [4, 1]
+    assert len(index.search("физ", 1, 2)) == 2
+
+
+def test_rebuilt_after_catalogue_change(catalogue):
+    index = SubjectSearchIndex()
+    assert _ids(index.search("хим", 1, 10)) == []
+    catalogue.replace(*catalogue.subjects, CachedSubject(6, "Химия", 1))
+    assert _ids(index.search("хим", 1, 10)) == [6]
@@ -0,0 +1,16 @@
+"""Подписки на уведомления «скоро твоя очередь» (src/services/turn_notifier.py)"""
+from src.database.requests import delete_user_bd, set_notify_at
+from src.database.writer import db_writer
+from src.services import turn_notifier
+
+
+def test_deleted_user_loses_subscription(run, student):
+    user = student()
+
+    run(db_writer.submit(lambda session: set_notify_at(session, user, 3)))
+    turn_notifier.set_preference(user, 3)
+    assert turn_notifier._subscribers[user] == 3
+
+    assert run(db_writer.submit(lambda session: delete_user_bd(session, user)))
+    assert user not in turn_notifier._subscribers
+    assert turn_notifier._thresholds[3] == 0
@@ -0,0 +1,46 @@
+"""Приём апдейтов вебхуком (src/webhook.py)"""
+import json
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from src.webhook import WebhookServer
+
+
+def test_updates_recorded_in_order(run, harness, new_id, tmp_path):
+    record_path = tmp_path / "updates.jsonl"
+    server = WebhookServer(
+        harness.dp, harness.bot, path="/webhook", secret=None, max_concurrency=4,
+        record_path=str(record_path),
+    )
+    user = new_id()
+    updates = [
+        json.loads(harness.updates.message(user, text).model_dump_json(exclude_unset=True, by_alias=True))
+        for text in ("/start", "Мои очереди", "/start")
+    ]
+
+    async def post_all():
+        server.start()
+        async with TestClient(TestServer(server.create_app())) as client:
+            for update in updates:
+                response = await client.post("/webhook", json=update)
+                assert response.status == 200
+        await server.stop()
+
+    run(post_all())
+    recorded = [json.loads(line) for line in record_path.read_text(encoding="utf-8").splitlines()]
+    assert [update["update_id"] for update in recorded] == [update["update_id"] for update in updates]
+
+
+def test_no_recording_without_path(run, harness, new_id):
+    server = WebhookServer(harness.dp, harness.bot, path="/webhook", secret=None, max_concurrency=4)
+    update = harness.updates.message(new_id(), "/start").model_dump_json(exclude_unset=True, by_alias=True)
+
+    async def post():
+        server.start()
+        assert server._recorder is None
+        async with TestClient(TestServer(server.create_app())) as client:
+            response = await client.post("/webhook", json=json.loads(update))
+            assert response.status == 200
+        await server.stop()
+
+    run(post())
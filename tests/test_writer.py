@@ -0,0 +1,132 @@
+"""
+Писатель БД (src/database/writer.py): склейка операций в одну транзакцию
+и повтор по одной, если какая-то из них упала.
+"""
+import asyncio
+
+from sqlalchemy import func, select
+
+from src.database import async_session_maker, queue_engine
+from src.database.models import Queue
+from src.database.requests import join_queue_atomic
+from src.database.session import main_shard
+from src.database.writer import DatabaseWriter
+
+
+class CountingSessionMaker:
+    """Сколько транзакций открыл писатель"""
+
+    def __init__(self) -> None:
+        self.sessions = 0
+
+    def __call__(self):
+        self.sessions += 1
+        return main_shard.write_session_maker()
+
+
+def _writer(max_batch: int = 100):
+    session_maker = CountingSessionMaker()
+    return DatabaseWriter(session_maker, window=0.02, max_batch=max_batch), session_maker
+
+
+async def _queued(subject_id: int):
+    async with async_session_maker() as session:
+        result = await session.execute(
+            select(Queue.user_id).where(Queue.subject_id == subject_id).order_by(Queue.joined_at, Queue.user_id)
+        )
+        return list(result.scalars())
+
+
+def test_simultaneous_joins_share_one_transaction(run, student, subject):
+    users, subject_id = [student() for _ in range(10)], subject()
+    writer, session_maker = _writer()
+
+    async def rush():
+        try:
+            return await asyncio.gather(*(writer.join(user, subject_id, "x") for user in users))
+        finally:
+            await writer.stop()
+
+    positions = run(rush())
+    assert positions == list(range(1, 11))
+    assert session_maker.sessions == 1
+    assert run(_queued(subject_id)) == users
+    assert [entry.user_id for entry in queue_engine.entries(subject_id)] == users
+
+
+def test_batch_is_capped(run, student, subject):
+    users, subject_id = [student() for _ in range(5)], subject()
+    writer, session_maker = _writer(max_batch=2)
+
+    async def rush():
+        try:
+            return await asyncio.gather(*(writer.join(user, subject_id, "x") for user in users))
+        finally:
+            await writer.stop()
+
+    assert run(rush()) == [1, 2, 3, 4, 5]
+    assert session_maker.sessions == 3
+
+
+def test_failed_operation_is_replayed_alone(run, student, subject):
+    first, broken, last = student(), student(), student()
+    subject_id = subject()
+    writer, session_maker = _writer()
+
+    async def join_then_fail(session):
+        await join_queue_atomic(session, broken, subject_id, "x")
+        raise ValueError("сломалось")
+
+    async def rush():
+        try:
+            return await asyncio.gather(
+                writer.join(first, subject_id, "x"),
+                writer.submit(join_then_fail),
+                writer.join(last, subject_id, "x"),
+                return_exceptions=True,
+            )
+        finally:
+            await writer.stop()
+
+    joined_first, failed, joined_last = run(rush())
+    assert isinstance(failed, ValueError)
+    # Откат пачки не теряет и не дублирует чужие записи, а запись упавшей не остаётся
+    assert (joined_first, joined_last) == (1, 2)
+    assert run(_queued(subject_id)) == [first, last]
+    assert [entry.user_id for entry in queue_engine.entries(subject_id)] == [first, last]
+    # Пачка, затем каждая из трёх операций отдельно
+    assert session_maker.sessions == 4
+
+
+def test_duplicate_join_in_one_batch(run, student, subject):
+    user, subject_id = student(), subject()
+    writer, _ = _writer()
+
+    async def rush():
+        try:
+            return await asyncio.gather(*(writer.join(user, subject_id, "x") for _ in range(3)))
+        finally:
+            await writer.stop()
+
+    assert run(rush()) == [1, None, None]
+
+    async def count():
+        async with async_session_maker() as session:
+            return await session.scalar(
+                select(func.count()).select_from(Queue).where(Queue.subject_id == subject_id)
+            )
+
+    assert run(count()) == 1
+
+
+def test_stop_finishes_queued_operations(run, student, subject):
+    users, subject_id = [student() for _ in range(3)], subject()
+    writer, _ = _writer()
+
+    async def submit_and_stop():
+        tasks = [asyncio.ensure_future(writer.join(user, subject_id, "x")) for user in users]
+        await asyncio.sleep(0)
+        await writer.stop()
+        return await asyncio.gather(*tasks)
+
+    assert run(submit_and_stop()) == [1, 2, 3]